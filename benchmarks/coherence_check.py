@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import logging
+import argparse
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+from gensim.models.coherencemodel import CoherenceModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import SyntheticTweets
+from coherence import CoherenceIndex, DEFAULT_WINDOW_SIZES, topics_from_model
+from ldamodel import LdaModel
+from utils import set_console_logger
+
+"""
+Agreement of the coherence index with gensim's CoherenceModel: every measure is scored by both on the topics of a
+model trained on synthetic texts, and the largest per-topic difference is reported. Texts are several tweets long,
+so that the sliding windows of c_v slide as well.
+
+Exits with status 1 if a measure differs by more than `--tolerance`.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+logging.getLogger('gensim').setLevel(logging.WARNING)
+
+
+def main():
+    generator = SyntheticTweets(args.seed, args.num_terms)
+    texts = [generator.words(max(1, generator.num_words() * args.tweets_per_text)) for _ in range(args.num_docs)]
+    dictionary = Dictionary(texts)
+    corpus = [dictionary.doc2bow(text) for text in texts]
+    model = LdaModel(corpus=corpus, id2word=dictionary, num_topics=args.num_topics, random_state=args.seed)
+    topics = topics_from_model(model, args.topn)
+    topic_words = [[dictionary[word_id] for word_id in topic] for topic in topics]
+
+    results = []
+    for measure in args.measures:
+        index = CoherenceIndex.build(texts, dictionary, DEFAULT_WINDOW_SIZES[measure])
+        indexed = np.array(index.get_coherence_per_topic(topics, measure))
+        # a single process, the parallel accumulator splits the texts between workers
+        reference = np.array(CoherenceModel(topics=topic_words, texts=texts, dictionary=dictionary,
+                                            coherence=measure, topn=args.topn,
+                                            processes=1).get_coherence_per_topic())
+        result = {'measure': measure, 'max_abs_difference': float(np.max(np.abs(indexed - reference))),
+                  'index': float(np.mean(indexed)), 'gensim': float(np.mean(reference))}
+        logger.info(json.dumps(result))
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    failed = [result['measure'] for result in results if result['max_abs_difference'] > args.tolerance]
+    if failed:
+        logger.error(f'{", ".join(failed)} differ from gensim by more than {args.tolerance}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the coherence index against gensim CoherenceModel')
+    parser.add_argument('--measures', nargs='+', default=list(DEFAULT_WINDOW_SIZES), choices=list(DEFAULT_WINDOW_SIZES))
+    parser.add_argument('--num_topics', type=int, default=10)
+    parser.add_argument('--num_docs', type=int, default=400)
+    parser.add_argument('--tweets_per_text', type=int, default=8, help='length of the texts in median tweets')
+    parser.add_argument('--num_terms', type=int, default=2000, help='vocabulary size')
+    parser.add_argument('--topn', type=int, default=20)
+    parser.add_argument('--tolerance', type=float, default=1e-6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tweetio import open_writer, jsonl_path, read_jsonl, zstandard, lz4
+from utils import set_console_logger
+
+"""
+Size and write/read throughput of the output codecs on a (decompressed) tweet JSONL file.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+CONFIGS = ['none', 'gzip:1', 'gzip:6', 'zstd:1', 'zstd:3', 'zstd:9', 'lz4:0']
+
+
+def parse_config(config):
+    codec, _, level = config.partition(':')
+    return codec, int(level) if level else None
+
+
+def available(codec):
+    return not ((codec == 'zstd' and zstandard is None) or (codec == 'lz4' and lz4 is None))
+
+
+def main():
+    lines = [json.dumps(tweet) + '\n' for tweet in read_jsonl(args.input)]
+    raw_size = sum(len(line.encode('utf-8')) for line in lines)
+    logger.info(f'{len(lines)} lines, {raw_size / 2 ** 20:.1f} MiB')
+
+    tmp_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        for config in args.configs:
+            codec, level = parse_config(config)
+            if not available(codec):
+                logger.warning(f'Skipping {config}, the package of {codec} is not installed')
+                continue
+            path = jsonl_path(os.path.join(tmp_dir, 'tweets'), codec)
+
+            start_time = time.perf_counter()
+            with open_writer(path, codec, level) as f:
+                f.writelines(lines)
+            write_time = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            num_read = sum(1 for _ in read_jsonl(path))
+            read_time = time.perf_counter() - start_time
+            assert num_read == len(lines)
+
+            size = os.path.getsize(path)
+            result = {'codec': codec, 'level': level, 'size_mb': size / 2 ** 20, 'ratio': raw_size / size,
+                      'write_mb_s': raw_size / 2 ** 20 / write_time, 'read_mb_s': raw_size / 2 ** 20 / read_time}
+            logger.info(json.dumps(result))
+            results.append(result)
+            os.remove(path)
+    finally:
+        shutil.rmtree(tmp_dir)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Output codec benchmark')
+    parser.add_argument('--input', required=True, help='tweet JSONL file of any codec')
+    parser.add_argument('--configs', nargs='+', default=CONFIGS, help='codec:level pairs')
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
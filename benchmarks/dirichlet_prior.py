@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.matutils import dirichlet_expectation
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import LdaModel
+from utils import set_console_logger
+
+"""
+Per-chunk cost of the alpha='auto' / eta='auto' prior updates: the previous per-row loops against the batched
+2-D updates of LdaModel.update_alpha / update_eta.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+
+def loop_logphat(rows):
+    # the previous implementation: one dirichlet_expectation call per document (alpha) or topic (eta)
+    return sum(dirichlet_expectation(row) for row in rows) / float(len(rows))
+
+
+def best_time(func, *func_args):
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        func(*func_args)
+        times.append(time.perf_counter() - start_time)
+    return min(times)
+
+
+def main():
+    random_state = np.random.RandomState(args.seed)
+    id2word = {i: f'w{i}' for i in range(args.num_terms)}
+    results = []
+    for num_topics in args.num_topics:
+        model = LdaModel(id2word=id2word, num_topics=num_topics, alpha='auto', eta='auto', random_state=args.seed)
+        lambdat = model.state.get_lambda()
+        for chunksize in args.chunksize:
+            gammat = random_state.gamma(100., 1. / 100., (chunksize, num_topics)).astype(model.dtype)
+            alpha = model.alpha.copy()
+            result = {
+                'num_topics': num_topics,
+                'chunksize': chunksize,
+                'alpha_loop_ms': 1000 * best_time(loop_logphat, gammat),
+                'alpha_batched_ms': 1000 * best_time(model.update_alpha, gammat, 0.5),
+                'alpha_max_abs_diff': float(np.max(np.abs(
+                    loop_logphat(gammat) - dirichlet_expectation(gammat).mean(axis=0)))),
+            }
+            model.alpha = alpha
+            results.append(result)
+            logger.info(json.dumps(result))
+        eta = model.eta.copy()
+        result = {
+            'num_topics': num_topics,
+            'num_terms': args.num_terms,
+            'eta_loop_ms': 1000 * best_time(loop_logphat, lambdat),
+            'eta_batched_ms': 1000 * best_time(model.update_eta, lambdat, 0.5),
+            'eta_max_abs_diff': float(np.max(np.abs(
+                loop_logphat(lambdat) - dirichlet_expectation(lambdat).mean(axis=0)))),
+        }
+        model.eta = eta
+        results.append(result)
+        logger.info(json.dumps(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Dirichlet prior update benchmark')
+    parser.add_argument('--num_topics', type=int, nargs='+', default=[10, 50, 100])
+    parser.add_argument('--chunksize', type=int, nargs='+', default=[2000, 10000])
+    parser.add_argument('--num_terms', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
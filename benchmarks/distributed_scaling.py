@@ -0,0 +1,76 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import LdaModel
+from ldadistributed import start_local_workers, DEFAULT_AUTHKEY
+from utils import set_console_logger
+
+"""
+Training throughput of distributed LDA with 1, 2, 4 and 8 localhost workers.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+
+def synthetic_corpus(num_docs, num_terms, doc_len, seed):
+    # tweet-like documents over a Zipfian vocabulary
+    random_state = np.random.RandomState(seed)
+    corpus = []
+    for _ in range(num_docs):
+        ids = np.minimum(random_state.zipf(1.2, size=random_state.poisson(doc_len) + 1), num_terms) - 1
+        ids, counts = np.unique(ids, return_counts=True)
+        corpus.append(list(zip(ids.tolist(), counts.tolist())))
+    return corpus
+
+
+def main():
+    corpus = synthetic_corpus(args.num_docs, args.num_terms, args.doc_len, args.seed)
+    id2word = {i: f'w{i}' for i in range(args.num_terms)}
+    results = []
+    for num_workers in args.workers:
+        processes, addresses = start_local_workers(num_workers, args.base_port, DEFAULT_AUTHKEY)
+        try:
+            start_time = time.time()
+            model = LdaModel(corpus=corpus, id2word=id2word, num_topics=args.num_topics,
+                             chunksize=args.batch_size, passes=1, eval_every=0, random_state=args.seed,
+                             distributed=True, ns_conf={'addresses': addresses})
+            elapse = time.time() - start_time
+            model.dispatcher.exit()
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+        result = {'workers': num_workers, 'seconds': elapse, 'docs/s': len(corpus) / elapse}
+        logger.info(json.dumps(result))
+        results.append(result)
+        # give the next round fresh ports
+        args.base_port += num_workers
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed LDA scaling benchmark')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--num_docs', type=int, default=200000)
+    parser.add_argument('--num_terms', type=int, default=20000)
+    parser.add_argument('--doc_len', type=float, default=8)
+    parser.add_argument('--num_topics', type=int, default=100)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--base_port', type=int, default=5600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import SyntheticTweets
+from ldamodel import LdaModel
+from utils import set_console_logger
+
+"""
+Speed of `get_document_topics(..., per_word_topics=True)`, the per-word topic assignments used to highlight
+tweets, on synthetic documents: the former word-by-topic Python loop over the sufficient statistics of every
+document, the vectorized per-document call and the batched call.
+
+The reference and the per-document call draw the same random initializations, so their per-word topics are
+also compared.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+
+def reference_word_topics(model, bow, minimum_phi_value):
+    """The per-word topics as computed before the phi blocks, one sufficient statistics matrix per document."""
+    _, phis = model.inference([bow], collect_sstats=True)
+    word_topic = []
+    for word_type, weight in bow:
+        phi_values = []
+        for topic_id in range(0, model.num_topics):
+            if phis[topic_id][word_type] >= minimum_phi_value:
+                phi_values.append((phis[topic_id][word_type], topic_id))
+        word_topic.append((word_type, [x[1] for x in sorted(phi_values, reverse=True)]))
+    return word_topic
+
+
+def timed(model, func):
+    model.random_state = np.random.RandomState(args.seed)
+    start_time = time.perf_counter()
+    results = func()
+    return results, time.perf_counter() - start_time
+
+
+def main():
+    generator = SyntheticTweets(args.seed, args.num_terms)
+    texts = [generator.words(max(1, generator.num_words() // 2)) for _ in range(args.num_docs)]
+    dictionary = Dictionary(texts)
+    corpus = [dictionary.doc2bow(text) for text in texts]
+    model = LdaModel(id2word=dictionary, num_topics=args.num_topics, random_state=args.seed)
+    if args.train:
+        model.update(corpus)
+    min_phi = model.minimum_probability
+
+    reference, reference_time = timed(model, lambda: [reference_word_topics(model, bow, min_phi)
+                                                      for bow in corpus[:args.reference_docs]])
+    single, single_time = timed(model, lambda: [model.get_document_topics(bow, per_word_topics=True)
+                                                for bow in corpus])
+    batch, batch_time = timed(model, lambda: [result for start in range(0, len(corpus), args.chunksize)
+                                              for result in model.get_document_topics_batch(
+                                                  corpus[start:start + args.chunksize], per_word_topics=True)])
+    mismatches = sum(expected != result[1] for expected, result in zip(reference, single))
+
+    results = [
+        {'method': 'reference', 'docs/s': len(reference) / reference_time},
+        {'method': 'get_document_topics', 'docs/s': len(single) / single_time},
+        {'method': 'get_document_topics_batch', 'docs/s': len(batch) / batch_time, 'chunksize': args.chunksize},
+    ]
+    for result in results:
+        logger.info(json.dumps(result))
+    logger.info(f'{mismatches}/{len(reference)} documents with per-word topics different from the reference')
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results, 'mismatches': mismatches}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the per-word topics of get_document_topics')
+    parser.add_argument('--num_topics', type=int, default=100)
+    parser.add_argument('--num_docs', type=int, default=5000)
+    parser.add_argument('--reference_docs', type=int, default=500, help='documents for the slow reference')
+    parser.add_argument('--num_terms', type=int, default=20000, help='vocabulary size')
+    parser.add_argument('--chunksize', type=int, default=2000)
+    parser.add_argument('--train', action='store_true', help='train one pass first instead of random topics')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from utils import set_console_logger
+
+"""
+Start-up cost of the scripts and library modules: the time a fresh interpreter takes to import each of them,
+which every CLI run and every spawned worker process pays before doing any work.
+
+Every module is imported in its own `python -X importtime` process, the best wall time of `--repeat` runs is
+reported together with the slowest top-level packages it pulled in, e.g. torch, spacy or allennlp.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+MODULES = ['tweetio', 'utils', 'scheduler', 'corpus', 'ldamodel', 'ldamulticore', 'coherence', 'filter_tweets',
+           'preprocess', 'extract_candidates', 'train_lda', 'predict_lda', 'stream_lda']
+
+
+def parse_importtime(stderr):
+    """Cumulative microseconds of the top-level packages in the `-X importtime` output."""
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented, keep the top-level ones only
+        if name.startswith('  ') or not cumulative.strip().isdigit():
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + int(cumulative)
+    return packages
+
+
+def time_import(module):
+    times = []
+    packages = {}
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT_DIR,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+        times.append(time.perf_counter() - start_time)
+        if completed.returncode != 0:
+            return {'module': module, 'error': completed.stderr.strip().splitlines()[-1]}
+        packages = parse_importtime(completed.stderr)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+    return {'module': module, 'seconds': min(times),
+            'slowest': [{'package': package, 'seconds': micros / 1e6} for package, micros in slowest]}
+
+
+def main():
+    # the interpreter alone, to subtract from the module times
+    baseline = time_import('sys')
+    logger.info(f"interpreter start up: {baseline['seconds']:.3f}s")
+    results = []
+    for module in args.modules:
+        result = time_import(module)
+        if 'error' in result:
+            logger.warning(f"{module}: {result['error']}")
+        else:
+            slowest = ', '.join(f"{item['package']} {item['seconds']:.2f}s" for item in result['slowest'])
+            logger.info(f"{module:20s} {result['seconds'] - baseline['seconds']:.3f}s ({slowest})")
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'baseline': baseline, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Import time of the scripts and library modules')
+    parser.add_argument('--modules', nargs='+', default=MODULES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5, help='number of slowest packages to report per module')
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import LdaModel
+from tweetio import read_jsonl, is_jsonl
+from utils import set_console_logger
+
+"""
+Drift of the reduced-precision (float16 expElogbeta) mode against full float32 training.
+
+Exits with a non-zero status if the perplexity or the topics drift further than the given tolerances.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('gensim').setLevel(logging.WARNING)
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+
+def load_texts(dataset_dir, num_docs):
+    texts = []
+    for root, _, filenames in sorted(os.walk(dataset_dir)):
+        for filename in sorted(filenames):
+            if not (is_jsonl(filename) and 'annotated' in filename):
+                continue
+            for tweet in read_jsonl(os.path.join(root, filename)):
+                texts.append(tweet['candidates'])
+                if len(texts) >= num_docs:
+                    return texts
+    return texts
+
+
+def train(bow_corpus, dictionary, beta_dtype):
+    start_time = time.time()
+    model = LdaModel(corpus=bow_corpus, id2word=dictionary, num_topics=args.num_topics,
+                     passes=args.num_epochs, chunksize=args.batch_size, eval_every=0,
+                     alpha='auto', eta='auto', random_state=args.seed, beta_dtype=beta_dtype)
+    return model, time.time() - start_time
+
+
+def main():
+    texts = load_texts(args.dataset_dir, args.num_docs)
+    num_heldout = len(texts) // 10
+    dictionary = Dictionary(texts)
+    dictionary.filter_extremes(no_below=5, no_above=0.5)
+    bow_corpus = [dictionary.doc2bow(text) for text in texts]
+    train_corpus, heldout = bow_corpus[num_heldout:], bow_corpus[:num_heldout]
+    logger.info(f'{len(train_corpus)} training / {len(heldout)} held-out documents, {len(dictionary)} terms')
+
+    full, full_time = train(train_corpus, dictionary, np.float32)
+    mixed, mixed_time = train(train_corpus, dictionary, np.float16)
+
+    full_perplexity = np.exp2(-full.log_perplexity(heldout))
+    mixed_perplexity = np.exp2(-mixed.log_perplexity(heldout))
+    perplexity_drift = abs(mixed_perplexity - full_perplexity) / full_perplexity
+    # both models start from the same random state, so their topics correspond one to one
+    topic_diff, _ = full.diff(mixed, distance='hellinger', diagonal=True, annotation=False, normed=False)
+
+    result = {
+        'float32': {'seconds': full_time, 'perplexity': float(full_perplexity),
+                    'expElogbeta_bytes': full.expElogbeta.nbytes},
+        'float16': {'seconds': mixed_time, 'perplexity': float(mixed_perplexity),
+                    'expElogbeta_bytes': mixed.expElogbeta.nbytes},
+        'perplexity_drift': float(perplexity_drift),
+        'max_topic_hellinger': float(np.max(topic_diff)),
+    }
+    logger.info(json.dumps(result, indent=2))
+
+    if perplexity_drift > args.max_perplexity_drift or np.max(topic_diff) > args.max_topic_diff:
+        logger.error('reduced precision drifts beyond tolerance')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check float16 expElogbeta drift against float32')
+    parser.add_argument('--dataset_dir', required=True, help='dataset directory')
+    parser.add_argument('--num_docs', type=int, default=50000)
+    parser.add_argument('--num_topics', type=int, default=20)
+    parser.add_argument('--num_epochs', type=int, default=2)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max_perplexity_drift', type=float, default=0.01,
+                        help='maximum relative perplexity difference')
+    parser.add_argument('--max_topic_diff', type=float, default=0.05,
+                        help='maximum hellinger distance between corresponding topics')
+    args = parser.parse_args()
+    print(args)
+    main()
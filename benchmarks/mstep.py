@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.matutils import dirichlet_expectation, mean_absolute_difference
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import LdaModel, LdaState
+from utils import set_console_logger
+
+"""
+M-step time before and after caching lambda/Elogbeta in LdaState.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+
+def reference_mstep(model, rho, other):
+    # the previous do_mstep: Elogbeta computed twice from fresh lambdas, topics sorted every step,
+    # and another lambda for update_eta
+    previous_Elogbeta = dirichlet_expectation(model.state.eta + model.state.sstats)
+    model.state.blend(rho, other)
+    current_Elogbeta = dirichlet_expectation(model.state.eta + model.state.sstats)
+    model.sync_state(current_Elogbeta)
+    model.print_topics(5)
+    mean_absolute_difference(previous_Elogbeta.ravel(), current_Elogbeta.ravel())
+    if model.optimize_eta:
+        model.update_eta(model.state.eta + model.state.sstats, rho)
+
+
+def make_model(num_topics, log_topics):
+    id2word = {i: f'w{i}' for i in range(args.num_terms)}
+    return LdaModel(id2word=id2word, num_topics=num_topics, eta='auto', random_state=args.seed,
+                    log_topics=log_topics)
+
+
+def time_steps(model, mstep, others):
+    times = []
+    for step, other in enumerate(others):
+        start_time = time.perf_counter()
+        mstep(model, pow(1.0 + step, -0.5), other)
+        times.append(time.perf_counter() - start_time)
+    return 1000 * float(np.median(times))
+
+
+def main():
+    random_state = np.random.RandomState(args.seed)
+    results = []
+    for num_topics in args.num_topics:
+        others = []
+        for _ in range(args.steps):
+            other = LdaState(np.zeros(args.num_terms), (num_topics, args.num_terms))
+            other.sstats[...] = random_state.gamma(1.0, 1.0, other.sstats.shape)
+            other.numdocs = 2000
+            others.append(other)
+
+        before = time_steps(make_model(num_topics, 5), reference_mstep, others)
+        after = time_steps(make_model(num_topics, 0), LdaModel.do_mstep, others)
+        result = {'num_topics': num_topics, 'num_terms': args.num_terms,
+                  'before_ms': before, 'after_ms': after, 'speedup': before / after}
+        logger.info(json.dumps(result))
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='M-step benchmark')
+    parser.add_argument('--num_topics', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--num_terms', type=int, default=100000)
+    parser.add_argument('--steps', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
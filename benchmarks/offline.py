@@ -0,0 +1,48 @@
+import os
+import sys
+import runpy
+import logging
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+"""
+Stand-ins for the data the pipeline downloads, so that the benchmarks run offline.
+
+Without the WordNet data the benchmarks lemmatize with the identity instead, and say so in their results; the
+pipeline scripts themselves still fail without it. Run as a script, runs `extract_candidates.py` with the
+lemmatizer of :func:`load_lemmatizer`:
+
+    python benchmarks/offline.py --dataset_dir data/synthetic
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class IdentityLemmatizer(object):
+    def lemmatize(self, token):
+        return token
+
+
+def load_lemmatizer():
+    """The WordNet lemmatizer, or the identity if the WordNet data is not installed."""
+    from nltk.stem.wordnet import WordNetLemmatizer
+
+    lemmatizer = WordNetLemmatizer()
+    try:
+        lemmatizer.lemmatize('tweets')
+    except LookupError:
+        logger.warning('WordNet data not found (nltk.download("wordnet")), candidates are not lemmatized')
+        return IdentityLemmatizer()
+    return lemmatizer
+
+
+if __name__ == '__main__':
+    import nltk.stem.wordnet
+
+    lemmatizer = load_lemmatizer()
+    # extract_candidates.py creates its lemmatizer from the name it imports from nltk
+    nltk.stem.wordnet.WordNetLemmatizer = lambda: lemmatizer
+    script = os.path.join(ROOT_DIR, 'extract_candidates.py')
+    sys.argv[0] = script
+    runpy.run_path(script, run_name='__main__')
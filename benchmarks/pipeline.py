@@ -0,0 +1,128 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from synthetic import write_dataset
+from offline import load_lemmatizer
+from tweetio import count_lines, is_jsonl
+from utils import set_console_logger
+
+"""
+End-to-end benchmark of the pipeline on a synthetic dataset: filter_tweets -> preprocess -> extract_candidates
+-> train_lda -> predict_lda, every stage run as its own script with --report.
+
+For every stage the wall time, the throughput (tweets or documents per second), the stage timers of its
+report and the peak RSS of its largest process are collected into one JSON file.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+
+def run_stage(name, script, script_args, num_items, unit, reports_dir):
+    report_path = os.path.join(reports_dir, f'{name}.json')
+    command = [sys.executable, os.path.join(ROOT_DIR, script)] + script_args + ['--report', report_path]
+    logger.info(' '.join(command))
+    start_time = time.time()
+    subprocess.run(command, check=True, stdout=subprocess.DEVNULL if not args.verbose else None,
+                   stderr=subprocess.DEVNULL if not args.verbose else None)
+    wall_time = time.time() - start_time
+    with open(report_path) as f:
+        report = json.load(f)
+    # the largest resident set of all the (grand)children waited for so far, i.e. of the stages up to this one
+    peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin'
+                                                                          else 1024)
+    result = {'stage': name, 'wall_time': wall_time, 'unit': unit, 'items': num_items,
+              'per_second': num_items / wall_time, 'peak_rss_mb': peak_rss,
+              'stages': report['stages'], 'counts': report['counts']}
+    logger.info(json.dumps({key: value for key, value in result.items() if key not in ('stages', 'counts')}))
+    return result
+
+
+def count_tweets(dataset_dir, word):
+    return sum(count_lines(os.path.join(root, filename))
+               for root, _, filenames in os.walk(dataset_dir)
+               for filename in filenames if is_jsonl(filename) and word in filename)
+
+
+def main():
+    work_dir = tempfile.mkdtemp(dir=args.tmp_dir)
+    hydrated_dir = os.path.join(work_dir, 'hydrated')
+    dataset_dir = os.path.join(work_dir, 'dataset')
+    dump_dir = os.path.join(work_dir, 'dump')
+    reports_dir = os.path.join(work_dir, 'reports')
+    for path in (dataset_dir, dump_dir, reports_dir):
+        os.makedirs(path)
+    try:
+        logger.info('Generating the synthetic dataset')
+        write_dataset(hydrated_dir, 'hydrated', args.days, args.tweets_per_hour, seed=args.seed,
+                      vocab_size=args.num_terms)
+        month_dirs = sorted(os.path.join(hydrated_dir, month) for month in os.listdir(hydrated_dir))
+        for month_dir in month_dirs:
+            os.makedirs(os.path.join(dataset_dir, os.path.basename(month_dir)))
+        num_hydrated = args.days * 24 * args.tweets_per_hour
+        workers = ['--num-workers', str(args.workers)]
+        codec = ['--codec', args.codec]
+
+        results = [run_stage('filter_tweets', 'filter_tweets.py',
+                             ['--input_dirs'] + month_dirs + ['--output_dir', dataset_dir] + workers + codec,
+                             num_hydrated, 'tweets', reports_dir)]
+        num_filtered = count_tweets(dataset_dir, 'coronavirus-tweet-2020')
+        results.append(run_stage('preprocess', 'preprocess.py',
+                                 ['--input_dir', dataset_dir, '--output_dir', dataset_dir] + workers + codec,
+                                 num_filtered, 'tweets', reports_dir))
+        # run with the identity lemmatizer if the WordNet data is missing
+        results.append(run_stage('extract_candidates', os.path.join('benchmarks', 'offline.py'),
+                                 ['--dataset_dir', dataset_dir, '--write_ids'] + codec,
+                                 num_filtered, 'tweets', reports_dir))
+        results[-1]['lemmatizer'] = type(load_lemmatizer()).__name__
+        results.append(run_stage('train_lda', 'train_lda.py',
+                                 ['--dataset_dir', dataset_dir, '--dump_dir', dump_dir, '--model', args.model,
+                                  '--num_topics', str(args.num_topics), '--num_epochs', str(args.num_epochs),
+                                  '--workers', str(args.workers), '--skip-eval', '--eval_every', '0'],
+                                 num_filtered * args.num_epochs, 'docs', reports_dir))
+        results.append(run_stage('predict_lda', 'predict_lda.py',
+                                 ['--dataset_dir', dataset_dir, '--dump_dir', dump_dir] + workers,
+                                 num_filtered, 'docs', reports_dir))
+        total_time = sum(result['wall_time'] for result in results)
+        summary = {'hydrated_tweets': num_hydrated, 'filtered_tweets': num_filtered, 'wall_time': total_time,
+                   'tweets_per_second': num_hydrated / total_time}
+        logger.info(json.dumps(summary))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'args': vars(args), 'summary': summary, 'results': results}, f, indent=2)
+    finally:
+        if args.keep:
+            logger.info(f'Files kept in {work_dir}')
+        else:
+            shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='End-to-end pipeline benchmark on synthetic tweets')
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--tweets_per_hour', type=int, default=2000)
+    parser.add_argument('--num_terms', type=int, default=20000, help='vocabulary size')
+    parser.add_argument('--codec', default='none', help='codec of the intermediate files')
+    parser.add_argument('--model', default='lda', choices=['lda', 'multicore_lda'])
+    parser.add_argument('--num_topics', type=int, default=20)
+    parser.add_argument('--num_epochs', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tmp_dir', help='where to write the synthetic dataset, the system default if omitted')
+    parser.add_argument('--keep', action='store_true', help='keep the synthetic dataset and the model')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the stages')
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
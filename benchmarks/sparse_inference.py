@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.matutils import hellinger
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import LdaModel
+from tweetio import read_jsonl, is_jsonl
+from utils import set_console_logger
+
+"""
+Accuracy vs. speed of approximate (top-n topics per word) inference against exact inference
+on a held-out set of annotated tweets.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+
+def load_heldout(heldout_dir, dictionary, num_docs):
+    corpus = []
+    for root, _, filenames in sorted(os.walk(heldout_dir)):
+        for filename in sorted(filenames):
+            if not (is_jsonl(filename) and 'annotated' in filename):
+                continue
+            for tweet in read_jsonl(os.path.join(root, filename)):
+                bow = dictionary.doc2bow(tweet['candidates'])
+                if bow:
+                    corpus.append(bow)
+                if len(corpus) >= num_docs:
+                    return corpus
+    return corpus
+
+
+def run_inference(model, corpus, inference_topn):
+    model.inference_topn = inference_topn
+    model._topic_index = None
+    start_time = time.time()
+    model.get_topic_index()
+    gammas = [model.inference(corpus[i:i + args.chunksize], approximate=True)[0]
+              for i in range(0, len(corpus), args.chunksize)]
+    elapse = time.time() - start_time
+    gamma = np.concatenate(gammas)
+    return gamma / gamma.sum(axis=1, keepdims=True), elapse
+
+
+def main():
+    model = LdaModel.load(os.path.join(args.dump_dir, 'lda.model'), inference_only=True)
+    corpus = load_heldout(args.heldout_dir, model.id2word, args.num_docs)
+    logger.info(f'{len(corpus)} held-out documents, {model.num_topics} topics')
+
+    model.random_state = np.random.RandomState(args.seed)
+    exact, exact_time = run_inference(model, corpus, None)
+    results = [{'inference_topn': None, 'docs/s': len(corpus) / exact_time,
+                'speedup': 1.0, 'hellinger': 0.0, 'top_topic_agreement': 1.0}]
+    for topn in args.topn:
+        model.random_state = np.random.RandomState(args.seed)
+        approx, approx_time = run_inference(model, corpus, topn)
+        distances = [hellinger(p, q) for p, q in zip(exact, approx)]
+        agreement = np.mean(exact.argmax(axis=1) == approx.argmax(axis=1))
+        results.append({'inference_topn': topn, 'docs/s': len(corpus) / approx_time,
+                        'speedup': exact_time / approx_time, 'hellinger': float(np.mean(distances)),
+                        'top_topic_agreement': float(agreement)})
+    for result in results:
+        logger.info(json.dumps(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark approximate LDA inference')
+    parser.add_argument('--dump_dir', required=True, help='dump directory of the trained model')
+    parser.add_argument('--heldout_dir', required=True, help='directory with held-out annotated files')
+    parser.add_argument('--topn', type=int, nargs='+', default=[5, 10, 20],
+                        help='candidate topics per word to evaluate')
+    parser.add_argument('--num_docs', type=int, default=20000)
+    parser.add_argument('--chunksize', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
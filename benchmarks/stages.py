@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+from gensim.corpora.dictionary import Dictionary
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic import SyntheticTweets, write_dataset
+from corpus import CsrCorpus, encode_texts, read_candidates
+from ldamodel import LdaModel
+from ldamulticore import LdaMulticore
+from tweetio import read_jsonl
+from utils import set_console_logger, peak_rss_mb
+
+"""
+Microbenchmarks of every pipeline stage on synthetic tweets: preprocess_tweet, extract_candidates.process,
+reading the JSONL files, encoding, LdaModel.inference and LdaMulticore.update.
+
+Every result has the throughput in items per second (tweets, lines or documents) and the peak RSS of the process
+so far. Compare the JSON output of two runs, e.g. before and after a change, with the same arguments.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+logging.getLogger('ldamulticore').setLevel(logging.WARNING)
+logging.getLogger('gensim').setLevel(logging.WARNING)
+
+
+def best_rate(func, num_items):
+    times = []
+    for _ in range(args.repeat):
+        start_time = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start_time)
+    return num_items / min(times)
+
+
+def result(stage, unit, rate, **extra):
+    result = dict(stage=stage, unit=unit, per_second=rate, peak_rss_mb=peak_rss_mb(), **extra)
+    logger.info(json.dumps(result))
+    return result
+
+
+def bench_text_stages(generator):
+    # the scripts parse their arguments under __main__ only, so their functions can be imported
+    from preprocess import preprocess_tweet
+    from extract_candidates import process
+    from offline import load_lemmatizer
+    from nltk.tokenize import RegexpTokenizer
+
+    texts = [generator.text() for _ in range(args.num_tweets)]
+    results = [result('preprocess_tweet', 'tweets',
+                      best_rate(lambda: [preprocess_tweet(text) for text in texts], len(texts)))]
+
+    preprocessed = [preprocess_tweet(text) for text in texts]
+    tokenizer = RegexpTokenizer(r'\w+')
+    lemmatizer = load_lemmatizer()
+    results.append(result('extract_candidates.process', 'tweets',
+                          best_rate(lambda: [process(tokenizer, lemmatizer, text) for text in preprocessed],
+                                    len(preprocessed)),
+                          lemmatizer=type(lemmatizer).__name__))
+    return results
+
+
+def bench_io_stages(tmp_dir):
+    paths = write_dataset(tmp_dir, 'annotated', 1, args.num_docs // 24, codec='none', seed=args.seed,
+                          vocab_size=args.num_terms)
+    num_lines = (args.num_docs // 24) * len(paths)
+    results = [result('read_jsonl', 'lines',
+                      best_rate(lambda: [sum(1 for _ in read_jsonl(path)) for path in paths], num_lines))]
+
+    texts = [candidates for path in paths for candidates in read_candidates(path)]
+    dictionary = Dictionary(texts)
+    results.append(result('encode_texts', 'docs',
+                          best_rate(lambda: encode_texts(texts, dictionary.token2id), len(texts))))
+    return results, CsrCorpus.from_bow([dictionary.doc2bow(text) for text in texts]), dictionary
+
+
+def bench_lda_stages(bow_corpus, dictionary):
+    results = []
+    for num_topics in args.num_topics:
+        model = LdaModel(id2word=dictionary, num_topics=num_topics, random_state=args.seed)
+        chunk = list(bow_corpus)[:args.chunksize]
+        results.append(result('LdaModel.inference', 'docs',
+                              best_rate(lambda: model.inference(chunk, collect_sstats=True), len(chunk)),
+                              num_topics=num_topics))
+
+        def multicore_update():
+            model = LdaMulticore(id2word=dictionary, num_topics=num_topics, workers=args.workers,
+                                 chunksize=args.chunksize, passes=1, eval_every=0, random_state=args.seed)
+            model.update(bow_corpus)
+
+        results.append(result('LdaMulticore.update', 'docs', best_rate(multicore_update, len(bow_corpus)),
+                              num_topics=num_topics, workers=args.workers))
+    return results
+
+
+def main():
+    generator = SyntheticTweets(args.seed, args.num_terms)
+    results = bench_text_stages(generator)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        io_results, bow_corpus, dictionary = bench_io_stages(tmp_dir)
+    results.extend(io_results)
+    results.extend(bench_lda_stages(bow_corpus, dictionary))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-stage microbenchmarks on synthetic tweets')
+    parser.add_argument('--num_tweets', type=int, default=20000, help='tweets for the text stages')
+    parser.add_argument('--num_docs', type=int, default=48000, help='annotated documents for the other stages')
+    parser.add_argument('--num_terms', type=int, default=20000, help='vocabulary size')
+    parser.add_argument('--num_topics', type=int, nargs='+', default=[20, 100])
+    parser.add_argument('--chunksize', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
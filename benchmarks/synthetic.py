@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tweetio import open_writer, jsonl_path, CODEC_EXTENSIONS
+from utils import set_console_logger
+
+"""
+Deterministic synthetic tweets for the benchmarks, so that they run offline and are comparable between runs.
+
+Words are drawn from a Zipfian vocabulary of pronounceable pseudo-words. Tweet lengths are log-normal like the
+hydrated tweets', and URLs, mentions, hashtags, emoji, emoticons, numbers, elongated words and retweet prefixes
+are mixed in at rates close to the COVID-19 tweet dataset's.
+
+Used as a module by the other benchmarks, or run to write a synthetic dataset directory in the layout of
+`filter_tweets.py` (hydrated `coronavirus-tweet-id-*.jsonl.gz` files), `preprocess.py` or `train_lda.py`:
+
+    python benchmarks/synthetic.py --output_dir data/synthetic --kind hydrated --days 2 --tweets_per_hour 5000
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ro', 'sa', 'ti', 'vu', 'den', 'bar', 'cor', 'sta', 'pre', 'ing', 'tion',
+             'vir', 'us', 'ho', 'me', 'qua', 'ran', 'tine', 'lock', 'down', 'mask', 'case', 'test', 'sch', 'ool']
+EMOJI = ['\U0001F637', '\U0001F62D', '\U0001F602', '\U0001F64F', '❤️', '\U0001F44D', '\U0001F9A0',
+         '\U0001F914', '\U0001F621', '\U0001F3E0']
+EMOTICONS = [':)', ':(', ':D', ';)', '<3', ":'(", ':-)']
+HASHTAGS = ['covid19', 'coronavirus', 'stayhome', 'lockdown', 'socialdistancing', 'covid_19', 'quarantine']
+COUNTRIES = ['United States', 'United Kingdom', 'India', 'Canada', 'Australia', 'Nigeria', 'South Africa']
+START_TIME = datetime(2020, 3, 1)
+
+
+class SyntheticTweets(object):
+    """Generator of hydrated tweets and annotated records, deterministic for a given seed."""
+
+    def __init__(self, seed=0, vocab_size=20000, zipf_exponent=1.1, mean_words=18):
+        """
+
+        Parameters
+        ----------
+        seed : int, optional
+            Seed of the vocabulary and the tweets.
+        vocab_size : int, optional
+            Number of distinct words.
+        zipf_exponent : float, optional
+            Exponent `s` of the word frequencies, proportional to 1 / rank^s.
+        mean_words : int, optional
+            Median number of words per tweet.
+
+        """
+        self.random_state = np.random.RandomState(seed)
+        words = set()
+        while len(words) < vocab_size:
+            num_syllables = self.random_state.randint(1, 5)
+            words.add(''.join(self.random_state.choice(SYLLABLES, num_syllables)))
+        # sorted first, so that the frequency ranks don't depend on the set order
+        self.vocab = np.array(sorted(words))
+        self.random_state.shuffle(self.vocab)
+        weights = 1.0 / np.arange(1, vocab_size + 1) ** zipf_exponent
+        self.cum_weights = np.cumsum(weights / weights.sum())
+        self.mean_words = mean_words
+
+    def words(self, num_words):
+        ranks = np.searchsorted(self.cum_weights, self.random_state.random_sample(num_words))
+        return list(self.vocab[np.minimum(ranks, len(self.vocab) - 1)])
+
+    def num_words(self):
+        return int(np.clip(self.random_state.lognormal(np.log(self.mean_words), 0.5), 1, 60))
+
+    def text(self):
+        """Raw tweet text."""
+        rs = self.random_state
+        tokens = self.words(self.num_words())
+        extras = []
+        if rs.random_sample() < 0.15:
+            tokens.insert(0, f'RT @user{rs.randint(100000)}:')
+        for _ in range(rs.poisson(0.4)):
+            extras.append(f'@user{rs.randint(100000)}')
+        for _ in range(rs.poisson(0.6)):
+            extras.append('#' + (rs.choice(HASHTAGS) if rs.random_sample() < 0.6 else self.words(1)[0]))
+        for _ in range(rs.poisson(0.5)):
+            extras.append(rs.choice(EMOJI) * rs.randint(1, 4))
+        for _ in range(rs.poisson(0.1)):
+            extras.append(rs.choice(EMOTICONS))
+        for _ in range(rs.poisson(0.3)):
+            extras.append(str(rs.randint(1, 100000)))
+        if rs.random_sample() < 0.1:
+            word = tokens[rs.randint(len(tokens))]
+            extras.append(word + word[-1] * rs.randint(2, 6))
+        for extra in extras:
+            tokens.insert(rs.randint(len(tokens) + 1), extra)
+        if rs.random_sample() < 0.45:
+            tokens.append(f'https://t.co/{"".join(rs.choice(list("abcdefghijkLMNOP0123456789"), 10))}')
+        if rs.random_sample() < 0.1:
+            tokens.append('...')
+        return ' '.join(tokens)
+
+    def hydrated_tweet(self, tweet_id, created_at):
+        """A tweet with the fields `filter_tweets.py` and `preprocess.py` read, as returned by twarc."""
+        rs = self.random_state
+        place = {'country': rs.choice(COUNTRIES), 'country_code': 'XX'} if rs.random_sample() < 0.6 else None
+        return {
+            'created_at': created_at.strftime('%a %b %d %H:%M:%S +0000 %Y'),
+            'id': tweet_id,
+            'id_str': str(tweet_id),
+            'full_text': self.text(),
+            'in_reply_to_status_id': None,
+            'place': place,
+            'retweet_count': int(rs.zipf(2.0)) - 1,
+            'favorite_count': int(rs.zipf(1.8)) - 1,
+            'lang': 'en' if rs.random_sample() < 0.9 else rs.choice(['es', 'fr', 'hi', 'und']),
+        }
+
+    def annotated_record(self, tweet_id, date):
+        """An annotated tweet as written by `extract_candidates.py`."""
+        candidates = self.words(max(1, self.num_words() // 2))
+        return {
+            'created_at': date,
+            'date': date,
+            'id_str': str(tweet_id),
+            'tokens': candidates,
+            'candidates': candidates,
+            'candidates_idxs': list(range(len(candidates))),
+        }
+
+
+def hours(days):
+    for hour in range(24 * days):
+        yield START_TIME + timedelta(hours=hour)
+
+
+def write_dataset(output_dir, kind, days, tweets_per_hour, codec='none', seed=0, vocab_size=20000):
+    """Write a synthetic dataset of `kind` 'hydrated', 'filtered' or 'annotated' hourly files.
+
+    Returns
+    -------
+    list of str
+        The written files.
+
+    """
+    generator = SyntheticTweets(seed, vocab_size)
+    paths = []
+    tweet_id = 1240000000000000000
+    for timestamp in hours(days):
+        hour = timestamp.strftime('%Y-%m-%d-%H')
+        month_dir = os.path.join(output_dir, timestamp.strftime('%Y-%m'))
+        os.makedirs(month_dir, exist_ok=True)
+        if kind == 'hydrated':
+            # the input of filter_tweets.py is always gzip'ed
+            path = jsonl_path(os.path.join(month_dir, f'coronavirus-tweet-id-{hour}'), 'gzip')
+            file_codec = 'gzip'
+        else:
+            name = 'coronavirus-tweet' if kind == 'filtered' else 'coronavirus-tweet-annotated'
+            path = jsonl_path(os.path.join(month_dir, f'{name}-{hour}'), codec)
+            file_codec = codec
+        with open_writer(path, file_codec) as f:
+            for _ in range(tweets_per_hour):
+                tweet_id += 1
+                if kind == 'annotated':
+                    tweet = generator.annotated_record(tweet_id, timestamp.strftime('%Y-%m-%d'))
+                else:
+                    tweet = generator.hydrated_tweet(tweet_id, timestamp)
+                f.write(json.dumps(tweet) + '\n')
+        paths.append(path)
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic tweet dataset')
+    parser.add_argument('--output_dir', required=True)
+    parser.add_argument('--kind', default='hydrated', choices=['hydrated', 'filtered', 'annotated'])
+    parser.add_argument('--days', type=int, default=1)
+    parser.add_argument('--tweets_per_hour', type=int, default=2000)
+    parser.add_argument('--vocab_size', type=int, default=20000)
+    parser.add_argument('--codec', default='none', choices=list(CODEC_EXTENSIONS))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(args)
+    paths = write_dataset(args.output_dir, args.kind, args.days, args.tweets_per_hour, args.codec, args.seed,
+                          args.vocab_size)
+    logger.info(f'{len(paths)} files written to {args.output_dir}')
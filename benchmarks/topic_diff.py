@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+
+import numpy as np
+from gensim.matutils import kullback_leibler, hellinger, jaccard_distance, jensen_shannon
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ldamodel import topic_distances, _word_incidence
+from utils import set_console_logger
+
+"""
+Speed and agreement of the vectorized topic distances of `LdaModel.diff` against the per-pair `gensim.matutils`
+functions it used before, on random Dirichlet topics of two models.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+
+REFERENCE = {
+    'kullback_leibler': kullback_leibler,
+    'hellinger': hellinger,
+    'jensen_shannon': jensen_shannon,
+    'jaccard': jaccard_distance,
+}
+
+
+def random_topics(random_state, num_topics):
+    return random_state.dirichlet(np.full(args.num_terms, args.eta), num_topics)
+
+
+def top_words(topics):
+    return [set(np.argsort(-topic)[:args.num_words].tolist()) for topic in topics]
+
+
+def main():
+    random_state = np.random.RandomState(args.seed)
+    topics1 = random_topics(random_state, args.num_topics)
+    topics2 = random_topics(random_state, args.num_topics)
+    words1, words2 = top_words(topics1), top_words(topics2)
+    _, incidence1, incidence2 = _word_incidence([sorted(words) for words in words1],
+                                                [sorted(words) for words in words2])
+    # the reference is slow, compare its first rows only
+    rows = min(args.reference_rows, args.num_topics)
+
+    results = []
+    for distance, reference_func in REFERENCE.items():
+        d1, d2 = (incidence1, incidence2) if distance == 'jaccard' else (topics1, topics2)
+        r1, r2 = (words1, words2) if distance == 'jaccard' else (topics1, topics2)
+
+        start_time = time.perf_counter()
+        z = topic_distances(d1, d2, distance)
+        vectorized_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        reference = np.array([[reference_func(r1[i], r2[j]) for j in range(len(r2))] for i in range(rows)])
+        reference_time = (time.perf_counter() - start_time) * args.num_topics / rows
+
+        result = {'distance': distance, 'num_topics': args.num_topics, 'num_terms': args.num_terms,
+                  'vectorized_seconds': vectorized_time, 'reference_seconds': reference_time,
+                  'max_abs_difference': float(np.max(np.abs(z[:rows] - reference)))}
+        logger.info(json.dumps(result))
+        results.append(result)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark of the topic distances of LdaModel.diff')
+    parser.add_argument('--num_topics', type=int, default=100)
+    parser.add_argument('--num_terms', type=int, default=20000)
+    parser.add_argument('--num_words', type=int, default=100, help='top words of the jaccard distance')
+    parser.add_argument('--eta', type=float, default=0.05, help='Dirichlet parameter of the random topics')
+    parser.add_argument('--reference_rows', type=int, default=10, help='rows computed with the reference')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args()
+    print(args)
+    main()
@@ -0,0 +1,377 @@
+import os
+import json
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+import scipy.sparse as sp
+from gensim import matutils
+from gensim.models.callbacks import Metric
+
+"""
+Coherence scoring from a persistent co-occurrence index.
+
+gensim's CoherenceModel re-estimates the word (co-)occurrence probabilities over the whole corpus for every
+model it scores. The index counts them once per corpus, dictionary and window size, so that any model's
+u_mass / c_v / c_uci / c_npmi coherence is computed from lookups. The measures follow gensim's pipelines
+(segmentation, confirmation measure and arithmetic mean aggregation), and the windows follow its
+WordOccurrenceAccumulator: a text shorter than the window is one window, a word leaves a sliding window with its
+first occurrence, and only the windows of the texts containing a word of the scored topics are counted.
+
+The scores are not guaranteed to be the same as gensim's, whose log(EPSILON) terms magnify any difference of the
+counts, so the metrics record which backend scored them and scores of different backends should not be compared.
+`benchmarks/coherence_check.py` reports the differences of every measure on a synthetic corpus.
+"""
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-12
+# version of the counts of saved indexes, older ones are rebuilt by :meth:`CoherenceIndex.load_or_build`
+INDEX_VERSION = 2
+
+# gensim's default window size of each measure; None means whole documents (boolean document estimation)
+DEFAULT_WINDOW_SIZES = {
+    'u_mass': None,
+    'c_v': 110,
+    'c_uci': 10,
+    'c_npmi': 10,
+}
+
+
+def dictionary_fingerprint(dictionary):
+    """Hash of the token -> id mapping of a :class:`~gensim.corpora.dictionary.Dictionary`."""
+    items = sorted(dictionary.token2id.items(), key=lambda item: item[1])
+    return hashlib.sha1(json.dumps(items).encode('utf-8')).hexdigest()
+
+
+def iter_window_words(ids, window_size):
+    """Yield the sorted word ids (-1 excluded) of every boolean sliding window of a document.
+
+    The whole document is one window if it is not longer than `window_size`. Like gensim's
+    WordOccurrenceAccumulator, sliding the window removes the word leaving it even if the window still contains it,
+    until the word enters the window again.
+    """
+    if window_size is None or len(ids) <= window_size:
+        yield np.unique(ids[ids >= 0])
+        return
+    tokens = ids.tolist()
+    words = set(tokens[:window_size])
+    yield np.array(sorted(word for word in words if word >= 0), dtype=np.int64)
+    for start in range(1, len(tokens) - window_size + 1):
+        words.discard(tokens[start - 1])
+        words.add(tokens[start + window_size - 1])
+        yield np.array(sorted(word for word in words if word >= 0), dtype=np.int64)
+
+
+def topics_from_model(model, topn=20):
+    """Get the `topn` most probable word ids of every topic of `model`."""
+    return [matutils.argsort(topic, topn=topn, reverse=True) for topic in model.get_topics()]
+
+
+class CoherenceIndex(object):
+    """Windowed document frequencies and co-occurrence counts of a corpus.
+
+    `df[w]` is the number of windows containing word `w`, `cooc[v, w]` (with `v < w`) the number of windows
+    containing both, stored as an upper triangular :class:`scipy.sparse.csr_matrix`. `doc_words` is the boolean
+    (texts, words) incidence matrix and `doc_windows` the number of windows of every text, from which
+    :meth:`relevant_windows` gets the normalizer of the sliding window measures.
+
+    """
+
+    def __init__(self, num_terms, window_size=None, fingerprint=None):
+        """
+
+        Parameters
+        ----------
+        num_terms : int
+            Size of the vocabulary.
+        window_size : int, optional
+            Size of the boolean sliding windows, None to count whole documents.
+        fingerprint : str, optional
+            :func:`dictionary_fingerprint` of the dictionary the word ids come from.
+
+        """
+        self.num_terms = num_terms
+        self.window_size = window_size
+        self.fingerprint = fingerprint
+        self.version = INDEX_VERSION
+        self.num_windows = 0
+        self.df = np.zeros(num_terms, dtype=np.int64)
+        self.cooc = sp.csr_matrix((num_terms, num_terms), dtype=np.int64)
+        self.doc_words = None
+        self.doc_windows = None
+
+    @classmethod
+    def build(cls, texts, dictionary, window_size=None, batch_size=1000000):
+        """Count the (co-)occurrences of the dictionary's words in `texts`.
+
+        Parameters
+        ----------
+        texts : iterable of list of str
+            Tokenized documents.
+        dictionary : :class:`~gensim.corpora.dictionary.Dictionary`
+            Dictionary mapping the tokens to ids. Tokens missing from it still take up window positions.
+        window_size : int, optional
+            Size of the boolean sliding windows, None to count whole documents.
+        batch_size : int, optional
+            Number of word pairs to collect before adding them to the sparse matrix.
+
+        Returns
+        -------
+        :class:`CoherenceIndex`
+            The index.
+
+        """
+        num_terms = 1 + max(dictionary.keys()) if len(dictionary) else 0
+        index = cls(num_terms, window_size, dictionary_fingerprint(dictionary))
+        token2id = dictionary.token2id
+        rows, cols = [], []
+        doc_words, doc_windows = [], []
+        pending = 0
+        for text in texts:
+            ids = np.fromiter((token2id.get(token, -1) for token in text), dtype=np.int64, count=len(text))
+            num_windows = index.num_windows
+            pending += index._add_document(ids, rows, cols)
+            doc_words.append(np.unique(ids[ids >= 0]))
+            doc_windows.append(index.num_windows - num_windows)
+            if pending >= batch_size:
+                index._flush_pairs(rows, cols)
+                pending = 0
+        index._flush_pairs(rows, cols)
+        index.doc_windows = np.array(doc_windows, dtype=np.int64)
+        doc_ids = np.repeat(np.arange(len(doc_words), dtype=np.int64), [len(words) for words in doc_words])
+        doc_words = np.concatenate(doc_words) if doc_words else np.zeros(0, dtype=np.int64)
+        index.doc_words = sp.csc_matrix((np.ones(len(doc_words), dtype=bool), (doc_ids, doc_words)),
+                                        shape=(len(index.doc_windows), num_terms))
+        logger.info("coherence index: %i windows, %i co-occurring pairs", index.num_windows, index.cooc.nnz)
+        return index
+
+    def _add_document(self, ids, rows, cols):
+        pairs = 0
+        for words in iter_window_words(ids, self.window_size):
+            self.num_windows += 1
+            if len(words) == 0:
+                continue
+            self.df[words] += 1
+            first, second = np.triu_indices(len(words), 1)
+            rows.append(words[first])
+            cols.append(words[second])
+            pairs += len(first)
+        return pairs
+
+    def _flush_pairs(self, rows, cols):
+        if rows:
+            rows_, cols_ = np.concatenate(rows), np.concatenate(cols)
+            counts = sp.coo_matrix((np.ones(len(rows_), dtype=np.int64), (rows_, cols_)),
+                                   shape=(self.num_terms, self.num_terms))
+            self.cooc = self.cooc + counts.tocsr()
+        del rows[:], cols[:]
+
+    def save(self, fname):
+        """Store the index in a single file, `fname` should end with `.npz`."""
+        doc_arrays = {}
+        if self.doc_words is not None:
+            doc_arrays = dict(doc_windows=self.doc_windows, doc_indices=self.doc_words.indices,
+                              doc_indptr=self.doc_words.indptr)
+        np.savez(fname, df=self.df, data=self.cooc.data, indices=self.cooc.indices, indptr=self.cooc.indptr,
+                 num_terms=self.num_terms, num_windows=self.num_windows,
+                 window_size=-1 if self.window_size is None else self.window_size,
+                 fingerprint=self.fingerprint or '', version=INDEX_VERSION, **doc_arrays)
+
+    @classmethod
+    def load(cls, fname, dictionary=None):
+        """Load an index stored with :meth:`save`.
+
+        Parameters
+        ----------
+        fname : str
+            Path to the `.npz` file.
+        dictionary : :class:`~gensim.corpora.dictionary.Dictionary`, optional
+            If given, check that the index was built with this dictionary.
+
+        Returns
+        -------
+        :class:`CoherenceIndex`
+            The index.
+
+        """
+        with np.load(fname) as f:
+            window_size = int(f['window_size'])
+            index = cls(int(f['num_terms']), None if window_size < 0 else window_size,
+                        str(f['fingerprint']) or None)
+            index.version = int(f['version']) if 'version' in f.files else 1
+            index.num_windows = int(f['num_windows'])
+            index.df = f['df']
+            index.cooc = sp.csr_matrix((f['data'], f['indices'], f['indptr']),
+                                       shape=(index.num_terms, index.num_terms))
+            if 'doc_windows' in f.files:
+                index.doc_windows = f['doc_windows']
+                index.doc_words = sp.csc_matrix(
+                    (np.ones(len(f['doc_indices']), dtype=bool), f['doc_indices'], f['doc_indptr']),
+                    shape=(len(index.doc_windows), index.num_terms))
+        if index.version != INDEX_VERSION:
+            logger.warning("coherence index %s has the counts of version %i instead of %i, rebuild it",
+                           fname, index.version, INDEX_VERSION)
+        if dictionary is not None and index.fingerprint != dictionary_fingerprint(dictionary):
+            raise ValueError(f'coherence index {fname} was built with a different dictionary')
+        return index
+
+    @classmethod
+    def load_or_build(cls, fname, texts, dictionary, window_size=None):
+        """Load the index from `fname` if it exists and matches, otherwise build it and save it there."""
+        if os.path.isfile(fname):
+            try:
+                index = cls.load(fname, dictionary)
+                if index.window_size == window_size and index.version == INDEX_VERSION and (
+                        window_size is None or index.doc_words is not None):
+                    logger.info("loaded coherence index from %s", fname)
+                    return index
+                logger.warning("coherence index %s has window size %s, version %i or no per-text windows, "
+                               "rebuilding", fname, index.window_size, index.version)
+            except ValueError as e:
+                logger.warning("%s, rebuilding", e)
+        index = cls.build(texts, dictionary, window_size)
+        index.save(fname)
+        logger.info("saved coherence index to %s", fname)
+        return index
+
+    def cooccurrences(self, ids):
+        """Get the symmetric co-occurrence counts of `ids`, with their document frequencies on the diagonal."""
+        ids = np.asarray(ids)
+        block = self.cooc[ids][:, ids].toarray()
+        block = block + block.T
+        block[np.diag_indices(len(ids))] = self.df[ids]
+        return block
+
+    def relevant_windows(self, topics):
+        """Get the number of windows the probabilities of the words of `topics` are estimated over.
+
+        Like gensim, only the windows of the texts containing at least one word of `topics` are counted for sliding
+        windows; whole documents (u_mass) are all counted.
+        """
+        if self.window_size is None:
+            return self.num_windows
+        if self.doc_words is None:
+            logger.warning("coherence index without per-text windows, normalizing by all windows")
+            return self.num_windows
+        ids = np.unique(np.concatenate([np.asarray(topic, dtype=np.int64) for topic in topics]))
+        docs = np.unique(self.doc_words[:, ids].indices)
+        return int(self.doc_windows[docs].sum())
+
+    def _log_ratio(self, ids, normalize, num_windows):
+        counts = self.cooccurrences(ids) / num_windows
+        probs = self.df[ids] / num_windows
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_ratio = np.log((counts + EPSILON) / np.outer(probs, probs))
+            if normalize:
+                log_ratio /= -np.log(counts + EPSILON)
+        return log_ratio
+
+    def get_coherence_per_topic(self, topics, coherence='c_v'):
+        """Score each topic.
+
+        Parameters
+        ----------
+        topics : list of list of int
+            Word ids of each topic, most probable first.
+        coherence : {'u_mass', 'c_v', 'c_uci', 'c_npmi'}, optional
+            Coherence measure.
+
+        Returns
+        -------
+        list of float
+            The coherence of each topic.
+
+        """
+        if coherence not in DEFAULT_WINDOW_SIZES:
+            raise ValueError(f'unsupported coherence measure {coherence}')
+        if DEFAULT_WINDOW_SIZES[coherence] != self.window_size:
+            logger.warning("scoring %s with window size %s instead of its default %s",
+                           coherence, self.window_size, DEFAULT_WINDOW_SIZES[coherence])
+        # the topics are scored together, as by one gensim CoherenceModel
+        num_windows = self.relevant_windows(topics)
+        scores = []
+        for ids in topics:
+            n = len(ids)
+            if coherence == 'u_mass':
+                # segmentation s_one_pre: (w_i, w_j) for j < i, log conditional probability
+                counts = self.cooccurrences(ids) / num_windows
+                probs = self.df[np.asarray(ids)] / num_windows
+                first, second = np.tril_indices(n, -1)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    measures = np.log((counts[first, second] + EPSILON) / probs[second])
+            elif coherence in ('c_uci', 'c_npmi'):
+                # segmentation s_one_one: all ordered pairs, symmetric measure
+                log_ratio = self._log_ratio(ids, coherence == 'c_npmi', num_windows)
+                measures = log_ratio[np.triu_indices(n, 1)]
+            else:
+                # segmentation s_one_set: every word against the whole topic, indirect cosine of NPMI context vectors
+                npmi = self._log_ratio(ids, True, num_windows)
+                topic_vector = npmi.sum(axis=0)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    measures = npmi.dot(topic_vector) / (
+                        np.linalg.norm(npmi, axis=1) * np.linalg.norm(topic_vector))
+            scores.append(float(np.mean(measures)))
+        return scores
+
+    def get_coherence(self, topics, coherence='c_v'):
+        """Average coherence over `topics`, see :meth:`get_coherence_per_topic`."""
+        return float(np.mean(self.get_coherence_per_topic(topics, coherence)))
+
+
+class IndexedCoherenceMetric(Metric):
+    """Coherence callback scoring the model's topics from a :class:`CoherenceIndex`."""
+
+    def __init__(self, index, coherence='c_v', topn=20, logger=None, viz_env=None, title='Coherence'):
+        """
+
+        Parameters
+        ----------
+        index : :class:`CoherenceIndex`
+            Index of the training texts.
+        coherence : {'u_mass', 'c_v', 'c_uci', 'c_npmi'}, optional
+            Coherence measure.
+        topn : int, optional
+            Number of top words of each topic to score.
+        logger : {'shell', 'visdom'}, optional
+           Monitor training process using one of the available methods.
+        viz_env : object, optional
+            Visdom environment to use for plotting the graph. Unused.
+        title : str, optional
+            Title of the graph plot.
+
+        """
+        self.index = index
+        self.coherence = coherence
+        self.topn = topn
+        self.logger = logger
+        self.viz_env = viz_env
+        self.title = title
+
+    def get_value(self, **kwargs):
+        """Get the coherence score of `model` (or of the given `topics`, as word id lists)."""
+        self.topics = None
+        self.model = None
+        super(IndexedCoherenceMetric, self).set_parameters(**kwargs)
+        topics = self.topics if self.topics is not None else topics_from_model(self.model, self.topn)
+        return self.index.get_coherence(topics, self.coherence)
+
+
+if __name__ == '__main__':
+    from gensim.corpora.dictionary import Dictionary
+    from train_lda import load_corpus
+    from utils import set_console_logger
+
+    parser = argparse.ArgumentParser(description='Build a coherence index')
+    parser.add_argument('--dataset_dir', required=True, help='dataset directory')
+    parser.add_argument('--dictionary', required=True, help='saved gensim Dictionary')
+    parser.add_argument('--output', required=True, help='index file (.npz)')
+    parser.add_argument('--coherence', default='c_v', choices=list(DEFAULT_WINDOW_SIZES),
+                        help='build with the window size of this measure')
+    args = parser.parse_args()
+    print(args)
+    set_console_logger()
+    corpus = load_corpus(args.dataset_dir)
+    dictionary = Dictionary.load(args.dictionary)
+    CoherenceIndex.build(corpus, dictionary, DEFAULT_WINDOW_SIZES[args.coherence]).save(args.output)
@@ -0,0 +1,455 @@
+import os
+import logging
+import itertools
+from collections import Counter
+
+import numpy as np
+from gensim.corpora.dictionary import Dictionary
+
+from coherence import dictionary_fingerprint
+from scheduler import plan_tasks, run_tasks
+from utils import profiler
+from tweetio import read_jsonl, is_jsonl, strip_extension
+
+"""
+Compact bag-of-words corpus representation shared by the training scripts, with a parallel vocabulary builder
+and a vectorized, cached encoder for the annotated tweet files.
+"""
+
+logger = logging.getLogger(__name__)
+
+# shared vocabulary of the id sidecars, in the dataset directory
+VOCABULARY_FILENAME = 'candidates.vocab'
+
+
+class CsrCorpus(object):
+    """Bag-of-words corpus stored as CSR arrays.
+
+    Document `d` consists of the term ids `indices[indptr[d]:indptr[d + 1]]` with the counts at the same
+    positions of `data`. Iterating yields the usual gensim `list of (int, float)` documents, so the corpus can be
+    passed wherever a list of bag-of-words documents is expected. The arrays are plain numpy buffers that can be
+    memory-mapped and shared read-only between processes.
+
+    """
+
+    def __init__(self, indptr, indices, data):
+        """
+
+        Parameters
+        ----------
+        indptr : numpy.ndarray
+            Offsets of the documents, shape (`num_docs` + 1, ).
+        indices : numpy.ndarray
+            Term ids of all documents.
+        data : numpy.ndarray
+            Term counts of all documents.
+
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_bow(cls, bow_corpus):
+        """Convert a list of bag-of-words documents."""
+        lengths = np.fromiter((len(doc) for doc in bow_corpus), dtype=np.int64, count=len(bow_corpus))
+        indptr = np.zeros(len(bow_corpus) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        indices = np.fromiter((word_id for doc in bow_corpus for word_id, _ in doc),
+                              dtype=np.int32, count=indptr[-1])
+        data = np.fromiter((count for doc in bow_corpus for _, count in doc),
+                           dtype=np.float32, count=indptr[-1])
+        return cls(indptr, indices, data)
+
+    @classmethod
+    def concatenate(cls, corpora):
+        """Join corpora document-wise, in order."""
+        corpora = list(corpora)
+        if not corpora:
+            return cls(np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+        offsets = np.cumsum([0] + [corpus.indptr[-1] for corpus in corpora[:-1]])
+        indptr = np.concatenate([[0]] + [corpus.indptr[1:] + offset for corpus, offset in zip(corpora, offsets)])
+        return cls(indptr.astype(np.int64),
+                   np.concatenate([corpus.indices for corpus in corpora]),
+                   np.concatenate([corpus.data for corpus in corpora]))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def slice(self, start, end):
+        """Get documents [start, end) as a corpus whose `indices` and `data` are views of this corpus' arrays."""
+        start = max(0, min(start, len(self)))
+        end = max(start, min(end, len(self)))
+        offset, stop = self.indptr[start], self.indptr[end]
+        return CsrCorpus(self.indptr[start:end + 1] - offset, self.indices[offset:stop], self.data[offset:stop])
+
+    def chunks(self, chunksize):
+        """Yield consecutive slices of `chunksize` documents, see :meth:`slice`."""
+        for start in range(0, len(self), chunksize):
+            yield self.slice(start, start + chunksize)
+
+    def __getitem__(self, docno):
+        start, end = self.indptr[docno], self.indptr[docno + 1]
+        return list(zip(self.indices[start:end].tolist(), self.data[start:end].tolist()))
+
+    def __iter__(self):
+        for docno in range(len(self)):
+            yield self[docno]
+
+    def save(self, fname):
+        """Store the arrays as `fname.indptr.npy`, `fname.indices.npy` and `fname.data.npy`."""
+        for name in ('indptr', 'indices', 'data'):
+            np.save(f'{fname}.{name}.npy', getattr(self, name))
+
+    @classmethod
+    def load(cls, fname, mmap_mode=None):
+        """Load a corpus stored with :meth:`save`.
+
+        Parameters
+        ----------
+        fname : str
+            Path prefix the corpus was saved with.
+        mmap_mode : {None, 'r'}, optional
+            If 'r', the arrays are memory-mapped read-only instead of read into memory, so that several
+            processes share the same pages.
+
+        """
+        return cls(*(np.load(f'{fname}.{name}.npy', mmap_mode=mmap_mode) for name in ('indptr', 'indices', 'data')))
+
+    @staticmethod
+    def exists(fname):
+        """Whether a corpus was saved with path prefix `fname`."""
+        return all(os.path.isfile(f'{fname}.{name}.npy') for name in ('indptr', 'indices', 'data'))
+
+
+def annotated_paths(dataset_dir, months=None):
+    """Get the annotated tweet files of `dataset_dir` in a fixed (sorted) order."""
+    data_files = []
+    for month_dir in sorted(os.listdir(dataset_dir)):
+        month_path = os.path.join(dataset_dir, month_dir)
+        if not os.path.isdir(month_path) or (months and month_dir not in months):
+            continue
+        for filename in sorted(os.listdir(month_path)):
+            if is_jsonl(filename) and 'annotated' in filename:
+                data_files.append(os.path.join(month_path, filename))
+    return data_files
+
+
+def read_candidates(path):
+    """Yield the candidate tokens of every tweet of an annotated file."""
+    for tweet in read_jsonl(path):
+        yield tweet['candidates']
+
+
+def ids_path(path):
+    """Path of the token id sidecar of annotated file `path`."""
+    return f'{strip_extension(path)}.ids.npz'
+
+
+def vocabulary_path(path):
+    """Path of the vocabulary shared by the id sidecars of the dataset directory of annotated file `path`."""
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(path))), VOCABULARY_FILENAME)
+
+
+class Vocabulary(object):
+    """Append-only list of all candidate tokens of a dataset, the global ids of the id sidecars.
+
+    Ids are line numbers of the vocabulary file, new tokens are only ever appended to it, so the sidecars written
+    earlier stay valid.
+
+    """
+
+    def __init__(self, fname):
+        """
+
+        Parameters
+        ----------
+        fname : str
+            Vocabulary file, one token per line, created by :meth:`flush` if it does not exist.
+
+        """
+        self.fname = fname
+        self.tokens = []
+        if os.path.isfile(fname):
+            with open(fname) as f:
+                self.tokens = f.read().splitlines()
+        self.token2id = {token: token_id for token_id, token in enumerate(self.tokens)}
+        self.num_saved = len(self.tokens)
+
+    def encode(self, texts):
+        """Map tokenized documents to global ids, adding new tokens.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            The ids of all tokens (uint32) and the offsets of the documents, shape (`num_docs` + 1, ).
+
+        """
+        ids, offsets = [], [0]
+        for text in texts:
+            for token in text:
+                token_id = self.token2id.get(token)
+                if token_id is None:
+                    token_id = self.token2id[token] = len(self.tokens)
+                    self.tokens.append(token)
+                ids.append(token_id)
+            offsets.append(len(ids))
+        return np.array(ids, dtype=np.uint32), np.array(offsets, dtype=np.int64)
+
+    def flush(self):
+        """Append the new tokens to the vocabulary file."""
+        with open(self.fname, 'a') as f:
+            for token in self.tokens[self.num_saved:]:
+                f.write(token + '\n')
+        self.num_saved = len(self.tokens)
+
+    def lookup(self, token2id):
+        """Get the array mapping global ids to the ids of `token2id`, -1 for tokens missing from it."""
+        return np.fromiter((token2id.get(token, -1) for token in self.tokens), dtype=np.int64,
+                           count=len(self.tokens))
+
+
+def write_ids(vocabulary, path, texts):
+    """Write the id sidecar of annotated file `path` with the candidate tokens `texts` of its tweets."""
+    ids, offsets = vocabulary.encode(texts)
+    # the sidecar must not refer to ids missing from the vocabulary file
+    vocabulary.flush()
+    np.savez(ids_path(path), ids=ids, offsets=offsets)
+
+
+_vocabularies = {}
+
+
+def load_vocabulary(fname):
+    """Load a :class:`Vocabulary` once per process (again if the file has grown)."""
+    size = os.path.getsize(fname)
+    if fname not in _vocabularies or _vocabularies[fname][0] != size:
+        _vocabularies[fname] = size, Vocabulary(fname)
+    return _vocabularies[fname][1]
+
+
+def read_ids(path):
+    """Get the (ids, offsets) of the id sidecar of annotated file `path`, None if it is missing or outdated."""
+    sidecar = ids_path(path)
+    if not os.path.isfile(sidecar) or os.path.getmtime(sidecar) < os.path.getmtime(path) or \
+            not os.path.isfile(vocabulary_path(path)):
+        return None
+    with np.load(sidecar) as f:
+        return f['ids'].astype(np.int64), f['offsets']
+
+
+class CandidateTexts(object):
+    """Restartable stream over the candidate tokens of several annotated files, one file in memory at a time."""
+
+    def __init__(self, paths):
+        self.paths = paths
+
+    def __iter__(self):
+        for path in self.paths:
+            yield from read_candidates(path)
+
+
+def count_tokens(path):
+    """Document and collection frequencies of the candidate tokens of one file.
+
+    Returns
+    -------
+    (collections.Counter, collections.Counter, int, int)
+        Document frequencies, collection frequencies, number of documents and number of tokens.
+
+    """
+    sidecar = read_ids(path)
+    if sidecar is not None:
+        ids, offsets = sidecar
+        tokens = load_vocabulary(vocabulary_path(path)).tokens
+        docs = np.repeat(np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets))
+        cf_ids, cf_counts = np.unique(ids, return_counts=True)
+        df_ids, df_counts = np.unique(np.unique(docs * len(tokens) + ids) % len(tokens), return_counts=True)
+        return (Counter(dict(zip([tokens[i] for i in df_ids], df_counts.tolist()))),
+                Counter(dict(zip([tokens[i] for i in cf_ids], cf_counts.tolist()))),
+                len(offsets) - 1, len(ids))
+
+    dfs, cfs = Counter(), Counter()
+    num_docs = num_pos = 0
+    for candidates in read_candidates(path):
+        num_docs += 1
+        num_pos += len(candidates)
+        cfs.update(candidates)
+        dfs.update(set(candidates))
+    return dfs, cfs, num_docs, num_pos
+
+
+def _count_tokens(task):
+    return count_tokens(task.path)
+
+
+def build_dictionary(paths, processes=None, no_below=5, no_above=0.5):
+    """Build a filtered :class:`~gensim.corpora.dictionary.Dictionary` from annotated files in parallel.
+
+    Every file is counted in a process pool, largest first (from its id sidecar if there is one), the counts are
+    merged into the same fields gensim's `Dictionary(documents)` fills, and the dictionary is then filtered with
+    `filter_extremes`. Token ids are assigned in sorted token order, so the result does not depend on the file
+    order.
+
+    Parameters
+    ----------
+    paths : list of str
+        Annotated files.
+    processes : int, optional
+        Number of worker processes, all cores by default.
+    no_below : int, optional
+        Keep tokens which are contained in at least `no_below` documents.
+    no_above : float, optional
+        Keep tokens which are contained in no more than `no_above` documents (fraction of total corpus size).
+
+    Returns
+    -------
+    :class:`~gensim.corpora.dictionary.Dictionary`
+        The dictionary.
+
+    """
+    dfs, cfs = Counter(), Counter()
+    num_docs = num_pos = 0
+    for _, (file_dfs, file_cfs, file_docs, file_pos) in run_tasks(_count_tokens, plan_tasks(paths), processes):
+        dfs.update(file_dfs)
+        cfs.update(file_cfs)
+        num_docs += file_docs
+        num_pos += file_pos
+
+    dictionary = Dictionary()
+    dictionary.token2id = {token: token_id for token_id, token in enumerate(sorted(dfs))}
+    dictionary.dfs = {dictionary.token2id[token]: df for token, df in dfs.items()}
+    dictionary.cfs = {dictionary.token2id[token]: cf for token, cf in cfs.items()}
+    dictionary.num_docs = num_docs
+    dictionary.num_pos = num_pos
+    dictionary.num_nnz = sum(dfs.values())
+    logger.info("built dictionary of %i tokens from %i documents", len(dictionary), num_docs)
+    dictionary.filter_extremes(no_below=no_below, no_above=no_above)
+    return dictionary
+
+
+def encode_texts(texts, token2id):
+    """Encode tokenized documents into a :class:`CsrCorpus`, the same documents as `doc2bow` gives.
+
+    Instead of a Python dict of counts per document, all tokens are looked up at once and the (document, id)
+    pairs are counted with a single `np.unique`.
+
+    Parameters
+    ----------
+    texts : iterable of list of str
+        Tokenized documents.
+    token2id : dict of (str, int)
+        Token to id mapping, tokens missing from it are ignored.
+
+    """
+    tokens, lengths = [], []
+    for text in texts:
+        tokens.extend(text)
+        lengths.append(len(text))
+    ids = np.fromiter(map(token2id.get, tokens, itertools.repeat(-1)), dtype=np.int64, count=len(tokens))
+    return encode_ids(ids, lengths, 1 + max(token2id.values()) if token2id else 1)
+
+
+def encode_ids(ids, lengths, num_terms):
+    """Encode the concatenated word ids of documents into a :class:`CsrCorpus`.
+
+    Parameters
+    ----------
+    ids : numpy.ndarray
+        Word ids of all tokens, negative ids are ignored.
+    lengths : {list of int, numpy.ndarray}
+        Number of tokens of each document.
+    num_terms : int
+        Upper bound of the word ids.
+
+    """
+    num_docs = len(lengths)
+    docs = np.repeat(np.arange(num_docs, dtype=np.int64), lengths)
+    known = ids >= 0
+    keys, counts = np.unique(docs[known] * num_terms + ids[known], return_counts=True)
+    indptr = np.zeros(num_docs + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_terms, minlength=num_docs), out=indptr[1:])
+    return CsrCorpus(indptr, (keys % num_terms).astype(np.int32), counts.astype(np.float32))
+
+
+def bow_cache_path(path, fingerprint):
+    """Path prefix of the cached encoding of annotated file `path` with the dictionary of `fingerprint`."""
+    return f'{strip_extension(path)}.bow-{fingerprint[:12]}'
+
+
+def encode_file(path, dictionary, fingerprint=None, cache=True):
+    """Encode an annotated file, one document per line, reusing the encoding cached next to the file.
+
+    Without a cached encoding, the id sidecar of the file is read if there is one, otherwise its JSON lines.
+
+    Parameters
+    ----------
+    path : str
+        Annotated file.
+    dictionary : :class:`~gensim.corpora.dictionary.Dictionary`
+        Dictionary to encode with.
+    fingerprint : str, optional
+        :func:`~coherence.dictionary_fingerprint` of `dictionary`, computed if omitted.
+    cache : bool, optional
+        Whether to read and write the cache.
+
+    Returns
+    -------
+    :class:`CsrCorpus`
+        The encoded documents.
+
+    """
+    with profiler.timer('encode'):
+        fingerprint = fingerprint or dictionary_fingerprint(dictionary)
+        cache_path = bow_cache_path(path, fingerprint)
+        if cache and CsrCorpus.exists(cache_path) and \
+                os.path.getmtime(f'{cache_path}.data.npy') >= os.path.getmtime(path):
+            corpus = CsrCorpus.load(cache_path)
+        else:
+            corpus = _encode_file_uncached(path, dictionary, fingerprint)
+            if cache:
+                corpus.save(cache_path)
+    profiler.count('docs', len(corpus))
+    return corpus
+
+
+_lookups = {}
+
+
+def _encode_file_uncached(path, dictionary, fingerprint):
+    sidecar = read_ids(path)
+    if sidecar is None:
+        return encode_texts(read_candidates(path), dictionary.token2id)
+    # map the global ids of the sidecar to dictionary ids, no JSON parsing or string hashing per token
+    ids, offsets = sidecar
+    vocabulary = load_vocabulary(vocabulary_path(path))
+    key = (vocabulary.fname, len(vocabulary.tokens), fingerprint)
+    if key not in _lookups:
+        _lookups.clear()
+        _lookups[key] = vocabulary.lookup(dictionary.token2id), 1 + max(dictionary.token2id.values())
+    lookup, num_terms = _lookups[key]
+    return encode_ids(lookup[ids], np.diff(offsets), num_terms)
+
+
+def _init_encoder(dictionary, fingerprint, cache):
+    global _encoder_args
+    _encoder_args = (dictionary, fingerprint, cache)
+
+
+def _encode_file(task):
+    return encode_file(task.path, *_encoder_args)
+
+
+def encode_files(paths, dictionary, processes=None, cache=True):
+    """Encode annotated files in parallel with :func:`encode_file` into a single :class:`CsrCorpus`.
+
+    The files are encoded largest first, the documents of the corpus are in the order of `paths`.
+    """
+    fingerprint = dictionary_fingerprint(dictionary)
+    corpora = [None] * len(paths)
+    for task, file_corpus in run_tasks(_encode_file, plan_tasks(paths), processes,
+                                       initializer=_init_encoder, initargs=(dictionary, fingerprint, cache)):
+        corpora[task.index] = file_corpus
+    corpus = CsrCorpus.concatenate(corpora)
+    logger.info("encoded %i documents from %i files", len(corpus), len(paths))
+    return corpus
@@ -5,17 +5,16 @@ import re
 import sys
 import logging
 import argparse
-import gzip
 
 from tqdm import tqdm
 import nltk
 from nltk.tokenize import RegexpTokenizer
 from nltk.stem.wordnet import WordNetLemmatizer
 
-import spacy
-from spacy.lang.en.stop_words import STOP_WORDS
-
-from utils import set_console_logger
+from stopwords import STOP_WORDS
+from corpus import Vocabulary, ids_path, read_candidates, write_ids, VOCABULARY_FILENAME
+from tweetio import read_jsonl, count_lines, open_writer, jsonl_path, JSONL_PATTERN, CODEC_EXTENSIONS
+from utils import set_console_logger, profiler, add_profiling_args, run_main
 
 """
 Preprocessed.jsonl -> Annotated.jsonl
@@ -71,68 +70,82 @@ def process(tokenizer, lemmatizer, text):
     return tokens, candidates, candidates_idxs
 
 
-def extract_candidate(tokenizer, lemmatizer, data_path):
+def extract_candidate(tokenizer, lemmatizer, data_path, vocabulary=None):
     basename = os.path.basename(data_path)
     path = os.path.dirname(data_path)
-    output_file = basename.replace(
-        'preprocessed', 'annotated').replace('.gz', '')
+    output_file = jsonl_path(basename.replace('preprocessed', 'annotated'), args.codec)
     output_path = os.path.join(path, output_file)
 
-    with gzip.open(data_path, 'rt') as f, open(output_path, 'w') as out_f:
-        for idx, line in enumerate(f):
-            tweet = json.loads(line)
+    texts = []
+    with open_writer(output_path, args.codec, args.level) as out_f:
+        for tweet in read_jsonl(data_path):
             full_text = tweet['preprocessed_full_text']
 
-            tokens, candidates, candidates_idxs = process(tokenizer, lemmatizer, full_text)
+            with profiler.timer('lemmatize'):
+                tokens, candidates, candidates_idxs = process(tokenizer, lemmatizer, full_text)
 
             tweet['tokens'] = tokens
             tweet['candidates'] = candidates
             tweet['candidates_idxs'] = candidates_idxs
 
-            out_f.write(json.dumps(tweet) + '\n')
+            with profiler.timer('write'):
+                out_f.write(json.dumps(tweet) + '\n')
+            profiler.count('tweets')
+            if vocabulary is not None:
+                texts.append(candidates)
+
+    if vocabulary is not None:
+        write_ids(vocabulary, output_path, texts)
 
 
 def find_paths(dataset_dir):
+    """Get the preprocessed files to annotate and, with --write_ids, the annotated files missing an id sidecar."""
     data_files = []
+    ids_files = []
     for month_dir in os.listdir(dataset_dir):
         month_path = os.path.join(dataset_dir, month_dir)
         if not os.path.isdir(month_path):
             continue
         for filename in os.listdir(month_path):
             data_file = os.path.join(month_path, filename)
-            if re.match(r'coronavirus-tweet-preprocessed-2020-\d\d-\d\d-\d\d.jsonl.gz', filename):
+            if re.match(r'coronavirus-tweet-preprocessed-2020-\d\d-\d\d-\d\d' + JSONL_PATTERN, filename):
                 if args.force:
                     data_files.append(data_file)
                     continue
 
-                output_file = filename.replace(
-                    'preprocessed', 'annotated').replace('.gz', '')
+                output_file = jsonl_path(filename.replace('preprocessed', 'annotated'), args.codec)
                 output_path = os.path.join(month_path, output_file)
 
                 if os.path.isfile(output_path):
-                    with open(output_path) as f:
-                        anno_tweets = 0
-                        for line in f:
-                            anno_tweets += 1
-                    with gzip.open(data_file, 'rt') as f:
-                        origin_tweets = 0
-                        for line in f:
-                            origin_tweets += 1
+                    anno_tweets = count_lines(output_path)
+                    origin_tweets = count_lines(data_file)
                     if anno_tweets == origin_tweets:
                         logger.info(
                             f'Annotation complete for {data_file}. Skip.')
+                        if args.write_ids and (not os.path.isfile(ids_path(output_path)) or
+                                               os.path.getmtime(ids_path(output_path)) < os.path.getmtime(output_path)):
+                            ids_files.append(output_path)
                     else:
                         logger.warning(
                             f'Annotation not complete for {data_file}. Overwriting.')
                         data_files.append(data_file)
                 else:
                     data_files.append(data_file)
-    return data_files
+    return data_files, ids_files
 
 
 def main():
-    data_files = find_paths(args.dataset_dir)
+    data_files, ids_files = find_paths(args.dataset_dir)
     logger.info(f'{len(data_files)} data files to be annotated.')
+
+    vocabulary = None
+    if args.write_ids:
+        vocabulary = Vocabulary(os.path.join(args.dataset_dir, VOCABULARY_FILENAME))
+        logger.info(f'{len(ids_files)} annotated files without token ids, '
+                    f'{len(vocabulary.tokens)} tokens in the vocabulary.')
+        for output_path in tqdm(ids_files, total=len(ids_files), desc='token ids'):
+            write_ids(vocabulary, output_path, read_candidates(output_path))
+
     if len(data_files) == 0:
         return
 
@@ -140,7 +153,7 @@ def main():
     lemmatizer = WordNetLemmatizer()
 
     for data_file in tqdm(data_files, total=len(data_files)):
-        extract_candidate(tokenizer, lemmatizer, data_file)
+        extract_candidate(tokenizer, lemmatizer, data_file, vocabulary)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -149,7 +162,14 @@ if __name__ == '__main__':
         help='dataset directory')
     parser.add_argument('--force', '-f', action='store_true',
                         help='if processed file exists, overwrite.')
-
+    parser.add_argument('--codec', default='none', choices=list(CODEC_EXTENSIONS), help='output compression')
+    parser.add_argument('--level', type=int, help='compression level, the codec default if omitted')
+    parser.add_argument('--write_ids', action='store_true',
+                        help='also write the candidates as token ids (<annotated file>.ids.npz, vocabulary in '
+                             f'<dataset_dir>/{VOCABULARY_FILENAME}), read by the training and prediction scripts '
+                             'instead of the JSON lines')
+
+    add_profiling_args(parser)
     args = parser.parse_args()
     print(args)
-    main()
+    run_main(main, args)
@@ -11,12 +11,14 @@ import os
 import json
 import random
 import argparse
-import gzip
-from multiprocessing import Pool as ProcessPool
 from collections import Counter
 
 from tqdm import tqdm
 
+from scheduler import ScheduleStats, plan_tasks, run_tasks, merge_parts
+from tweetio import ReadStats, read_jsonl, open_writer, jsonl_path, strip_extension, is_jsonl, CODEC_EXTENSIONS
+from utils import profiler, add_profiling_args, run_main
+
 """
 Explore data downloaded from https://github.com/echen102/COVID-19-TweetIDs
 
@@ -33,18 +35,6 @@ Not None:
 """
 
 
-def read_gz(filename):
-    try:
-        with gzip.open(filename) as f:
-            for line in f:
-                tweet = json.loads(line)
-                yield tweet
-    except Exception as e:
-        print(e)
-        print(f'Errors reading {filename}, skip')
-        yield None
-
-
 def filter_base(tweet):
     return tweet is not None
 
@@ -61,22 +51,30 @@ def filter_by_popularity(tweet):
     return tweet['retweet_count'] > 200 or tweet['favorite_count'] > 50
 
 
-def filter_tweet(file_path):
+def output_path(file_path):
     basename = os.path.basename(file_path)
-    hour = basename[len('coronavirus-tweet-id-'):-len('.jsonl.gz')]
+    hour = strip_extension(basename)[len('coronavirus-tweet-id-'):]
     date = hour[:-3]
     month = date[:-3]
     hour = hour[-2:]
     output_dir = os.path.join(args.output_dir, month)
-    outpath = os.path.join(output_dir, f'coronavirus-tweet-{date}-{hour}.jsonl')
-    
+    return jsonl_path(os.path.join(output_dir, f'coronavirus-tweet-{date}-{hour}'), args.codec)
+
+
+def filter_tweet(task):
+    outpath = task.output_path(task.payload)
+
     filters = [filter_name_to_func[filter_] for filter_ in args.filters]
-    tweets = read_gz(file_path)
+    stats = ReadStats()
+    tweets = read_jsonl(task.path, stats, byte_range=task.byte_range)
     filtered_tweets = filter(lambda x: all(f(x) for f in filters), tweets)
 
-    with open(outpath, 'w') as wf:
+    with open_writer(outpath, args.codec, args.level) as wf:
         for tweet in filtered_tweets:
-            wf.write(json.dumps(tweet) + '\n')
+            with profiler.timer('write'):
+                wf.write(json.dumps(tweet) + '\n')
+            profiler.count('tweets_kept')
+    return stats
 
 
 def main():
@@ -84,15 +82,26 @@ def main():
     for data_dir in args.input_dirs:
         for filename in os.listdir(data_dir):
             path = os.path.join(data_dir, filename)
-            if filename.endswith('.jsonl.gz'):
+            if is_jsonl(filename):
                 data_files.append(path)
 
     print(f'{len(data_files)} data files found.')
 
-    workers = ProcessPool(args.num_workers)
-    with tqdm(total=len(data_files)) as pbar:
-        for _ in tqdm(workers.imap_unordered(filter_tweet, data_files)):
-            pbar.update()
+    tasks = plan_tasks(data_files, [output_path(path) for path in data_files], args.shard_mb << 20)
+    lines = corrupt = truncated = 0
+    done_shards = Counter()
+    schedule = ScheduleStats()
+    for task, stats in tqdm(run_tasks(filter_tweet, tasks, args.num_workers, stats=schedule), total=len(tasks)):
+        lines += stats.lines
+        corrupt += stats.corrupt
+        truncated += stats.truncated
+        done_shards[task.index] += 1
+        if task.num_shards > 1 and done_shards[task.index] == task.num_shards:
+            merge_parts(task.payload, task.num_shards)
+    print(f'{lines} lines read, {corrupt} corrupt lines skipped, {truncated} truncated files.')
+    for pid in sorted(schedule.busy):
+        print(f'[pid {pid}] {schedule.tasks[pid]} tasks, utilization {schedule.utilization(pid):.0%}')
+    print(f'{len(tasks)} tasks in {schedule.wall_time:.1f}s, tail {schedule.tail_time:.1f}s.')
     
 
 if __name__ == '__main__':
@@ -101,8 +110,13 @@ if __name__ == '__main__':
                         nargs='+', help='input dirs')
     parser.add_argument('--output_dir',  '-o', type=str, help='output file')
     parser.add_argument('--filters', nargs='+', default=['lang', 'geo'], choices=['lang', 'geo', 'popularity'])
+    parser.add_argument('--codec', default='none', choices=list(CODEC_EXTENSIONS), help='output compression')
+    parser.add_argument('--level', type=int, help='compression level, the codec default if omitted')
     parser.add_argument('--num-workers', type=int, default=8,
                         help='Number of CPU processes')
+    parser.add_argument('--shard_mb', type=int, default=64,
+                        help='split uncompressed input files larger than this into shards processed in parallel')
+    add_profiling_args(parser)
     args = parser.parse_args()
     print(args)
 
@@ -115,6 +129,4 @@ if __name__ == '__main__':
         'popularity': filter_by_popularity
     }
 
-    main()
-
-
+    run_main(main, args)
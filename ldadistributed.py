@@ -0,0 +1,225 @@
+import os
+import time
+import logging
+import argparse
+from multiprocessing import Process
+from multiprocessing.connection import Listener, Client, wait
+
+from ldamodel import LdaModel
+from utils import set_console_logger
+
+"""
+Self-contained distributed LDA over plain sockets, replacing gensim's Pyro4 based lda_dispatcher/lda_worker.
+
+Start a worker on every node:
+
+    python ldadistributed.py --host 0.0.0.0 --port 5000 --authkey secret
+
+and train with `LdaModel(distributed=True, ns_conf={'addresses': [...], 'authkey': b'secret'})`.
+The :class:`Dispatcher` implements the interface `LdaModel.update` expects from a dispatcher: workers run
+the E-step on the chunks they are sent and the master merges their states with `LdaState.merge`
+and blends them into the model with `LdaState.blend` in `do_mstep`.
+"""
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AUTHKEY = b'covid19-lda'
+
+
+def parse_address(address):
+    """Parse a 'host:port' string into a (host, port) tuple."""
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class Dispatcher(object):
+    """Dispatch E-step jobs to remote :func:`run_worker` processes and collect their states."""
+
+    def __init__(self, addresses, authkey=DEFAULT_AUTHKEY, maxsize=2, timeout=60):
+        """
+
+        Parameters
+        ----------
+        addresses : list of {str, (str, int)}
+            Worker addresses, either as 'host:port' strings or (host, port) tuples.
+        authkey : bytes, optional
+            Shared secret used to authenticate the connections.
+        maxsize : int, optional
+            Maximum number of outstanding jobs per worker.
+        timeout : float, optional
+            Seconds to keep retrying to connect to a worker that is still starting up.
+
+        """
+        self.addresses = [parse_address(a) if isinstance(a, str) else tuple(a) for a in addresses]
+        self.maxsize = maxsize
+        self.conns = [self._connect(address, authkey, timeout) for address in self.addresses]
+        self.outstanding = [0] * len(self.conns)
+        logger.info("connected to %i LDA workers", len(self.conns))
+
+    @staticmethod
+    def _connect(address, authkey, timeout):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                return Client(address, authkey=authkey)
+            except ConnectionRefusedError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+
+    def initialize(self, **model_params):
+        """Create a fresh (serial) model on every worker.
+
+        Parameters
+        ----------
+        **model_params
+            Parameters for :class:`~ldamodel.LdaModel` on the workers.
+
+        """
+        model_params['distributed'] = False
+        for conn in self.conns:
+            conn.send(('initialize', model_params))
+        for conn in self.conns:
+            conn.recv()
+
+    def getworkers(self):
+        """Get the addresses of all workers."""
+        return list(self.addresses)
+
+    def reset(self, state):
+        """Send the current model state to all workers and reset their sufficient statistics.
+
+        Parameters
+        ----------
+        state : :class:`~ldamodel.LdaState`
+            The state of the master model.
+
+        """
+        for conn in self.conns:
+            conn.send(('reset', state))
+
+    def _collect(self, conns):
+        for conn in wait(conns):
+            message, _ = conn.recv()
+            assert message == 'done'
+            self.outstanding[self.conns.index(conn)] -= 1
+
+    def putjob(self, job):
+        """Send a chunk to the least busy worker, blocking while all workers are saturated.
+
+        Parameters
+        ----------
+        job : list of list of (int, float)
+            The corpus chunk to run the E-step on.
+
+        """
+        while min(self.outstanding) >= self.maxsize:
+            self._collect(self.conns)
+        worker_id = self.outstanding.index(min(self.outstanding))
+        self.conns[worker_id].send(('job', job))
+        self.outstanding[worker_id] += 1
+
+    def getstate(self):
+        """Wait for all outstanding jobs and merge the workers' states.
+
+        Returns
+        -------
+        :class:`~ldamodel.LdaState`
+            Merged sufficient statistics of all jobs since the last reset.
+
+        """
+        while sum(self.outstanding) > 0:
+            self._collect([conn for conn, n in zip(self.conns, self.outstanding) if n > 0])
+        for conn in self.conns:
+            conn.send(('getstate', None))
+        result = self.conns[0].recv()
+        for conn in self.conns[1:]:
+            result.merge(conn.recv())
+        logger.info("merged states from %i workers (%i documents)", len(self.conns), result.numdocs)
+        return result
+
+    def exit(self):
+        """Close the connections; the workers go back to waiting for a new dispatcher."""
+        for conn in self.conns:
+            conn.send(('exit', None))
+            conn.close()
+        self.conns = []
+
+
+def run_worker(address, authkey=DEFAULT_AUTHKEY):
+    """Serve E-step jobs from dispatchers connecting to `address`, one dispatcher at a time.
+
+    Parameters
+    ----------
+    address : (str, int)
+        Host and port to listen on.
+    authkey : bytes, optional
+        Shared secret used to authenticate the connections.
+
+    """
+    with Listener(address, authkey=authkey) as listener:
+        logger.info("LDA worker %i listening on %s:%i", os.getpid(), *address)
+        while True:
+            conn = listener.accept()
+            logger.info("dispatcher connected from %s", listener.last_accepted)
+            model = None
+            jobs = 0
+            try:
+                while True:
+                    command, payload = conn.recv()
+                    if command == 'initialize':
+                        model = LdaModel(**payload)
+                        conn.send('ok')
+                    elif command == 'reset':
+                        model.state = payload
+                        model.sync_state()
+                        model.state.reset()
+                    elif command == 'job':
+                        gamma = model.do_estep(payload)
+                        jobs += 1
+                        conn.send(('done', gamma.shape[0]))
+                    elif command == 'getstate':
+                        logger.info("worker %i processed %i jobs", os.getpid(), jobs)
+                        conn.send(model.state)
+                    elif command == 'exit':
+                        break
+                    else:
+                        raise ValueError(f'unknown command {command}')
+            except EOFError:
+                logger.warning("dispatcher disconnected")
+            finally:
+                conn.close()
+
+
+def _run_local_worker(address, authkey):
+    set_console_logger()
+    run_worker(address, authkey)
+
+
+def start_local_workers(num_workers, base_port=5000, authkey=DEFAULT_AUTHKEY):
+    """Start `num_workers` worker processes on localhost, e.g. for testing and benchmarking.
+
+    Returns
+    -------
+    (list of :class:`multiprocessing.Process`, list of (str, int))
+        The worker processes (terminate them when done) and their addresses.
+
+    """
+    addresses = [('localhost', base_port + i) for i in range(num_workers)]
+    processes = []
+    for address in addresses:
+        process = Process(target=_run_local_worker, args=(address, authkey), daemon=True)
+        process.start()
+        processes.append(process)
+    return processes, addresses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distributed LDA worker')
+    parser.add_argument('--host', default='localhost', help='interface to listen on')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--authkey', default=DEFAULT_AUTHKEY.decode(), help='shared secret')
+    args = parser.parse_args()
+    print(args)
+    set_console_logger()
+    run_worker((args.host, args.port), args.authkey.encode())
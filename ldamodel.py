@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import numbers
 import os
@@ -6,19 +7,15 @@ import time
 import numpy as np
 import six
 from scipy.special import gammaln, psi  # gamma function utils
-from scipy.special import polygamma
+from scipy.special import polygamma, xlogy
 from six.moves import range
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from gensim import interfaces, utils, matutils
-from gensim.matutils import (
-    kullback_leibler, hellinger, jaccard_distance, jensen_shannon,
-    dirichlet_expectation, logsumexp, mean_absolute_difference
-)
+from gensim.matutils import dirichlet_expectation, logsumexp, mean_absolute_difference
 from gensim.models import basemodel, CoherenceModel
-from torch.utils.tensorboard import SummaryWriter
 
-from utils import seconds2clock
+from utils import seconds2clock, profiler
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +31,9 @@ class Callback():
         self.metrics = metrics
 
     def set_model(self, model):
+        # torch takes seconds to import, only pay for it when metrics are logged
+        from torch.utils.tensorboard import SummaryWriter
+
         self.model = model
         self.tb_logger = SummaryWriter(log_dir=self.log_dir)
 
@@ -51,6 +51,185 @@ class Callback():
         return current_metrics
 
 
+def is_csr(chunk):
+    """Whether `chunk` is a CSR corpus (:class:`~corpus.CsrCorpus` or a scipy.sparse.csr_matrix of documents)."""
+    return hasattr(chunk, 'indptr') and hasattr(chunk, 'indices') and hasattr(chunk, 'data')
+
+
+def iter_chunks(corpus, chunksize, as_numpy=False, dtype=np.float32):
+    """Split `corpus` into chunks of `chunksize` documents.
+
+    A :class:`~corpus.CsrCorpus` is split into slices that are views of its arrays, anything else is grouped
+    into lists of bag-of-words documents with `gensim.utils.grouper`.
+    """
+    if is_csr(corpus) and hasattr(corpus, 'chunks'):
+        return corpus.chunks(chunksize)
+    return utils.grouper(corpus, chunksize, as_numpy=as_numpy, dtype=dtype)
+
+
+def _iter_doc_arrays(chunk, dtype):
+    """Yield the (term ids, counts) arrays of every document of a chunk, without building tuples for CSR chunks."""
+    if is_csr(chunk):
+        indptr, indices, data = chunk.indptr, chunk.indices, chunk.data
+        for d in range(len(indptr) - 1):
+            start, end = indptr[d], indptr[d + 1]
+            yield indices[start:end], data[start:end].astype(dtype, copy=False)
+        return
+    integer_types = six.integer_types + (np.integer,)
+    for doc in chunk:
+        if len(doc) > 0 and not isinstance(doc[0][0], integer_types):
+            # make sure the term IDs are ints, otherwise np will get upset
+            ids = [int(idx) for idx, _ in doc]
+        else:
+            ids = [idx for idx, _ in doc]
+        yield ids, np.fromiter((cnt for _, cnt in doc), dtype=dtype, count=len(doc))
+
+
+DISTANCES = ("kullback_leibler", "hellinger", "jaccard", "jensen_shannon")
+
+# (topics hash, other topics hash, arguments) -> (difference matrix, annotation) of the latest `LdaModel.diff` calls
+DIFF_CACHE_SIZE = 64
+_diff_cache = OrderedDict()
+
+
+def topic_distances(topics1, topics2, distance, diagonal=False, block_size=1 << 22):
+    """Compute the distances between all pairs of topics of two models with matrix operations.
+
+    Parameters
+    ----------
+    topics1 : numpy.ndarray
+        Topic-word distributions, shape (`num_topics1`, `num_terms`), or for 'jaccard' the boolean incidence
+        matrix of the top words of every topic, shape (`num_topics1`, number of words).
+    topics2 : numpy.ndarray
+        The same for the other model, with the same number of columns.
+    distance : {'kullback_leibler', 'hellinger', 'jaccard', 'jensen_shannon'}
+        The distance, with the same definition as the `gensim.matutils` function of the same name.
+    diagonal : bool, optional
+        If True, only compare topic `i` of `topics1` with topic `i` of `topics2`.
+    block_size : int, optional
+        Maximum number of elements of the (topics, topics, terms) blocks that the Jensen-Shannon divergence is
+        computed in, as it does not decompose into matrix products. Each block takes a few float64 temporaries of
+        this size; blocks are split along the terms too when a single row of `topics2` is larger.
+
+    Returns
+    -------
+    numpy.ndarray
+        Distances, shape (`num_topics1`, `num_topics2`), or (`num_topics1`, ) if `diagonal`.
+
+    """
+    if distance == "hellinger":
+        sqrt1, sqrt2 = np.sqrt(topics1), np.sqrt(topics2)
+        # sum (sqrt p - sqrt q)^2 / 2 = 1 - sum sqrt(p q) for distributions
+        coefficients = (sqrt1 * sqrt2).sum(axis=1) if diagonal else np.dot(sqrt1, sqrt2.T)
+        return np.sqrt(np.maximum(1.0 - coefficients, 0.0))
+
+    if distance == "kullback_leibler":
+        # sum p log p - sum p log q, infinite where q has zeros that p has not
+        zeros2 = topics2 <= 0
+        log2 = np.log(np.where(zeros2, 1.0, topics2))
+        plogp = xlogy(topics1, topics1).sum(axis=1)
+        if diagonal:
+            z = plogp - (topics1 * log2).sum(axis=1)
+            z[((topics1 > 0) & zeros2).any(axis=1)] = np.inf
+        else:
+            z = plogp[:, None] - np.dot(topics1, log2.T)
+            if zeros2.any():
+                z[np.dot(topics1 > 0, zeros2.T.astype(topics1.dtype)) > 0] = np.inf
+        return z
+
+    if distance == "jensen_shannon":
+        # (KL(p || m) + KL(q || m)) / 2 = (sum p log p + sum q log q) / 2 - sum m log m with m = (p + q) / 2
+        plogp1 = xlogy(topics1, topics1).sum(axis=1)
+        plogp2 = xlogy(topics2, topics2).sum(axis=1)
+        if diagonal:
+            mean = (topics1 + topics2) / 2
+            return (plogp1 + plogp2) / 2 - xlogy(mean, mean).sum(axis=1)
+        num_terms = topics2.shape[1]
+        terms = max(1, min(num_terms, block_size // max(1, len(topics2))))
+        cols = max(1, min(len(topics2), block_size // terms))
+        rows = max(1, block_size // (cols * terms))
+        z = np.add.outer(plogp1, plogp2).astype(np.float64) / 2
+        for start in range(0, len(topics1), rows):
+            for col in range(0, len(topics2), cols):
+                for term in range(0, num_terms, terms):
+                    mean = (topics1[start:start + rows, None, term:term + terms] +
+                            topics2[None, col:col + cols, term:term + terms]) / 2
+                    z[start:start + rows, col:col + cols] -= xlogy(mean, mean).sum(axis=2)
+        return z
+
+    if distance == "jaccard":
+        topics1, topics2 = topics1.astype(np.float64), topics2.astype(np.float64)
+        sizes1, sizes2 = topics1.sum(axis=1), topics2.sum(axis=1)
+        if diagonal:
+            intersection = (topics1 * topics2).sum(axis=1)
+            return 1.0 - intersection / (sizes1 + sizes2 - intersection)
+        intersection = np.dot(topics1, topics2.T)
+        return 1.0 - intersection / (sizes1[:, None] + sizes2[None, :] - intersection)
+
+    raise ValueError("Incorrect distance, valid only {}".format(", ".join("`{}`".format(x) for x in DISTANCES)))
+
+
+def _copy_annotation(annotation_terms):
+    """Copy an annotation matrix of :meth:`LdaModel.diff` down to its word lists, so the cache is never shared."""
+    if annotation_terms is None:
+        return None
+    copied = np.zeros(annotation_terms.shape, dtype=list)
+    for topic in np.ndindex(annotation_terms.shape):
+        copied[topic] = [list(tokens) for tokens in annotation_terms[topic]]
+    return copied
+
+
+def _word_incidence(words1, words2):
+    """Get the vocabulary of two lists of word lists and their boolean (lists, vocabulary) incidence matrices."""
+    vocab = sorted({word for words in words1 + words2 for word in words})
+    word2index = {word: index for index, word in enumerate(vocab)}
+    incidences = []
+    for word_lists in (words1, words2):
+        incidence = np.zeros((len(word_lists), len(vocab)), dtype=bool)
+        for row, words in enumerate(word_lists):
+            incidence[row, [word2index[word] for word in words]] = True
+        incidences.append(incidence)
+    return vocab, incidences[0], incidences[1]
+
+
+def align_topics(models, reference=0, distance="hellinger", **kwargs):
+    """Match the topics of several models, e.g. of consecutive months or of a topic-count sweep, to the topics
+    of a reference model with the Hungarian algorithm on their :meth:`LdaModel.diff`.
+
+    Parameters
+    ----------
+    models : list of :class:`LdaModel`
+        The models.
+    reference : int, optional
+        Position of the reference model in `models`.
+    distance : {'kullback_leibler', 'hellinger', 'jaccard', 'jensen_shannon'}, optional
+        The distance between topics.
+    **kwargs
+        Passed to :meth:`LdaModel.diff`, e.g. `truncate_vocab`.
+
+    Returns
+    -------
+    list of (numpy.ndarray, numpy.ndarray)
+        For every model the topic matched with each topic of the reference model, -1 if there is none (when the
+        model has fewer topics), and the distance of the match, NaN if there is none.
+
+    """
+    # scipy.optimize is slow to import and only needed here
+    from scipy.optimize import linear_sum_assignment
+
+    kwargs.update(annotation=False, normed=False)
+    alignments = []
+    for model in models:
+        z, _ = models[reference].diff(model, distance=distance, **kwargs)
+        rows, cols = linear_sum_assignment(z)
+        matches = np.full(z.shape[0], -1, dtype=np.int64)
+        distances = np.full(z.shape[0], np.nan)
+        matches[rows] = cols
+        distances[rows] = z[rows, cols]
+        alignments.append((matches, distances))
+    return alignments
+
+
 def update_dir_prior(prior, N, logphat, rho):
     """Update a given prior using Newton's method, described in
     `J. Huang: "Maximum Likelihood Estimation of Dirichlet Distribution Parameters"
@@ -83,7 +262,7 @@ def update_dir_prior(prior, N, logphat, rho):
     dprior = -(gradf - b) / q
 
     updated_prior = rho * dprior + prior
-    if all(updated_prior > 0):
+    if np.all(updated_prior > 0):
         prior = updated_prior
     else:
         logger.warning("updated prior is not positive")
@@ -96,8 +275,14 @@ class LdaState(utils.SaveLoad):
     Objects of this class are sent over the network, so try to keep them lean to
     reduce traffic.
 
+    Lambda and Elogbeta are cached and only recomputed after the sufficient statistics change. The cache is
+    invalidated by the methods that modify `sstats`; code that modifies `sstats` or `eta` directly must call
+    :meth:`~gensim.models.ldamodel.LdaState.invalidate_cache`. The cache is not pickled.
+
     """
 
+    _CACHE = ('_lambda', '_Elogbeta', '_spare_Elogbeta', '_lambda_dirty', '_Elogbeta_dirty')
+
     def __init__(self, eta, shape, dtype=np.float32):
         """
 
@@ -115,11 +300,30 @@ class LdaState(utils.SaveLoad):
         self.sstats = np.zeros(shape, dtype=dtype)
         self.numdocs = 0
         self.dtype = dtype
+        self._lambda = self._Elogbeta = self._spare_Elogbeta = None
+        self.invalidate_cache()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._CACHE:
+            state.pop(name, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lambda = self._Elogbeta = self._spare_Elogbeta = None
+        self.invalidate_cache()
+
+    def invalidate_cache(self):
+        """Mark the cached lambda and Elogbeta as outdated, after `sstats` or `eta` changed."""
+        self._lambda_dirty = True
+        self._Elogbeta_dirty = True
 
     def reset(self):
         """Prepare the state for a new EM iteration (reset sufficient stats)."""
         self.sstats[:] = 0.0
         self.numdocs = 0
+        self.invalidate_cache()
 
     def merge(self, other):
         """Merge the result of an E step from one node with that of another node (summing up sufficient statistics).
@@ -135,8 +339,23 @@ class LdaState(utils.SaveLoad):
 
         """
         assert other is not None
-        self.sstats += other.sstats
-        self.numdocs += other.numdocs
+        self.merge_sstats(other.sstats, other.numdocs)
+
+    def merge_sstats(self, sstats, numdocs):
+        """Add raw sufficient statistics collected from `numdocs` documents, see
+        :meth:`~gensim.models.ldamodel.LdaState.merge`.
+
+        Parameters
+        ----------
+        sstats : numpy.ndarray
+            Sufficient statistics of the same shape as `self.sstats`.
+        numdocs : int
+            Number of documents the statistics were collected from.
+
+        """
+        self.sstats += sstats
+        self.numdocs += numdocs
+        self.invalidate_cache()
 
     def blend(self, rhot, other, targetsize=None):
         """Merge the current state with another one using a weighted average for the sufficient statistics.
@@ -178,6 +397,7 @@ class LdaState(utils.SaveLoad):
         self.sstats += rhot * scale * other.sstats
 
         self.numdocs = targetsize
+        self.invalidate_cache()
 
     def blend2(self, rhot, other, targetsize=None):
         """Merge the current state with another one using a weighted sum for the sufficient statistics.
@@ -202,27 +422,49 @@ class LdaState(utils.SaveLoad):
         # merge the two matrices by summing
         self.sstats += other.sstats
         self.numdocs = targetsize
+        self.invalidate_cache()
 
     def get_lambda(self):
         """Get the parameters of the posterior over the topics, also referred to as "the topics".
 
+        The result is cached and must not be modified.
+
         Returns
         -------
         numpy.ndarray
             Parameters of the posterior probability over topics.
 
         """
-        return self.eta + self.sstats
+        if self._lambda_dirty:
+            if self._lambda is None or self._lambda.shape != self.sstats.shape:
+                self._lambda = np.empty(self.sstats.shape, dtype=self.dtype)
+            np.add(self.eta, self.sstats, out=self._lambda)
+            self._lambda_dirty = False
+        return self._lambda
 
     def get_Elogbeta(self):
         """Get the log (posterior) probabilities for each topic.
 
+        The result is cached and must not be modified. Two buffers are used in turn, so the array returned
+        before the last change of the state stays valid until the next one, e.g. to compare the topics
+        before and after an M step.
+
         Returns
         -------
         numpy.ndarray
             Posterior probabilities for each topic.
         """
-        return dirichlet_expectation(self.get_lambda())
+        if self._Elogbeta_dirty:
+            _lambda = self.get_lambda()
+            Elogbeta = self._spare_Elogbeta
+            if Elogbeta is None or Elogbeta.shape != _lambda.shape:
+                Elogbeta = np.empty(_lambda.shape, dtype=self.dtype)
+            # dirichlet_expectation of every row, computed in place
+            psi(_lambda, out=Elogbeta)
+            Elogbeta -= psi(_lambda.sum(axis=1))[:, np.newaxis]
+            self._spare_Elogbeta, self._Elogbeta = self._Elogbeta, Elogbeta
+            self._Elogbeta_dirty = False
+        return self._Elogbeta
 
     @classmethod
     def load(cls, fname, *args, **kwargs):
@@ -254,6 +496,8 @@ class LdaState(utils.SaveLoad):
             result.dtype = np.float64
             logging.info("dtype was not set in saved %s file %s, assuming np.float64",
                          result.__class__.__name__, fname)
+        # `sstats` is stored separately and only set after unpickling
+        result.invalidate_cache()
 
         return result
 
@@ -299,7 +543,7 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
                  iterations=50, gamma_threshold=0.001, minimum_probability=0.01,
                  random_state=None, ns_conf=None, minimum_phi_value=0.01,
                  per_word_topics=False, callbacks=None, dtype=np.float32,
-                 log_dir=None,model_dir=None):
+                 log_dir=None,model_dir=None, inference_topn=None, beta_dtype=None, log_topics=5):
         """
 
         Parameters
@@ -314,7 +558,8 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             Mapping from word IDs to words. It is used to determine the vocabulary size, as well as for
             debugging and topic printing.
         distributed : bool, optional
-            Whether distributed computing should be used to accelerate training.
+            Whether distributed computing should be used to accelerate training. The E-step then runs on the
+            workers of a :class:`~ldadistributed.Dispatcher` configured by `ns_conf`.
         chunksize :  int, optional
             Number of documents to be used in each training chunk.
         passes : int, optional
@@ -356,8 +601,8 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         random_state : {np.random.RandomState, int}, optional
             Either a randomState object or a seed to generate one. Useful for reproducibility.
         ns_conf : dict of (str, object), optional
-            Key word parameters propagated to :func:`gensim.utils.getNS` to get a Pyro4 Nameserved.
-            Only used if `distributed` is set to True.
+            Key word parameters propagated to :class:`~ldadistributed.Dispatcher`, e.g. the worker `addresses`
+            and the `authkey`. Only used if `distributed` is set to True.
         minimum_phi_value : float, optional
             if `per_word_topics` is True, this represents a lower bound on the term probabilities.
         per_word_topics : bool
@@ -367,9 +612,21 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             Metric callbacks to log and visualize evaluation metrics of the model during training.
         dtype : {numpy.float16, numpy.float32, numpy.float64}, optional
             Data-type to use during calculations inside model. All inputs are also converted.
+        inference_topn : int, optional
+            If set, use approximate inference when getting the topics of documents: only the `inference_topn` most
+            likely topics of each word are considered, and each document's gamma is only updated on the union of its
+            words' candidate topics. Training always uses exact inference, otherwise every word would stay locked on
+            the topics it got at initialization. See :meth:`~gensim.models.ldamodel.LdaModel.get_topic_index`.
+        beta_dtype : {numpy.float16, numpy.float32, numpy.float64}, optional
+            Storage data-type of `expElogbeta`, defaults to `dtype`. With a narrower type (e.g. numpy.float16 and
+            `dtype=numpy.float32`) `expElogbeta` is stored and shipped to workers in reduced precision, each topic
+            row scaled by its maximum, and upcast to `dtype` block by block for the computations.
+        log_topics : int, optional
+            Number of topics logged after every M step, 0 to skip sorting and logging them.
 
         """
         self.dtype = np.finfo(dtype).dtype
+        self.beta_dtype = self.dtype if beta_dtype is None else np.finfo(beta_dtype).dtype
 
         # store user-supplied parameters
         self.id2word = id2word
@@ -406,6 +663,11 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         self.minimum_phi_value = minimum_phi_value
         self.per_word_topics = per_word_topics
         self.callbacks = callbacks
+        self.inference_topn = inference_topn
+        self._topic_index = None
+        self._term_topics = None
+        self._topics_hash = None
+        self.log_topics = log_topics
 
         self.alpha, self.optimize_alpha = self.init_dir_prior(alpha, 'alpha')
 
@@ -441,23 +703,20 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
                     "auto-optimizing alpha not implemented in distributed LDA")
             # set up distributed version
             try:
-                import Pyro4
+                from ldadistributed import Dispatcher
                 if ns_conf is None:
                     ns_conf = {}
 
-                with utils.getNS(**ns_conf) as ns:
-                    from gensim.models.lda_dispatcher import LDA_DISPATCHER_PREFIX
-                    self.dispatcher = Pyro4.Proxy(
-                        ns.list(prefix=LDA_DISPATCHER_PREFIX)[LDA_DISPATCHER_PREFIX])
-                    logger.debug("looking for dispatcher at %s" %
-                                 str(self.dispatcher._pyroUri))
-                    self.dispatcher.initialize(
-                        id2word=self.id2word, num_topics=self.num_topics, chunksize=chunksize,
-                        alpha=alpha, eta=eta, distributed=False
-                    )
-                    self.numworkers = len(self.dispatcher.getworkers())
-                    logger.info(
-                        "using distributed version with %i workers", self.numworkers)
+                self.dispatcher = Dispatcher(**ns_conf)
+                logger.debug("dispatching to workers at %s", self.dispatcher.getworkers())
+                self.dispatcher.initialize(
+                    id2word=self.id2word, num_topics=self.num_topics, chunksize=chunksize,
+                    alpha=alpha, eta=eta, iterations=iterations, gamma_threshold=gamma_threshold,
+                    dtype=dtype, beta_dtype=beta_dtype, inference_topn=inference_topn
+                )
+                self.numworkers = len(self.dispatcher.getworkers())
+                logger.info(
+                    "using distributed version with %i workers", self.numworkers)
             except Exception as err:
                 logger.error("failed to initialize distributed LDA (%s)", err)
                 raise RuntimeError(
@@ -468,11 +727,11 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             self.eta, (self.num_topics, self.num_terms), dtype=self.dtype)
         self.state.sstats[...] = self.random_state.gamma(
             100., 1. / 100., (self.num_topics, self.num_terms))
-        self.expElogbeta = np.exp(dirichlet_expectation(self.state.sstats))
+        self.sync_state(dirichlet_expectation(self.state.sstats))
 
         # Check that we haven't accidentally fallen back to np.float64
         assert self.eta.dtype == self.dtype
-        assert self.expElogbeta.dtype == self.dtype
+        assert self.expElogbeta.dtype == self.beta_dtype
 
         self.log_dir = log_dir
         self.model_dir = model_dir
@@ -576,15 +835,153 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
         if current_Elogbeta is None:
             current_Elogbeta = self.state.get_Elogbeta()
-        self.expElogbeta = np.exp(current_Elogbeta)
-        assert self.expElogbeta.dtype == self.dtype
+        expElogbeta = np.exp(current_Elogbeta)
+        if self.beta_dtype == self.dtype:
+            self.expElogbeta_scale = None
+        else:
+            # Reduced precision types have little range below 1, so store every topic row relative to its
+            # maximum and keep the per-topic scale in full precision.
+            self.expElogbeta_scale = expElogbeta.max(axis=1)
+            expElogbeta /= self.expElogbeta_scale[:, None]
+            expElogbeta = expElogbeta.astype(self.beta_dtype)
+        self.expElogbeta = expElogbeta
+        assert self.expElogbeta.dtype == self.beta_dtype
+        # the word -> topics indexes and the topics hash of the diff cache are derived from the state
+        self._topic_index = None
+        self._term_topics = None
+        self._topics_hash = None
+
+    def get_expElogbeta_columns(self, ids, topics=None):
+        """Get a block of `expElogbeta` in the computation data-type, undoing reduced precision storage.
+
+        Parameters
+        ----------
+        ids : {list of int, numpy.ndarray, slice}
+            Word ids (columns) to get.
+        topics : {list of int, numpy.ndarray}, optional
+            Topic ids (rows) to get, all topics if omitted.
+
+        Returns
+        -------
+        numpy.ndarray
+            The requested block, shape (`len(topics)`, `len(ids)`).
+
+        """
+        if topics is None:
+            block = self.expElogbeta[:, ids]
+            scale = self.expElogbeta_scale
+        else:
+            block = self.expElogbeta[np.ix_(topics, ids)]
+            scale = None if self.expElogbeta_scale is None else self.expElogbeta_scale[topics]
+        if scale is None:
+            return block
+        return block.astype(self.dtype) * scale[:, None]
+
+    def get_topic_index(self):
+        """Get the sparse word -> candidate topics index used by approximate inference.
+
+        For each word only the `inference_topn` topics with the highest `expElogbeta` are kept. The index is
+        built lazily from `expElogbeta` and rebuilt after every :meth:`~gensim.models.ldamodel.LdaModel.sync_state`.
+
+        Returns
+        -------
+        numpy.ndarray
+            Topic ids, shape (`num_terms`, `inference_topn`), or None if approximate inference is disabled.
+
+        """
+        if not self.inference_topn or self.inference_topn >= self.num_topics:
+            return None
+        if self._topic_index is None:
+            topn = self.inference_topn
+            self._topic_index = np.empty((self.num_terms, topn), dtype=np.int32)
+            block_size = 65536
+            for start in range(0, self.num_terms, block_size):
+                block = self.get_expElogbeta_columns(slice(start, start + block_size))
+                best = np.argpartition(-block, topn - 1, axis=0)[:topn]
+                self._topic_index[start:start + block.shape[1]] = best.T
+        return self._topic_index
+
+    def get_term_topics_index(self):
+        """Get the word -> topics index of :meth:`get_terms_topics`.
+
+        `expElogbeta` is transposed once into contiguous rows of words, so that looking up the topics of a word
+        reads `num_topics` adjacent values. The index is built lazily and rebuilt after every
+        :meth:`~gensim.models.ldamodel.LdaModel.sync_state`.
+
+        Returns
+        -------
+        (numpy.ndarray, numpy.ndarray)
+            The topic weights of every word, shape (`num_terms`, `num_topics`), and their sums, shape
+            (`num_terms`, ), which normalize the rows into topic distributions of the words.
+
+        """
+        if self._term_topics is None:
+            word_topics = np.empty((self.num_terms, self.num_topics), dtype=self.dtype)
+            block_size = 65536
+            for start in range(0, self.num_terms, block_size):
+                block = self.get_expElogbeta_columns(slice(start, start + block_size))
+                word_topics[start:start + block.shape[1]] = block.T
+            self._term_topics = word_topics, word_topics.sum(axis=1)
+        return self._term_topics
+
+    def align_vocabulary(self, id2word):
+        """Move the model onto a new vocabulary, so that training can continue with :meth:`update` on documents
+        encoded with `id2word` (warm start).
+
+        The learned sufficient statistics and `eta` of the terms shared by both vocabularies are copied to their
+        new ids. Terms new to the model start without statistics, i.e. their lambda equals `eta`, which is set
+        to the mean of the current `eta`. Terms missing from `id2word` are dropped.
+
+        Parameters
+        ----------
+        id2word : {dict of (int, str), :class:`gensim.corpora.dictionary.Dictionary`}
+            The new mapping from word ids to words.
+
+        Returns
+        -------
+        int
+            Number of terms new to the model.
+
+        """
+        if self.dispatcher is not None:
+            raise NotImplementedError("aligning the vocabulary is not implemented in distributed LDA")
+        if len(id2word) == 0:
+            raise ValueError("cannot compute LDA over an empty collection (no terms)")
+
+        word2old_id = {word: word_id for word_id, word in self.id2word.items()}
+        new_ids, old_ids = [], []
+        for word_id, word in id2word.items():
+            if word in word2old_id:
+                new_ids.append(word_id)
+                old_ids.append(word2old_id[word])
+        num_terms = 1 + max(id2word.keys())
+
+        eta = np.empty(self.eta.shape[:-1] + (num_terms,), dtype=self.dtype)
+        eta[...] = self.eta.mean(axis=-1, keepdims=True)
+        eta[..., new_ids] = self.eta[..., old_ids]
+        sstats = np.zeros((self.num_topics, num_terms), dtype=self.dtype)
+        sstats[:, new_ids] = self.state.sstats[:, old_ids]
+
+        numdocs = self.state.numdocs
+        self.id2word = id2word
+        self.num_terms = num_terms
+        self.eta = eta
+        self.state = LdaState(self.eta, sstats.shape, dtype=self.dtype)
+        self.state.sstats = sstats
+        self.state.numdocs = numdocs
+        self.sync_state()
+
+        num_new = len(id2word) - len(new_ids)
+        logger.info("aligned vocabulary: %i shared terms, %i new terms, %i dropped terms",
+                    len(new_ids), num_new, len(word2old_id) - len(new_ids))
+        return num_new
 
     def clear(self):
         """Clear the model's state to free some memory. Used in the distributed implementation."""
         self.state = None
         self.Elogbeta = None
 
-    def inference(self, chunk, collect_sstats=False):
+    def inference(self, chunk, collect_sstats=False, collect_phis=False, approximate=False):
         """Given a chunk of sparse document vectors, estimate gamma (parameters controlling the topic weights)
         for each document in the chunk.
 
@@ -596,31 +993,46 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
         Parameters
         ----------
-        chunk : {list of list of (int, float), scipy.sparse.csc}
-            The corpus chunk on which the inference step will be performed.
+        chunk : {list of list of (int, float), :class:`~corpus.CsrCorpus`}
+            The corpus chunk on which the inference step will be performed. The term ids and counts of a CSR chunk
+            are used as they are, without converting its documents to lists of tuples.
         collect_sstats : bool, optional
             If set to True, also collect (and return) sufficient statistics needed to update the model's topic-word
             distributions.
+        collect_phis : bool, optional
+            If set to True, also return the phi values of every document, multiplied by the word counts.
+        approximate : bool, optional
+            If set to True and `inference_topn` is set, only the candidate topics of the words are updated, see
+            :meth:`~gensim.models.ldamodel.LdaModel.get_topic_index`. Ignored when collecting sufficient statistics,
+            which must not be restricted to the current top topics of the words.
 
         Returns
         -------
         (numpy.ndarray, {numpy.ndarray, None})
             The first element is always returned and it corresponds to the states gamma matrix. The second element is
             only returned if `collect_sstats` == True and corresponds to the sufficient statistics for the M step.
+        list of numpy.ndarray
+            Only returned if `collect_phis` == True: for every document the phi values of its words scaled by their
+            counts, shape (`num_topics`, number of words of the document), in the order of the document's words.
+            The column sums of all blocks add up to the sufficient statistics of the chunk.
 
         """
-        try:
-            len(chunk)
-        except TypeError:
-            # convert iterators/generators to plain list, so we have len() etc.
-            chunk = list(chunk)
-        if len(chunk) > 1:
+        if is_csr(chunk):
+            num_docs = len(chunk.indptr) - 1
+        else:
+            try:
+                len(chunk)
+            except TypeError:
+                # convert iterators/generators to plain list, so we have len() etc.
+                chunk = list(chunk)
+            num_docs = len(chunk)
+        if num_docs > 1:
             logger.debug(
-                "performing inference on a chunk of %i documents", len(chunk))
+                "performing inference on a chunk of %i documents", num_docs)
 
         # Initialize the variational distribution q(theta|gamma) for the chunk
         gamma = self.random_state.gamma(
-            100., 1. / 100., (len(chunk), self.num_topics)).astype(self.dtype, copy=False)
+            100., 1. / 100., (num_docs, self.num_topics)).astype(self.dtype, copy=False)
         Elogtheta = dirichlet_expectation(gamma)
         expElogtheta = np.exp(Elogtheta)
 
@@ -628,29 +1040,36 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         assert expElogtheta.dtype == self.dtype
 
         if collect_sstats:
-            sstats = np.zeros_like(self.expElogbeta, dtype=self.dtype)
+            sstats = np.zeros(self.expElogbeta.shape, dtype=self.dtype)
         else:
             sstats = None
+        phis = [] if collect_phis else None
         converged = 0
 
         # Now, for each document d update that document's gamma and phi
         # Inference code copied from Hoffman's `onlineldavb.py` (esp. the
         # Lee&Seung trick which speeds things up by an order of magnitude, compared
         # to Blei's original LDA-C code, cool!).
-        integer_types = six.integer_types + (np.integer,)
         epsilon = np.finfo(self.dtype).eps
-        for d, doc in enumerate(chunk):
-            if len(doc) > 0 and not isinstance(doc[0][0], integer_types):
-                # make sure the term IDs are ints, otherwise np will get upset
-                ids = [int(idx) for idx, _ in doc]
-            else:
-                ids = [idx for idx, _ in doc]
-            cts = np.fromiter((cnt for _, cnt in doc),
-                              dtype=self.dtype, count=len(doc))
+        topic_index = self.get_topic_index() if approximate and not collect_sstats else None
+        for d, (ids, cts) in enumerate(_iter_doc_arrays(chunk, self.dtype)):
             gammad = gamma[d, :]
             Elogthetad = Elogtheta[d, :]
             expElogthetad = expElogtheta[d, :]
-            expElogbetad = self.expElogbeta[:, ids]
+            if topic_index is not None and len(ids) > 0:
+                # Approximate inference: restrict the updates to the union of the words' candidate topics.
+                # The normalizer of Elogthetad cancels out in the gamma update, so the restricted block
+                # can be iterated on its own; the remaining topics keep their prior.
+                topics = np.unique(topic_index[ids])
+                alphad = self.alpha[topics]
+                gammad = gammad[topics]
+                Elogthetad = dirichlet_expectation(gammad)
+                expElogthetad = np.exp(Elogthetad)
+                expElogbetad = self.get_expElogbeta_columns(ids, topics)
+            else:
+                topics = None
+                alphad = self.alpha
+                expElogbetad = self.get_expElogbeta_columns(ids)
 
             # The optimal phi_{dwk} is proportional to expElogthetad_k * expElogbetad_w.
             # phinorm is the normalizer.
@@ -663,7 +1082,7 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
                 # We represent phi implicitly to save memory and time.
                 # Substituting the value of the optimal phi back into
                 # the update for gamma gives this update. Cf. Lee&Seung 2001.
-                gammad = self.alpha + expElogthetad * \
+                gammad = alphad + expElogthetad * \
                     np.dot(cts / phinorm, expElogbetad.T)
                 Elogthetad = dirichlet_expectation(gammad)
                 expElogthetad = np.exp(Elogthetad)
@@ -673,16 +1092,30 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
                 if meanchange < self.gamma_threshold:
                     converged += 1
                     break
-            gamma[d, :] = gammad
+            if topics is None:
+                gamma[d, :] = gammad
+            else:
+                gamma[d, :] = self.alpha
+                gamma[d, topics] = gammad
             assert gammad.dtype == self.dtype
             if collect_sstats:
                 # Contribution of document d to the expected sufficient
                 # statistics for the M step.
-                sstats[:, ids] += np.outer(expElogthetad.T, cts / phinorm)
-
-        if len(chunk) > 1:
+                if topics is None:
+                    sstats[:, ids] += np.outer(expElogthetad.T, cts / phinorm)
+                else:
+                    sstats[np.ix_(topics, ids)] += np.outer(expElogthetad.T, cts / phinorm)
+            if collect_phis:
+                # phi_{dwk} * n_{dw} = expElogtheta_{dk} * expElogbeta_{kw} * n_{dw} / phinorm_{dw}
+                phid = np.outer(expElogthetad, cts / phinorm) * expElogbetad
+                if topics is not None:
+                    phid_topics, phid = phid, np.zeros((self.num_topics, len(ids)), dtype=self.dtype)
+                    phid[topics] = phid_topics
+                phis.append(phid)
+
+        if num_docs > 1:
             logger.info("%i/%i documents converged within %i iterations",
-                         converged, len(chunk), self.iterations)
+                         converged, num_docs, self.iterations)
 
         if collect_sstats:
             # This step finishes computing the sufficient statistics for the
@@ -690,9 +1123,13 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             # sstats[k, w] = \sum_d n_{dw} * phi_{dwk}
             # = \sum_d n_{dw} * exp{Elogtheta_{dk} + Elogbeta_{kw}} / phinorm_{dw}.
             sstats *= self.expElogbeta
+            if self.expElogbeta_scale is not None:
+                sstats *= self.expElogbeta_scale[:, None]
             assert sstats.dtype == self.dtype
 
         assert gamma.dtype == self.dtype
+        if collect_phis:
+            return gamma, sstats, phis
         return gamma, sstats
 
     def do_estep(self, chunk, state=None):
@@ -714,10 +1151,12 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         """
         if state is None:
             state = self.state
-        gamma, sstats = self.inference(chunk, collect_sstats=True)
-        state.sstats += sstats
-        # avoids calling len(chunk) on a generator
-        state.numdocs += gamma.shape[0]
+        with profiler.timer('estep'):
+            gamma, sstats = self.inference(chunk, collect_sstats=True)
+        with profiler.timer('merge'):
+            # avoids calling len(chunk) on a generator
+            state.merge_sstats(sstats, gamma.shape[0])
+        profiler.count('docs', gamma.shape[0])
         assert gamma.dtype == self.dtype
         return gamma
 
@@ -738,7 +1177,8 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
         """
         N = float(len(gammat))
-        logphat = sum(dirichlet_expectation(gamma) for gamma in gammat) / N
+        # E[log theta] of all documents in one call on the 2-D gamma
+        logphat = dirichlet_expectation(gammat).mean(axis=0)
         assert logphat.dtype == self.dtype
 
         self.alpha = update_dir_prior(self.alpha, N, logphat, rho)
@@ -764,8 +1204,7 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
         """
         N = float(lambdat.shape[0])
-        logphat = (sum(dirichlet_expectation(lambda_)
-                       for lambda_ in lambdat) / N).reshape((self.num_terms,))
+        logphat = dirichlet_expectation(lambdat).mean(axis=0).reshape((self.num_terms,))
         assert logphat.dtype == self.dtype
 
         self.eta = update_dir_prior(self.eta, N, logphat, rho)
@@ -793,10 +1232,14 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         """
         if total_docs is None:
             total_docs = len(chunk)
-        corpus_words = sum(cnt for document in chunk for _, cnt in document)
+        if is_csr(chunk):
+            corpus_words = chunk.data.sum()
+        else:
+            corpus_words = sum(cnt for document in chunk for _, cnt in document)
         subsample_ratio = 1.0 * total_docs / len(chunk)
-        perwordbound = self.bound(
-            chunk, subsample_ratio=subsample_ratio) / (subsample_ratio * corpus_words)
+        with profiler.timer('eval'):
+            perwordbound = self.bound(
+                chunk, subsample_ratio=subsample_ratio) / (subsample_ratio * corpus_words)
         logger.debug(
             "%.3f per-word bound, %.1f perplexity estimate based on a held-out corpus of %i documents with %i words",
             perwordbound, np.exp2(-perwordbound), len(chunk), corpus_words
@@ -940,8 +1383,7 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             dirty = False
 
             reallen = 0
-            chunks = utils.grouper(
-                corpus, chunksize, as_numpy=chunks_as_numpy, dtype=self.dtype)
+            chunks = iter_chunks(corpus, chunksize, as_numpy=chunks_as_numpy, dtype=self.dtype)
             for chunk_no, chunk in enumerate(chunks):
                 # keep track of how many documents we've processed so far
                 reallen += len(chunk)
@@ -994,7 +1436,8 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
             # append current epoch's metric values
             if self.callbacks:
-                current_metrics = callback.on_epoch_end(pass_)
+                with profiler.timer('eval'):
+                    current_metrics = callback.on_epoch_end(pass_)
                 for metric, value in current_metrics.items():
                     self.metrics[metric].append(value)
 
@@ -1011,8 +1454,11 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             
             elapse = time.time() - start_time
             logger.info(f'Epoch duration: {seconds2clock(elapse)}.')
-            logger.info(f'Save model to {self.model_dir}')
-            self.save(self.model_dir)
+            if self.callbacks and profiler.enabled:
+                profiler.add_scalars(callback.tb_logger, pass_)
+            if self.model_dir:
+                logger.info(f'Save model to {self.model_dir}')
+                self.save(self.model_dir)
 
     def do_mstep(self, rho, other, extra_pass=False):
         """Maximization step: use linear interpolation between the existing topics and
@@ -1029,8 +1475,10 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
 
         """
         logger.debug("updating topics")
+        start_time = time.time()
         # update self with the new blend; also keep track of how much did
-        # the topics change through this update, to assess convergence
+        # the topics change through this update, to assess convergence.
+        # Elogbeta is cached by the state, so the previous one is normally left over from the last M step.
         previous_Elogbeta = self.state.get_Elogbeta()
         self.state.blend(rho, other)
 
@@ -1038,18 +1486,22 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         self.sync_state(current_Elogbeta)
 
         # print out some debug info at the end of each EM iteration
-        self.print_topics(5)
+        if self.log_topics and logger.isEnabledFor(logging.INFO):
+            self.print_topics(self.log_topics)
         diff = mean_absolute_difference(
             previous_Elogbeta.ravel(), current_Elogbeta.ravel())
         logger.info(f"{'topic diff':15s}: {diff:.4f}")
         logger.info(f"{'rho':15s}: {rho:.4f}")
 
         if self.optimize_eta:
+            # reuses the lambda cached by get_Elogbeta
             self.update_eta(self.state.get_lambda(), rho)
 
         if not extra_pass:
             # only update if this isn't an additional pass
             self.num_updates += other.numdocs
+        profiler.add_time('mstep', time.time() - start_time)
+        logger.info(f"{'mstep time':15s}: {seconds2clock(time.time() - start_time)}")
 
     def bound(self, corpus, gamma=None, subsample_ratio=1.0):
         """Estimate the variational bound of documents from the corpus as E_q[log p(corpus)] - E_q[log q(corpus)].
@@ -1074,7 +1526,7 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         """
         score = 0.0
         _lambda = self.state.get_lambda()
-        Elogbeta = dirichlet_expectation(_lambda)
+        Elogbeta = self.state.get_Elogbeta()
 
         # stream the input doc-by-doc, in case it's too large to fit in RAM
         for d, doc in enumerate(corpus):
@@ -1331,55 +1783,112 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             )
             return self._apply(corpus, **kwargs)
 
-        gamma, phis = self.inference([bow], collect_sstats=per_word_topics)
-        topic_dist = gamma[0] / sum(gamma[0])  # normalize distribution
-
-        document_topics = [
-            (topicid, topicvalue) for topicid, topicvalue in enumerate(topic_dist)
-            if topicvalue >= minimum_probability
-        ]
-
-        if not per_word_topics:
-            return document_topics
-
-        word_topic = []  # contains word and corresponding topic
-        word_phi = []  # contains word and phi values
-        for word_type, weight in bow:
-            # contains (phi_value, topic) pairing to later be sorted
-            phi_values = []
-            phi_topic = []  # contains topic and corresponding phi value to be returned 'raw' to user
-            for topic_id in range(0, self.num_topics):
-                if phis[topic_id][word_type] >= minimum_phi_value:
-                    # appends phi values for each topic for that word
-                    # these phi values are scaled by feature length
-                    phi_values.append((phis[topic_id][word_type], topic_id))
-                    phi_topic.append((topic_id, phis[topic_id][word_type]))
-
-            # list with ({word_id => [(topic_0, phi_value), (topic_1, phi_value) ...]).
-            word_phi.append((word_type, phi_topic))
-            # sorts the topics based on most likely topic
-            # returns a list like ({word_id => [topic_id_most_probable, topic_id_second_most_probable, ...]).
-            sorted_phi_values = sorted(phi_values, reverse=True)
-            topics_sorted = [x[1] for x in sorted_phi_values]
-            word_topic.append((word_type, topics_sorted))
-
-        return document_topics, word_topic, word_phi  # returns 2-tuple
-
-    def get_term_topics(self, word_id, minimum_probability=None):
+        return self.get_document_topics_batch(
+            [bow], minimum_probability=minimum_probability, minimum_phi_value=minimum_phi_value,
+            per_word_topics=per_word_topics)[0]
+
+    def get_document_topics_batch(self, chunk, minimum_probability=None, minimum_phi_value=None,
+                                  per_word_topics=False):
+        """Get the topic distributions of many documents with a single :meth:`inference` call.
+
+        The per-word topics are selected and sorted with numpy on the (`num_topics`, number of words) phi block of
+        every document, instead of comparing every word with every topic in Python.
+
+        Parameters
+        ----------
+        chunk : {list of list of (int, float), :class:`~corpus.CsrCorpus`}
+            The documents, small enough to fit in memory together.
+        minimum_probability : float
+            Topics with an assigned probability lower than this threshold will be discarded.
+        minimum_phi_value : float
+            If `per_word_topics` is True, this represents a lower bound on the term probabilities that are included.
+        per_word_topics : bool
+            If True, every result also contains the per-word topics and phi values.
+
+        Returns
+        -------
+        list
+            For every document, what :meth:`get_document_topics` returns for it.
+
+        """
+        if minimum_probability is None:
+            minimum_probability = self.minimum_probability
+        minimum_probability = max(minimum_probability, 1e-8)
+        if minimum_phi_value is None:
+            minimum_phi_value = self.minimum_probability
+        minimum_phi_value = max(minimum_phi_value, 1e-8)
+
+        if per_word_topics:
+            gamma, _, phis = self.inference(chunk, collect_phis=True, approximate=True)
+        else:
+            gamma, _ = self.inference(chunk, approximate=True)
+        topic_dists = gamma / gamma.sum(axis=1, keepdims=True)  # normalize distributions
+
+        results = []
+        for d, topic_dist in enumerate(topic_dists):
+            topic_ids = np.flatnonzero(topic_dist >= minimum_probability)
+            document_topics = list(zip(topic_ids.tolist(), topic_dist[topic_ids]))
+            if not per_word_topics:
+                results.append(document_topics)
+                continue
+            results.append((document_topics,) + self._word_topics(chunk, d, phis[d], minimum_phi_value))
+        return results
+
+    def _word_topics(self, chunk, d, phid, minimum_phi_value):
+        """Get the per-word topics (most likely first) and phi values of document `d` of `chunk`."""
+        if is_csr(chunk):
+            word_ids = chunk.indices[chunk.indptr[d]:chunk.indptr[d + 1]].tolist()
+        else:
+            word_ids = [int(word_id) for word_id, _ in chunk[d]]
+        valid = phid >= minimum_phi_value
+        # stable ascending sort reversed: decreasing phi, ties by decreasing topic id like sorting (phi, topic) pairs
+        order = np.argsort(phid, axis=0, kind='stable')[::-1]
+        valid_sorted = np.take_along_axis(valid, order, axis=0)
+        word_topic = []  # contains word and corresponding topics, most likely first
+        word_phi = []  # contains word and its (topic, phi value) pairs, by topic id
+        for w, word_id in enumerate(word_ids):
+            word_topic.append((word_id, order[valid_sorted[:, w], w].tolist()))
+            topic_ids = np.flatnonzero(valid[:, w])
+            word_phi.append((word_id, list(zip(topic_ids.tolist(), phid[topic_ids, w]))))
+        return word_topic, word_phi
+
+    def get_term_topics(self, word_id, minimum_probability=None, normalized=False):
         """Get the most relevant topics to the given word.
 
         Parameters
         ----------
-        word_id : int
-            The word for which the topic distribution will be computed.
+        word_id : {int, str}
+            The word (or its id) for which the topic distribution will be computed.
         minimum_probability : float, optional
             Topics with an assigned probability below this threshold will be discarded.
+        normalized : bool, optional
+            If True, the weights of the word's topics are normalized to sum to one.
 
         Returns
         -------
         list of (int, float)
-            The relevant topics represented as pairs of their ID and their assigned probability, sorted
-            by relevance to the given word.
+            The relevant topics represented as pairs of their ID and their assigned probability, in order of their
+            IDs.
+
+        """
+        return self.get_terms_topics([word_id], minimum_probability, normalized)[0]
+
+    def get_terms_topics(self, words, minimum_probability=None, normalized=False):
+        """Get the most relevant topics of many words at once, from :meth:`get_term_topics_index`.
+
+        Parameters
+        ----------
+        words : iterable of {int, str}
+            Words or word ids, which may be mixed.
+        minimum_probability : float, optional
+            Topics with an assigned probability below this threshold will be discarded.
+        normalized : bool, optional
+            If True, the weights of every word's topics are normalized to sum to one.
+
+        Returns
+        -------
+        list of list of (int, float)
+            For every word what :meth:`get_term_topics` returns, an empty list for words missing from `id2word`.
 
         """
         if minimum_probability is None:
@@ -1387,21 +1896,73 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         # never allow zero values in sparse output
         minimum_probability = max(minimum_probability, 1e-8)
 
-        # if user enters word instead of id in vocab, change to get id
-        if isinstance(word_id, str):
-            word_id = self.id2word.doc2bow([word_id])[0][0]
+        words = list(words)
+        token2id = None
+        word_ids = np.empty(len(words), dtype=np.int64)
+        for i, word in enumerate(words):
+            # if user enters word instead of id in vocab, change to get id
+            if isinstance(word, str):
+                if token2id is None:
+                    token2id = getattr(self.id2word, 'token2id', None) or \
+                        {token: token_id for token_id, token in self.id2word.items()}
+                word = token2id.get(word, -1)
+            word_ids[i] = word
+        known = (word_ids >= 0) & (word_ids < self.num_terms)
+
+        word_topics, sums = self.get_term_topics_index()
+        rows = word_topics[word_ids[known]]
+        if normalized:
+            rows = rows / sums[word_ids[known], None]
+        valid = rows >= minimum_probability
+
+        values = [[] for _ in words]
+        for row, row_valid, i in zip(rows, valid, np.flatnonzero(known)):
+            topic_ids = np.flatnonzero(row_valid)
+            values[i] = list(zip(topic_ids.tolist(), row[topic_ids]))
+        return values
 
-        values = []
-        for topic_id in range(0, self.num_topics):
-            if self.expElogbeta[topic_id][word_id] >= minimum_probability:
-                values.append((topic_id, self.expElogbeta[topic_id][word_id]))
+    def topics_hash(self):
+        """Get a hash of the topics and the vocabulary of the model, the key of the :meth:`diff` cache.
 
-        return values
+        Computed once and again after every :meth:`~gensim.models.ldamodel.LdaModel.sync_state`.
+        """
+        if self._topics_hash is None:
+            topics_hash = hashlib.sha1(np.ascontiguousarray(self.get_topics()).tobytes())
+            for word_id in range(self.num_terms):
+                topics_hash.update(str(self.id2word.get(word_id, '')).encode('utf-8') + b'\n')
+            self._topics_hash = topics_hash.hexdigest()
+        return self._topics_hash
+
+    def get_top_terms(self, topn=10, topics=None):
+        """Get the ids of the `topn` most probable words of every topic at once.
+
+        Parameters
+        ----------
+        topn : int, optional
+            Number of words per topic.
+        topics : numpy.ndarray, optional
+            The result of :meth:`get_topics`, computed if omitted.
+
+        Returns
+        -------
+        numpy.ndarray
+            Word ids, most probable first, shape (`num_topics`, `topn`).
+
+        """
+        if topics is None:
+            topics = self.get_topics()
+        topn = min(topn, topics.shape[1])
+        best = np.argpartition(-topics, topn - 1, axis=1)[:, :topn]
+        order = np.argsort(-np.take_along_axis(topics, best, axis=1), axis=1, kind='stable')
+        return np.take_along_axis(best, order, axis=1)
 
     def diff(self, other, distance="kullback_leibler", num_words=100,
-             n_ann_terms=10, diagonal=False, annotation=True, normed=True):
+             n_ann_terms=10, diagonal=False, annotation=True, normed=True, truncate_vocab=None, cache=True):
         """Calculate the difference in topic distributions between two models: `self` and `other`.
 
+        All pairs of topics are compared at once with :func:`topic_distances`. The results are cached by the
+        :meth:`topics_hash` of both models and the arguments, so comparing the same models again is free.
+
         Parameters
         ----------
         other : :class:`~gensim.models.ldamodel.LdaModel`
@@ -1418,6 +1979,11 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             Whether the intersection or difference of words between two topics should be returned.
         normed : bool, optional
             Whether the matrix should be normalized or not.
+        truncate_vocab : int, optional
+            If set, the distributions are restricted to the union of the `truncate_vocab` most probable words of
+            all topics of both models, and normalized again, before the distances are computed.
+        cache : bool, optional
+            Whether to look up and store the result in the cache.
 
         Returns
         -------
@@ -1444,74 +2010,70 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             >>> topic_diff = mdiff  # get matrix with difference for each topic pair from `m1` and `m2`
 
         """
-        distances = {
-            "kullback_leibler": kullback_leibler,
-            "hellinger": hellinger,
-            "jaccard": jaccard_distance,
-            "jensen_shannon": jensen_shannon
-        }
-
-        if distance not in distances:
-            valid_keys = ", ".join("`{}`".format(x) for x in distances.keys())
+        if distance not in DISTANCES:
+            valid_keys = ", ".join("`{}`".format(x) for x in DISTANCES)
             raise ValueError(
                 "Incorrect distance, valid only {}".format(valid_keys))
 
-        if not isinstance(other, self.__class__):
+        if not isinstance(other, LdaModel):
             raise ValueError(
-                "The parameter `other` must be of type `{}`".format(self.__name__))
-
-        distance_func = distances[distance]
-        d1, d2 = self.get_topics(), other.get_topics()
-        t1_size, t2_size = d1.shape[0], d2.shape[0]
-        annotation_terms = None
-
-        fst_topics = [{w for (w, _) in self.show_topic(
-            topic, topn=num_words)} for topic in range(t1_size)]
-        snd_topics = [{w for (w, _) in other.show_topic(
-            topic, topn=num_words)} for topic in range(t2_size)]
-
-        if distance == "jaccard":
-            d1, d2 = fst_topics, snd_topics
+                "The parameter `other` must be of type `{}`".format(LdaModel.__name__))
 
         if diagonal:
-            assert t1_size == t2_size, \
+            assert self.num_topics == other.num_topics, \
                 "Both input models should have same no. of topics, " \
                 "as the diagonal will only be valid in a square matrix"
-            # initialize z and annotation array
-            z = np.zeros(t1_size)
-            if annotation:
-                annotation_terms = np.zeros(t1_size, dtype=list)
-        else:
-            # initialize z and annotation matrix
-            z = np.zeros((t1_size, t2_size))
-            if annotation:
-                annotation_terms = np.zeros((t1_size, t2_size), dtype=list)
-
-        # iterate over each cell in the initialized z and annotation
-        for topic in np.ndindex(z.shape):
-            topic1 = topic[0]
-            if diagonal:
-                topic2 = topic1
-            else:
-                topic2 = topic[1]
 
-            z[topic] = distance_func(d1[topic1], d2[topic2])
-            if annotation:
-                pos_tokens = fst_topics[topic1] & snd_topics[topic2]
-                neg_tokens = fst_topics[topic1].symmetric_difference(
-                    snd_topics[topic2])
+        key = (self.topics_hash(), other.topics_hash(), distance, num_words, n_ann_terms, diagonal, annotation,
+               normed, truncate_vocab) if cache else None
+        if key is not None and key in _diff_cache:
+            _diff_cache.move_to_end(key)
+            z, annotation_terms = _diff_cache[key]
+            return z.copy(), _copy_annotation(annotation_terms)
 
-                pos_tokens = list(pos_tokens)[:min(
-                    len(pos_tokens), n_ann_terms)]
-                neg_tokens = list(neg_tokens)[:min(
-                    len(neg_tokens), n_ann_terms)]
+        d1, d2 = self.get_topics(), other.get_topics()
+        words1 = words2 = None
+        if distance == "jaccard" or annotation:
+            # the top words as strings, so that models with different vocabularies can be compared
+            words1 = [[self.id2word[word_id] for word_id in row]
+                      for row in self.get_top_terms(num_words, d1).tolist()]
+            words2 = [[other.id2word[word_id] for word_id in row]
+                      for row in other.get_top_terms(num_words, d2).tolist()]
+            vocab, incidence1, incidence2 = _word_incidence(words1, words2)
 
-                annotation_terms[topic] = [pos_tokens, neg_tokens]
+        if distance == "jaccard":
+            z = topic_distances(incidence1, incidence2, distance, diagonal=diagonal)
+        else:
+            if d1.shape[1] != d2.shape[1]:
+                raise ValueError("Both models should have the same vocabulary to compare the topic distributions, "
+                                 "see `align_vocabulary`")
+            if truncate_vocab:
+                word_ids = np.union1d(self.get_top_terms(truncate_vocab, d1).ravel(),
+                                      other.get_top_terms(truncate_vocab, d2).ravel())
+                d1, d2 = d1[:, word_ids], d2[:, word_ids]
+                d1 = d1 / d1.sum(axis=1, keepdims=True)
+                d2 = d2 / d2.sum(axis=1, keepdims=True)
+            z = topic_distances(d1, d2, distance, diagonal=diagonal)
+
+        annotation_terms = None
+        if annotation:
+            annotation_terms = np.zeros(z.shape, dtype=list)
+            for topic in np.ndindex(z.shape):
+                topic1 = topic[0]
+                topic2 = topic1 if diagonal else topic[1]
+                row1, row2 = incidence1[topic1], incidence2[topic2]
+                pos_tokens = np.flatnonzero(row1 & row2)[:n_ann_terms]
+                neg_tokens = np.flatnonzero(row1 ^ row2)[:n_ann_terms]
+                annotation_terms[topic] = [[vocab[i] for i in pos_tokens], [vocab[i] for i in neg_tokens]]
 
         if normed:
             if np.abs(np.max(z)) > 1e-8:
                 z /= np.max(z)
 
+        if key is not None:
+            _diff_cache[key] = z.copy(), _copy_annotation(annotation_terms)
+            while len(_diff_cache) > DIFF_CACHE_SIZE:
+                _diff_cache.popitem(last=False)
         return z, annotation_terms
 
     def __getitem__(self, bow, eps=None):
@@ -1581,24 +2143,26 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             Key word arguments propagated to :meth:`~gensim.utils.SaveLoad.save`.
 
         """
+        start_time = time.time()
         if self.state is not None:
+            # store sstats in its own .npy file so that it can be memory-mapped back on load
             self.state.save(utils.smart_extension(
-                fname, '.state'), *args, **kwargs)
+                fname, '.state'), separately=['sstats'], *args, **kwargs)
         # Save the dictionary separately if not in 'ignore'.
         if 'id2word' not in ignore:
             utils.pickle(
                 self.id2word, utils.smart_extension(fname, '.id2word'))
 
         # make sure 'state', 'id2word' and 'dispatcher' are ignored from the pickled object, even if
-        # someone sets the ignore list themselves
+        # someone sets the ignore list themselves; the topic indexes are cheap to rebuild on demand
         if ignore is not None and ignore:
             if isinstance(ignore, six.string_types):
                 ignore = [ignore]
             # make sure None and '' are not in the list
             ignore = [e for e in ignore if e]
-            ignore = list({'state', 'dispatcher', 'id2word'} | set(ignore))
+            ignore = list({'state', 'dispatcher', 'id2word', '_topic_index', '_term_topics'} | set(ignore))
         else:
-            ignore = ['state', 'dispatcher', 'id2word']
+            ignore = ['state', 'dispatcher', 'id2word', '_topic_index', '_term_topics']
 
         # make sure 'expElogbeta' and 'sstats' are ignored from the pickled object, even if
         # someone sets the separately list themselves.
@@ -1622,9 +2186,10 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             separately = separately_explicit
         super(LdaModel, self).save(fname, ignore=ignore,
                                    separately=separately, *args, **kwargs)
+        profiler.add_time('save', time.time() - start_time)
 
     @classmethod
-    def load(cls, fname, *args, **kwargs):
+    def load(cls, fname, *args, inference_only=False, **kwargs):
         """Load a previously saved :class:`gensim.models.ldamodel.LdaModel` from file.
 
         See Also
@@ -1636,6 +2201,12 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
         ----------
         fname : str
             Path to the file where the model is stored.
+        inference_only : bool, optional
+            If True, load a read-only model that can only be used for inference
+            (e.g. :meth:`~gensim.models.ldamodel.LdaModel.get_document_topics`): the large arrays are
+            memory-mapped with `mmap='r'` unless another `mmap` mode is given, and the `state` (with its
+            `sstats`) is not loaded at all. Several processes loading the same model this way share
+            the mapped pages instead of each holding a private copy.
         *args
             Positional arguments propagated to :meth:`~gensim.utils.SaveLoad.load`.
         **kwargs
@@ -1653,7 +2224,10 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             >>> lda = LdaModel.load(fname, mmap='r')
 
         """
-        kwargs['mmap'] = kwargs.get('mmap', None)
+        if inference_only:
+            kwargs['mmap'] = kwargs.get('mmap', 'r')
+        else:
+            kwargs['mmap'] = kwargs.get('mmap', None)
         result = super(LdaModel, cls).load(fname, *args, **kwargs)
 
         # check if `random_state` attribute has been set after main pickle load
@@ -1665,6 +2239,15 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             result.random_state = utils.get_random_state(None)
             logging.warning("random_state not set so using default value")
 
+        # approximate inference is not set in older models
+        if not hasattr(result, 'inference_topn'):
+            result.inference_topn = None
+        result._topic_index = None
+        result._term_topics = None
+        result._topics_hash = None
+        if not hasattr(result, 'log_topics'):
+            result.log_topics = 5
+
         # dtype could be absent in old models
         if not hasattr(result, 'dtype'):
             # float64 was implicitly used before (cause it's default in numpy)
@@ -1672,11 +2255,20 @@ class LdaModel(interfaces.TransformationABC, basemodel.BaseTopicModel):
             logging.info("dtype was not set in saved %s file %s, assuming np.float64",
                          result.__class__.__name__, fname)
 
+        # expElogbeta was always stored in the computation dtype before
+        if not hasattr(result, 'beta_dtype'):
+            result.beta_dtype = result.dtype
+            result.expElogbeta_scale = None
+
         state_fname = utils.smart_extension(fname, '.state')
-        try:
-            result.state = LdaState.load(state_fname, *args, **kwargs)
-        except Exception as e:
-            logging.warning("failed to load state from %s: %s", state_fname, e)
+        if inference_only:
+            # sufficient statistics are only needed for training and for reading the topics
+            result.state = None
+        else:
+            try:
+                result.state = LdaState.load(state_fname, *args, **kwargs)
+            except Exception as e:
+                logging.warning("failed to load state from %s: %s", state_fname, e)
 
         id2word_fname = utils.smart_extension(fname, '.id2word')
         # check if `id2word_fname` file is present on disk
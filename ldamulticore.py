@@ -1,4 +1,7 @@
 
+import os
+import copy
+import ctypes
 import logging
 import time
 import numpy as np
@@ -7,13 +10,18 @@ from gensim import utils
 
 import six
 from six.moves import queue, range
-from multiprocessing import Pool, Queue, cpu_count
+from multiprocessing import Pool, Queue, Lock, RawArray, cpu_count, get_start_method
+from multiprocessing.pool import ThreadPool
 
+from corpus import CsrCorpus
 from ldamodel import LdaModel, LdaState, Callback
-from utils import seconds2clock
+from utils import seconds2clock, profiler
 
 logger = logging.getLogger(__name__)
 
+# seconds a new worker waits for a free shared sstats slot before sharing one
+SLOT_TIMEOUT = 10
+
 
 class LdaMulticore(LdaModel):
     """An optimized implementation of the LDA algorithm, able to harness the power of multicore CPUs.
@@ -26,7 +34,8 @@ class LdaMulticore(LdaModel):
                  eta=None, decay=0.5, offset=1.0, eval_every=10, iterations=50,
                  gamma_threshold=0.001, random_state=None, minimum_probability=0.01,
                  minimum_phi_value=0.01, per_word_topics=False, dtype=np.float32,
-                 callbacks=None, log_dir=None, model_dir=None):
+                 callbacks=None, log_dir=None, model_dir=None,
+                 beta_dtype=None, reduce_threads=1, log_topics=5):
         """
 
         Parameters
@@ -88,10 +97,17 @@ class LdaMulticore(LdaModel):
             each word, along with their phi values multiplied by the feature length (i.e. word count).
         dtype : {numpy.float16, numpy.float32, numpy.float64}, optional
             Data-type to use during calculations inside model. All inputs are also converted.
+        beta_dtype : {numpy.float16, numpy.float32, numpy.float64}, optional
+            Storage data-type of `expElogbeta`, which is also the precision it is shipped to the workers with.
+        reduce_threads : int, optional
+            Number of threads used for the tree reduction of the workers' shared sufficient statistics.
+        log_topics : int, optional
+            Number of topics logged after every M step, 0 to skip sorting and logging them.
 
         """
         self.workers = max(1, cpu_count() - 1) if workers is None else workers
         self.batch = batch
+        self.reduce_threads = reduce_threads
 
         if isinstance(alpha, six.string_types) and alpha == 'auto':
             raise NotImplementedError(
@@ -103,7 +119,8 @@ class LdaMulticore(LdaModel):
             decay=decay, offset=offset, eval_every=eval_every, iterations=iterations,
             gamma_threshold=gamma_threshold, random_state=random_state, minimum_probability=minimum_probability,
             minimum_phi_value=minimum_phi_value, per_word_topics=per_word_topics, dtype=dtype,
-            callbacks=callbacks,model_dir=model_dir,log_dir=log_dir
+            callbacks=callbacks,model_dir=model_dir,log_dir=log_dir,
+            beta_dtype=beta_dtype, log_topics=log_topics
         )
 
     def update(self, corpus, chunks_as_numpy=False):
@@ -127,9 +144,10 @@ class LdaMulticore(LdaModel):
 
         Parameters
         ----------
-        corpus : {iterable of list of (int, float), scipy.sparse.csc}, optional
-            Stream of document vectors or sparse matrix of shape (`num_documents`, `num_terms`) used to update the
-            model.
+        corpus : {iterable of list of (int, float), :class:`~corpus.CsrCorpus`}, optional
+            Stream of document vectors used to update the model. A :class:`~corpus.CsrCorpus` is shared with the
+            worker processes once, so that the jobs only carry document ranges; other corpora are sent chunk by
+            chunk as CSR arrays.
         chunks_as_numpy : bool
             Whether each chunk passed to the inference step should be a np.ndarray or not. Numpy can in some settings
             turn the term IDs into floats, these will be converted back into integers in inference, which incurs a
@@ -174,6 +192,10 @@ class LdaMulticore(LdaModel):
 
         job_queue = Queue(maxsize=2 * self.workers)
         result_queue = Queue()
+        shared_sstats = SharedSstats(self.workers, self.state.sstats.shape, self.dtype)
+        # a CSR corpus is handed to the workers once, the jobs only carry document ranges of it
+        shared_corpus = SharedCorpus(corpus) if isinstance(corpus, CsrCorpus) and not chunks_as_numpy else None
+        reduce_pool = ThreadPool(self.reduce_threads) if self.reduce_threads > 1 else None
 
         # rho is the "speed" of updating; TODO try other fncs
         # pass_ + num_updates handles increasing the starting t for each pass,
@@ -187,20 +209,26 @@ class LdaMulticore(LdaModel):
             LDA model if necessary.
 
             """
-            merged_new = False
             while not result_queue.empty():
-                other.merge(result_queue.get())
+                # workers only report how many documents they added to their shared sstats
+                pending_docs[0] += result_queue.get()
                 queue_size[0] -= 1
-                merged_new = True
 
-            if (force and merged_new and queue_size[0] == 0) or (other.numdocs >= updateafter):
+            if (force and queue_size[0] == 0) or (pending_docs[0] >= updateafter):
+                # buffers may already hold documents whose message is still queued, so keep
+                # the difference around for the next update
+                with profiler.timer('merge'):
+                    pending_docs[0] -= shared_sstats.reduce(other, reduce_pool)
+                profiler.count('docs', other.numdocs)
+                if other.numdocs == 0:
+                    return
                 self.do_mstep(rho(), other, pass_ > 0)
                 other.reset()
                 if eval_every > 0 and (force or (self.num_updates / updateafter) % eval_every == 0):
                     self.log_perplexity(chunk, total_docs=lencorpus)
 
         logger.info("training LDA model using %i processes", self.workers)
-        pool = Pool(self.workers, worker_e_step, (job_queue, result_queue,))
+        pool = Pool(self.workers, worker_e_step, (job_queue, result_queue, shared_sstats, shared_corpus))
 
         if self.callbacks:
             # pass the list of input callbacks to Callback class
@@ -210,19 +238,29 @@ class LdaMulticore(LdaModel):
         for pass_ in range(self.passes):
             logger.info(f'Epoch {pass_}')
             start_time = time.time()
-            queue_size, reallen = [0], 0
-            other = LdaState(self.eta, self.state.sstats.shape)
-
-            chunk_stream = utils.grouper(
-                corpus, self.chunksize, as_numpy=chunks_as_numpy)
+            queue_size, pending_docs, reallen = [0], [0], 0
+            other = LdaState(self.eta, self.state.sstats.shape, self.dtype)
+
+            if shared_corpus is not None:
+                chunk_stream = corpus.chunks(self.chunksize)
+            else:
+                chunk_stream = utils.grouper(
+                    corpus, self.chunksize, as_numpy=chunks_as_numpy)
             for chunk_no, chunk in enumerate(chunk_stream):
+                if shared_corpus is not None:
+                    job = (reallen, reallen + len(chunk))
+                elif not chunks_as_numpy:
+                    # three arrays pickle much faster than a list of lists of (id, count) tuples
+                    job = CsrCorpus.from_bow(chunk)
+                else:
+                    job = chunk
                 # keep track of how many documents we've processed so far
                 reallen += len(chunk)
 
                 # put the chunk into the workers' input job queue
                 while True:
                     try:
-                        job_queue.put((chunk_no, chunk, self), block=False)
+                        job_queue.put((chunk_no, job, self.worker_copy()), block=False)
                         queue_size[0] += 1
                         logger.info(
                             "PROGRESS: pass %i, dispatched chunk #%i = documents up to #%i/%i, "
@@ -242,6 +280,8 @@ class LdaMulticore(LdaModel):
             # wait for all outstanding jobs to finish
             while queue_size[0] > 0:
                 process_result_queue(force=True)
+            # results collected before the last chunk was dispatched may still sit in the buffers
+            process_result_queue(force=True)
 
             if reallen != lencorpus:
                 raise RuntimeError(
@@ -249,37 +289,241 @@ class LdaMulticore(LdaModel):
             
             elapse = time.time() - start_time
             if self.callbacks:
-                callback.on_epoch_end(pass_)
+                with profiler.timer('eval'):
+                    callback.on_epoch_end(pass_)
             logger.info(f'Epoch duration: {seconds2clock(elapse)}.')
-            logger.info(f'Save model to {self.model_dir}')
-            self.save(self.model_dir)
+            if self.callbacks and profiler.enabled:
+                profiler.add_scalars(callback.tb_logger, pass_)
+            if self.model_dir:
+                logger.info(f'Save model to {self.model_dir}')
+                self.save(self.model_dir)
         # endfor entire update
 
         pool.terminate()
+        if reduce_pool is not None:
+            reduce_pool.terminate()
+
+    def worker_copy(self):
+        """Get a shallow copy of the model holding only what the E-step needs.
+
+        The state (with its dense sufficient statistics) and the callbacks (which may hold the whole
+        training texts) are left out, so they are not pickled with every job.
+
+        Returns
+        -------
+        :class:`~ldamulticore.LdaMulticore`
+            Model sharing the current topics with `self`.
+
+        """
+        worker_lda = copy.copy(self)
+        worker_lda.state = None
+        worker_lda.callbacks = None
+        worker_lda.metrics = None
+        worker_lda._term_topics = None
+        return worker_lda
+
+
+class SharedSstats(object):
+    """Per-worker sufficient statistics buffers in shared memory.
+
+    Every worker process owns one slot it adds its E-step results to, so that only the number of processed
+    documents has to be sent back to the master, which sums the slots up in place with
+    :meth:`~ldamulticore.SharedSstats.reduce`. A worker gives its slot back when it fails; the replacement of a
+    worker killed without doing so shares a slot, as every add holds the slot's lock.
+
+    """
+
+    def __init__(self, num_slots, shape, dtype=np.float32):
+        """
+
+        Parameters
+        ----------
+        num_slots : int
+            Number of worker processes.
+        shape : tuple of (int, int)
+            Shape of the sufficient statistics: (number of topics, number of terms in the vocabulary).
+        dtype : type
+            Data-type of the sufficient statistics.
+
+        """
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * self.dtype.itemsize
+        self.buffers = [RawArray(ctypes.c_char, nbytes) for _ in range(num_slots)]
+        self.numdocs = RawArray(ctypes.c_long, num_slots)
+        self.locks = [Lock() for _ in range(num_slots)]
+        self.free_slots = Queue()
+        for slot in range(num_slots):
+            self.free_slots.put(slot)
+
+    def sstats(self, slot):
+        """Get the numpy view of the sufficient statistics buffer of `slot`."""
+        return np.frombuffer(self.buffers[slot], dtype=self.dtype).reshape(self.shape)
+
+    def add(self, slot, sstats, numdocs):
+        """Add the sufficient statistics of `numdocs` documents to the buffer of `slot`."""
+        with self.locks[slot]:
+            buffer = self.sstats(slot)
+            buffer += sstats
+            self.numdocs[slot] += numdocs
+
+    def reduce(self, state, pool=None):
+        """Add all buffers into `state` and reset them.
+
+        Parameters
+        ----------
+        state : :class:`~gensim.models.ldamodel.LdaState`
+            The state the sufficient statistics are merged into.
+        pool : :class:`multiprocessing.pool.ThreadPool`, optional
+            If given, the buffers are summed pairwise in a tree reduction on the pool's threads.
+
+        Returns
+        -------
+        int
+            Number of documents merged into `state`.
+
+        """
+        for lock in self.locks:
+            lock.acquire()
+        try:
+            buffers = [self.sstats(slot) for slot in range(len(self.buffers))]
+            if pool is None:
+                for buffer in buffers[1:]:
+                    buffers[0] += buffer
+            else:
+                stride = 1
+                while stride < len(buffers):
+                    pairs = [(buffers[i], buffers[i + stride])
+                             for i in range(0, len(buffers) - stride, 2 * stride)]
+                    pool.map(lambda pair: np.add(pair[0], pair[1], out=pair[0]), pairs)
+                    stride *= 2
+            numdocs = sum(self.numdocs)
+            state.merge_sstats(buffers[0], numdocs)
+            for slot, buffer in enumerate(buffers):
+                buffer[...] = 0.0
+                self.numdocs[slot] = 0
+        finally:
+            for lock in self.locks:
+                lock.release()
+        return numdocs
+
+
+def _maps_whole_file(array):
+    """Whether `array` is a memory-map of all the data of its `.npy` file, which can be opened again from the file.
+
+    Views of a memmap (e.g. the arrays of a :meth:`~corpus.CsrCorpus.slice`) keep the `filename` and `offset` of
+    the whole array, so reopening them would read the wrong bytes.
+    """
+    if not isinstance(array, np.memmap) or array.filename is None or not array.flags.c_contiguous:
+        return False
+    try:
+        return array.nbytes == os.path.getsize(array.filename) - array.offset
+    except OSError:
+        return False
+
 
+class SharedCorpus(object):
+    """A :class:`~corpus.CsrCorpus` the worker processes read their chunks from without deserializing them.
 
-def worker_e_step(input_queue, result_queue):
+    Memory-mapped arrays (a corpus loaded with `mmap_mode='r'`, not a slice of it) are opened again by every
+    worker from their file. Forked workers inherit all other arrays as they are, otherwise these are copied once
+    into shared memory. Jobs then only need to name a range of documents, see
+    :meth:`~ldamulticore.SharedCorpus.slice`.
+
+    """
+
+    def __init__(self, corpus):
+        """
+
+        Parameters
+        ----------
+        corpus : :class:`~corpus.CsrCorpus`
+            The training corpus.
+
+        """
+        self.arrays = {}
+        for name in ('indptr', 'indices', 'data'):
+            array = getattr(corpus, name)
+            if _maps_whole_file(array):
+                self.arrays[name] = ('mmap', array.filename, array.dtype, array.shape, array.offset)
+            elif get_start_method() == 'fork':
+                # the pages are shared copy-on-write and never written to
+                self.arrays[name] = ('fork', array)
+            else:
+                array = np.ascontiguousarray(array)
+                buffer = RawArray(ctypes.c_char, max(1, array.nbytes))
+                np.frombuffer(buffer, dtype=array.dtype, count=array.size)[...] = array.ravel()
+                self.arrays[name] = ('shm', buffer, array.dtype, array.shape)
+        self._corpus = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_corpus'] = None
+        return state
+
+    @property
+    def corpus(self):
+        """The corpus over the shared arrays, attached on first use in every process."""
+        if self._corpus is None:
+            arrays = []
+            for name in ('indptr', 'indices', 'data'):
+                spec = self.arrays[name]
+                if spec[0] == 'fork':
+                    arrays.append(spec[1])
+                elif spec[0] == 'mmap':
+                    _, filename, dtype, shape, offset = spec
+                    arrays.append(np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape))
+                else:
+                    _, buffer, dtype, shape = spec
+                    arrays.append(np.frombuffer(buffer, dtype=dtype, count=int(np.prod(shape))).reshape(shape))
+            self._corpus = CsrCorpus(*arrays)
+        return self._corpus
+
+    def slice(self, start, end):
+        """Get documents [start, end) as a :class:`~corpus.CsrCorpus` of views into the shared arrays."""
+        return self.corpus.slice(start, end)
+
+
+def worker_e_step(input_queue, result_queue, shared_sstats, shared_corpus=None):
     """Perform E-step for each job.
 
     Parameters
     ----------
-    input_queue : queue of (int, list of (int, float), :class:`~gensim.models.lda_worker.Worker`)
-        Each element is a job characterized by its ID, the corpus chunk to be processed in BOW format and the worker
-        responsible for processing it.
-    result_queue : queue of :class:`~gensim.models.ldamodel.LdaState`
-        After the worker finished the job, the state of the resulting (trained) worker model is appended to this queue.
+    input_queue : queue of (int, {(int, int), :class:`~corpus.CsrCorpus`}, :class:`~ldamulticore.LdaMulticore`)
+        Each element is a job characterized by its ID, the corpus chunk to be processed and the model snapshot
+        to process it with. The chunk is the (start, end) document range of `shared_corpus` if that is given.
+    result_queue : queue of int
+        After the worker finished the job, the number of documents it processed is appended to this queue.
+    shared_sstats : :class:`~ldamulticore.SharedSstats`
+        Shared buffers the worker adds its sufficient statistics to.
+    shared_corpus : :class:`~ldamulticore.SharedCorpus`, optional
+        The training corpus, if the jobs carry document ranges instead of chunks.
 
     """
-    logger.debug("worker process entering E-step loop")
-    while True:
-        logger.debug("getting a new job")
-        chunk_no, chunk, worker_lda = input_queue.get()
-        logger.debug("processing chunk #%i of %i documents",
-                     chunk_no, len(chunk))
-        worker_lda.state.reset()
-        worker_lda.do_estep(chunk)  # TODO: auto-tune alpha?
-        del chunk
-        logger.debug("processed chunk, queuing the result")
-        result_queue.put(worker_lda.state)
-        del worker_lda  # free up some memory
-        logger.debug("result put")
+    try:
+        slot = shared_sstats.free_slots.get(timeout=SLOT_TIMEOUT)
+        owned = True
+    except queue.Empty:
+        # a killed worker never gave its slot back, share one instead of waiting forever
+        slot = os.getpid() % len(shared_sstats.buffers)
+        owned = False
+        logger.warning("no free shared sstats slot, sharing slot %i", slot)
+    logger.debug("worker process entering E-step loop with shared sstats slot %i", slot)
+    try:
+        while True:
+            logger.debug("getting a new job")
+            chunk_no, chunk, worker_lda = input_queue.get()
+            if shared_corpus is not None:
+                chunk = shared_corpus.slice(*chunk)
+            logger.debug("processing chunk #%i of %i documents",
+                         chunk_no, len(chunk))
+            gamma, sstats = worker_lda.inference(chunk, collect_sstats=True)  # TODO: auto-tune alpha?
+            del chunk
+            shared_sstats.add(slot, sstats, gamma.shape[0])
+            logger.debug("processed chunk, queuing the result")
+            result_queue.put(gamma.shape[0])
+            del worker_lda, sstats  # free up some memory
+            logger.debug("result put")
+    finally:
+        if owned:
+            shared_sstats.free_slots.put(slot)
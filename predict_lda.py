@@ -1,13 +1,17 @@
 import os
 import json
+import time
 import logging
 import argparse
+from multiprocessing import Pool as ProcessPool
 
 from tqdm import tqdm
-from gensim.models.ldamodel import LdaModel
-from gensim.corpora.dictionary import Dictionary
 
-from utils import set_console_logger
+from ldamodel import LdaModel
+from coherence import dictionary_fingerprint
+from corpus import encode_file
+from tweetio import read_jsonl, is_jsonl
+from utils import set_console_logger, seconds2clock, peak_rss_mb, add_profiling_args, run_main, profiler, profiled_call
 
 set_console_logger()
 logger = logging.getLogger()
@@ -15,39 +19,92 @@ logging.getLogger(
     'gensim.utils').setLevel(logging.WARNING)
 
 
-
-def load_corpus(dataset_dir):
-    for month_dir in os.listdir(dataset_dir):
+def find_paths(dataset_dir):
+    data_files = []
+    for month_dir in sorted(os.listdir(dataset_dir)):
         month_path = os.path.join(dataset_dir, month_dir)
         if not os.path.isdir(month_path):
             continue
-        for filename in os.listdir(month_path):
+        for filename in sorted(os.listdir(month_path)):
             path = os.path.join(month_path, filename)
-            if path.endswith('.jsonl') and 'annotated' in path:
-                with open(path) as f:
-                    for line in f:
-                        tweet = json.loads(line)
-                        yield tweet
+            if is_jsonl(filename) and 'annotated' in filename:
+                data_files.append(path)
+    return data_files
+
+
+def load_model(model_path, inference_topn=None):
+    start_time = time.time()
+    model = LdaModel.load(model_path, inference_only=True)
+    model.inference_topn = inference_topn
+    elapse = time.time() - start_time
+    logger.info(f'[pid {os.getpid()}] Model loaded in {seconds2clock(elapse)}, '
+                f'peak RSS {peak_rss_mb():.1f} MiB')
+    return model
+
+
+def init_worker(model_path, inference_topn):
+    global model, fingerprint
+    model = load_model(model_path, inference_topn)
+    fingerprint = dictionary_fingerprint(model.id2word)
+
+
+def predict_file(path):
+    predictions = []
+    # the encoding of every line, cached next to the file by training with the same dictionary
+    bow_corpus = encode_file(path, model.id2word, fingerprint)
+    # one inference call per chunk of tweets instead of one per tweet
+    file_topics = []
+    for chunk in bow_corpus.chunks(model.chunksize):
+        file_topics.extend(model.get_document_topics_batch(chunk))
+    # both skip the same corrupt lines, so tweets and encodings stay aligned
+    for tweet, topics in zip(read_jsonl(path), file_topics):
+        topics = [(topic_id, topic_prob.item()) for topic_id, topic_prob in topics]
+        tweet['topics'] = topics
+        predictions.append(json.dumps(tweet) + '\n')
+    return predictions, os.getpid(), peak_rss_mb()
+
+
+def predict_task(path):
+    """Run :func:`predict_file` in a pool worker, also returning the worker's profiler snapshot."""
+    (predictions, pid, rss), snapshot = profiled_call(predict_file, path)
+    return predictions, pid, rss, snapshot
 
 
 def main():
+    global model, fingerprint
     logger.info(f'Loading data from {args.dataset_dir}')
-    corpus = load_corpus(args.dataset_dir)
+    data_files = find_paths(args.dataset_dir)
+    logger.info(f'{len(data_files)} data files found.')
     model_path = os.path.join(args.dump_dir, 'lda.model')
     logger.info(f'Loading model from {model_path}')
-    model = LdaModel.load(model_path)
-    corpus_bow = (model.id2word.doc2bow(text['candidates']) for text in corpus)
-    
+
+    if args.num_workers > 1:
+        workers = ProcessPool(args.num_workers, initializer=init_worker,
+                              initargs=(model_path, args.inference_topn))
+        results = workers.imap(predict_task, data_files)
+    else:
+        model = load_model(model_path, args.inference_topn)
+        fingerprint = dictionary_fingerprint(model.id2word)
+        # the stages are profiled in this process already, there are no snapshots to merge
+        results = ((*predict_file(path), None) for path in data_files)
+
     predictions_path = os.path.join(args.dump_dir, 'lda.prediction.jsonl')
-    topic_ids = set()
+    worker_rss = {}
     with open(predictions_path, 'w') as f:
-        for tweet, tweet_bow in tqdm(zip(corpus, corpus_bow)):
-            topics = model.get_document_topics(tweet_bow)
-            topics = [(topic_id, topic_prob.item()) for topic_id, topic_prob in topics]
-            tweet['topics'] = topics
-            f.write(json.dumps(tweet) + '\n')
+        for predictions, pid, rss, snapshot in tqdm(results, total=len(data_files)):
+            f.writelines(predictions)
+            worker_rss[pid] = rss
+            if snapshot is not None:
+                profiler.merge(snapshot)
+    if args.num_workers > 1:
+        workers.close()
+        workers.join()
+    for pid, rss in sorted(worker_rss.items()):
+        logger.info(f'[pid {pid}] peak RSS {rss:.1f} MiB')
     logger.info(f'Predictions have been written to {predictions_path}')
 
+    # reading the topics needs the sufficient statistics, which the inference-only model skips
+    model = LdaModel.load(model_path, mmap='r')
     topics_path = os.path.join(args.dump_dir, 'lda.topics.txt')
     topics = model.show_topics(num_topics=model.num_topics,
                                num_words=10,
@@ -65,8 +122,13 @@ if __name__ == '__main__':
     parser.add_argument('--dataset_dir', required=True,
                         help='dataset directory')
     parser.add_argument('--dump_dir', help='dump directory')
+    parser.add_argument('--num-workers', type=int, default=1,
+                        help='Number of CPU processes, each mapping the model read-only')
+    parser.add_argument('--inference_topn', type=int,
+                        help='approximate inference with only the top-n topics of each word')
+    add_profiling_args(parser)
     args = parser.parse_args()
     if not args.dump_dir:
         args.dump_dir = os.path.join(args.dataset_dir, 'lda_dump')
     print(args)
-    main()
+    run_main(main, args)
@@ -1,15 +1,18 @@
 import os
 import re
 import json
-import gzip
 import argparse
 import logging
+from collections import Counter, deque
 from multiprocessing import Pool as ProcessPool
 
 from tqdm import tqdm
 from emoji import demojize
 
-from utils import set_console_logger
+from scheduler import plan_tasks, run_tasks, merge_parts
+from tweetio import (ReadStats, read_jsonl, iter_line_blocks, parse_lines, count_lines, open_writer, jsonl_path,
+                     strip_extension, JSONL_PATTERN, CODEC_EXTENSIONS)
+from utils import set_console_logger, profiler, profiled_call, add_profiling_args, run_main
 
 
 """
@@ -88,21 +91,16 @@ def find_paths(dataset_dir):
             continue
         for filename in os.listdir(month_path):
             path = os.path.join(month_path, filename)
-            if re.match(r'coronavirus-tweet-2020-\d\d-\d\d-\d\d.jsonl', filename):
-                outputfile = filename.replace('coronavirus-tweet-', 'coronavirus-tweet-preprocessed-')
+            if re.match(r'coronavirus-tweet-2020-\d\d-\d\d-\d\d' + JSONL_PATTERN, filename):
+                outputfile = jsonl_path(filename.replace('coronavirus-tweet-', 'coronavirus-tweet-preprocessed-'),
+                                        args.codec)
                 output_path = os.path.join(args.output_dir, month_dir, outputfile)
                 if args.force:
                     data_files.append((path, output_path))
                     continue
                 if os.path.isfile(output_path):
-                    with open(output_path) as f:
-                        preprocessed_tweets = 0
-                        for line in f:
-                            preprocessed_tweets += 1
-                    with open(path) as f:
-                        origin_tweets = 0
-                        for line in f:
-                            origin_tweets += 1
+                    preprocessed_tweets = count_lines(output_path)
+                    origin_tweets = count_lines(path)
                     if preprocessed_tweets == origin_tweets:
                         logger.info(
                             f'Preprocessing complete for {path}. Skip.')
@@ -115,41 +113,98 @@ def find_paths(dataset_dir):
     return data_files
 
 
-def process_tweets_file(data_file):
-    input_path, output_path = data_file
-    date = os.path.basename(input_path)[len('coronavirus-tweet-'):-len('.jsonl')-3]
-    f = open(input_path)
-    if args.compress:
-        output_path += '.gz'
-    out_f = gzip.open(output_path, 'wt') if args.compress else open(output_path, 'w')
-    for line in f:
-        tweet = json.loads(line)
-        tweet_id = tweet['id_str']
-        created_at = tweet['created_at']
-        full_text = tweet['full_text']
+def file_date(path):
+    return strip_extension(os.path.basename(path))[len('coronavirus-tweet-'):-3]
+
+
+def process_tweet_line(tweet, date):
+    """Preprocess a hydrated tweet into its output line."""
+    tweet_id = tweet['id_str']
+    created_at = tweet['created_at']
+    full_text = tweet['full_text']
+    with profiler.timer('normalize'):
         processed = preprocess_tweet(full_text)
-        processed_tweet = {
-            'created_at': created_at,
-            'date': date,
-            'id_str': tweet_id,
-            'full_text': full_text,
-            'preprocessed_full_text': processed,
-            'country': tweet['place']['country']
-        }
-        out_f.write(json.dumps(processed_tweet) + '\n')
-    f.close()
+    profiler.count('tweets')
+    processed_tweet = {
+        'created_at': created_at,
+        'date': date,
+        'id_str': tweet_id,
+        'full_text': full_text,
+        'preprocessed_full_text': processed,
+        'country': tweet['place']['country']
+    }
+    return json.dumps(processed_tweet) + '\n'
+
+
+def process_tweets_file(task):
+    date = file_date(task.path)
+    out_f = open_writer(task.output_path(task.payload), args.codec, args.level)
+    for tweet in read_jsonl(task.path, byte_range=task.byte_range):
+        line = process_tweet_line(tweet, date)
+        with profiler.timer('write'):
+            out_f.write(line)
     out_f.close()
 
 
+def process_line_batch(batch):
+    lines, date = batch
+    stats = ReadStats()
+    output = [process_tweet_line(tweet, date) for tweet in parse_lines(lines, stats)]
+    return output, stats.corrupt
+
+
+def process_tweets_file_batched(workers, input_path, output_path):
+    """Preprocess one file with the whole pool: the raw lines are sent to the workers in batches of
+    `--batch_lines`, and the results are written in input order, so the output is the same as
+    :func:`process_tweets_file`'s."""
+    date = file_date(input_path)
+    # batches in flight, bounded so that a slow writer doesn't buffer the whole file
+    pending = deque()
+    corrupt = 0
+    with open_writer(output_path, args.codec, args.level) as out_f:
+        def write_next():
+            nonlocal corrupt
+            (output, batch_corrupt), snapshot = pending.popleft().get()
+            if snapshot is not None:
+                profiler.merge(snapshot)
+            with profiler.timer('write'):
+                out_f.writelines(output)
+            corrupt += batch_corrupt
+
+        batch = []
+        for lines in iter_line_blocks(input_path):
+            for line in lines:
+                batch.append(line)
+                if len(batch) == args.batch_lines:
+                    if len(pending) >= 2 * args.num_workers:
+                        write_next()
+                    pending.append(workers.apply_async(profiled_call, (process_line_batch, (batch, date))))
+                    batch = []
+        if batch:
+            pending.append(workers.apply_async(profiled_call, (process_line_batch, (batch, date))))
+        while pending:
+            write_next()
+    if corrupt:
+        logger.warning(f'skipped {corrupt} corrupt lines in {input_path}')
+
+
 def main():
     data_files = find_paths(args.input_dir)
     logger.info(f'{len(data_files)} data files found.')
     if len(data_files) == 0:
         return
-    workers = ProcessPool(args.num_workers)
-    with tqdm(total=len(data_files)) as pbar:
-        for _ in tqdm(workers.imap_unordered(process_tweets_file, data_files)):
-            pbar.update()
+    if args.batch_lines:
+        with ProcessPool(args.num_workers) as workers:
+            for input_path, output_path in tqdm(data_files):
+                process_tweets_file_batched(workers, input_path, output_path)
+        return
+    tasks = plan_tasks([path for path, _ in data_files], [output_path for _, output_path in data_files],
+                       args.shard_mb << 20)
+    done_shards = Counter()
+    for task, _ in tqdm(run_tasks(process_tweets_file, tasks, args.num_workers), total=len(tasks)):
+        done_shards[task.index] += 1
+        if task.num_shards > 1 and done_shards[task.index] == task.num_shards:
+            merge_parts(task.payload, task.num_shards)
 
 
 if __name__ == '__main__':
@@ -158,8 +213,18 @@ if __name__ == '__main__':
     parser.add_argument('--output_dir', required=True, help='output directory')
     parser.add_argument('--num-workers', type=int, default=8,
                         help='Number of CPU processes')
-    parser.add_argument('--compress', action='store_true', help='compress with gzip')
+    parser.add_argument('--shard_mb', type=int, default=64,
+                        help='split uncompressed input files larger than this into shards processed in parallel')
+    parser.add_argument('--batch_lines', type=int,
+                        help='process one file at a time, sending batches of this many lines to the workers '
+                             '(for a few large files), instead of one file per worker')
+    parser.add_argument('--codec', default='none', choices=list(CODEC_EXTENSIONS), help='output compression')
+    parser.add_argument('--level', type=int, help='compression level, the codec default if omitted')
+    parser.add_argument('--compress', action='store_true', help='compress with gzip, same as --codec gzip')
     parser.add_argument('--force', '-f', action='store_true', help='force overwriting existing files')
+    add_profiling_args(parser)
     args = parser.parse_args()
+    if args.compress and args.codec == 'none':
+        args.codec = 'gzip'
     print(args)
-    main()
+    run_main(main, args)
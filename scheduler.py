@@ -0,0 +1,186 @@
+import os
+import time
+import shutil
+import logging
+from collections import defaultdict
+from multiprocessing import Pool as ProcessPool
+
+from tweetio import detect_codec, line_offsets
+from utils import profiler, profiled_call
+
+"""
+Size-aware scheduling of per-file work on a process pool.
+
+Files are processed largest-first so that the big hourly files do not start last and leave a single worker
+grinding at the end. Uncompressed files larger than the shard size are split into byte ranges that start and
+end at line breaks, each written to its own part file that :func:`merge_parts` concatenates afterwards. The
+tasks are handed out one at a time from the pool's shared queue, so a worker that finishes early simply takes
+the next task instead of waiting on a fixed share of the work.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class Task(object):
+    """A file, or a line-aligned byte range of it, to be processed by one worker."""
+
+    def __init__(self, path, index, size, byte_range=None, shard=0, num_shards=1, payload=None):
+        """
+
+        Parameters
+        ----------
+        path : str
+            Input file.
+        index : int
+            Position of the file in the list given to :func:`plan_tasks`.
+        size : int
+            Number of (compressed) bytes to read, used for the ordering.
+        byte_range : (int, int), optional
+            Bytes [start, end) of the file, the whole file if None.
+        shard : int, optional
+            Position of the byte range among the `num_shards` ranges of the file.
+        num_shards : int, optional
+            Number of byte ranges the file is split into.
+        payload : object, optional
+            Anything else the task function needs, e.g. the output path.
+
+        """
+        self.path = path
+        self.index = index
+        self.size = size
+        self.byte_range = byte_range
+        self.shard = shard
+        self.num_shards = num_shards
+        self.payload = payload
+
+    def output_path(self, path):
+        """Get the file this task writes the output `path` of the whole input file to."""
+        if self.num_shards == 1:
+            return path
+        return part_path(path, self.shard)
+
+    def __repr__(self):
+        return f'Task({self.path}, shard {self.shard + 1}/{self.num_shards}, {self.size} bytes)'
+
+
+class ScheduleStats(object):
+    """Worker utilization of a :func:`run_tasks` run."""
+
+    def __init__(self):
+        self.wall_time = 0.0
+        # the time between the first worker running out of tasks and the last task finishing
+        self.tail_time = 0.0
+        # pid -> number of tasks, busy seconds
+        self.tasks = defaultdict(int)
+        self.busy = defaultdict(float)
+
+    def utilization(self, pid):
+        return self.busy[pid] / self.wall_time if self.wall_time > 0 else 0.0
+
+    def __repr__(self):
+        return (f'ScheduleStats(wall_time={self.wall_time:.1f}, tail_time={self.tail_time:.1f}, '
+                f'workers={len(self.busy)})')
+
+
+def part_path(path, shard):
+    """Part file of a shard, named so that it is never mistaken for a JSONL file."""
+    return f'{path}.part-{shard:04d}'
+
+
+def merge_parts(path, num_shards):
+    """Concatenate the part files of a sharded output into `path` and remove them.
+
+    Concatenated gzip members and zstd/lz4 frames are valid streams, so this works for every codec.
+    """
+    with open(path, 'wb') as out_f:
+        for shard in range(num_shards):
+            with open(part_path(path, shard), 'rb') as f:
+                shutil.copyfileobj(f, out_f, 1 << 20)
+    for shard in range(num_shards):
+        os.remove(part_path(path, shard))
+
+
+def plan_tasks(paths, payloads=None, shard_size=None):
+    """Turn files into tasks, largest first.
+
+    Parameters
+    ----------
+    paths : list of str
+        Input files.
+    payloads : list, optional
+        Per-file payload of the tasks, e.g. output paths.
+    shard_size : int, optional
+        Split uncompressed files larger than this many bytes into line-aligned byte ranges. Files are never split
+        if None.
+
+    Returns
+    -------
+    list of :class:`Task`
+        The tasks in decreasing size.
+
+    """
+    tasks = []
+    for index, path in enumerate(paths):
+        payload = payloads[index] if payloads is not None else None
+        size = os.path.getsize(path)
+        if shard_size and size > shard_size and detect_codec(path) == 'none':
+            ranges = line_offsets(path, shard_size)
+            for shard, (start, end) in enumerate(ranges):
+                tasks.append(Task(path, index, end - start, (start, end), shard, len(ranges), payload))
+        else:
+            tasks.append(Task(path, index, size, payload=payload))
+    tasks.sort(key=lambda task: task.size, reverse=True)
+    return tasks
+
+
+def _run_task(args):
+    func, task = args
+    start_time = time.time()
+    result, snapshot = profiled_call(func, task)
+    return task, result, snapshot, os.getpid(), start_time, time.time()
+
+
+def run_tasks(func, tasks, processes=None, initializer=None, initargs=(), stats=None):
+    """Run `func(task)` for every task on a process pool and yield the (task, result) pairs as they finish.
+
+    Tasks are taken one at a time in the given order (see :func:`plan_tasks`) by whichever worker is idle. When
+    all tasks have finished, the utilization of every worker and the tail time are logged.
+
+    Parameters
+    ----------
+    func : function
+        Module-level (picklable) function of a :class:`Task`.
+    tasks : list of :class:`Task`
+        The tasks.
+    processes : int, optional
+        Number of worker processes, all cores by default.
+    initializer : function, optional
+        Called with `initargs` in every worker process.
+    initargs : tuple, optional
+        Arguments of `initializer`.
+    stats : :class:`ScheduleStats`, optional
+        Filled with the worker utilization.
+
+    """
+    if stats is None:
+        stats = ScheduleStats()
+    last_end = {}
+    start_time = time.time()
+    with ProcessPool(processes, initializer=initializer, initargs=initargs) as pool:
+        for task, result, snapshot, pid, task_start, task_end in pool.imap_unordered(
+                _run_task, [(func, task) for task in tasks], chunksize=1):
+            if snapshot is not None:
+                profiler.merge(snapshot)
+            stats.tasks[pid] += 1
+            stats.busy[pid] += task_end - task_start
+            last_end[pid] = max(task_end, last_end.get(pid, task_end))
+            yield task, result
+    if not last_end:
+        return
+    stats.wall_time = max(last_end.values()) - start_time
+    stats.tail_time = max(last_end.values()) - min(last_end.values())
+    for pid in sorted(stats.busy):
+        logger.info("[pid %i] %i tasks, busy %.1fs, utilization %.0f%%",
+                    pid, stats.tasks[pid], stats.busy[pid], 100 * stats.utilization(pid))
+    logger.info("%i tasks in %.1fs on %i workers, tail %.1fs",
+                len(tasks), stats.wall_time, len(stats.busy), stats.tail_time)
@@ -0,0 +1,165 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+
+from gensim.corpora.dictionary import Dictionary
+
+from ldamodel import LdaModel
+from coherence import dictionary_fingerprint
+from corpus import CsrCorpus, build_dictionary, encode_file
+from tweetio import JSONL_PATTERN
+from train_lda import TOKEN_MIN_DOCS, TOKEN_MAX_DOCS_FRAC
+from utils import set_console_logger, seconds2clock, peak_rss_mb, add_profiling_args, run_main
+
+"""
+Online LDA over the annotated hourly files in chronological order.
+
+The files are read by a background thread into a bounded queue, so at most `--prefetch` windows of documents are
+in memory at any time, and the model is updated once per window of `--window` hourly files. At the end of every
+day the current topics are written to `<dump_dir>/topics/<day>.json`, which traces the topic evolution.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('gensim').setLevel(logging.WARNING)
+# every window is a small online update, don't warn that a single update has too few chunks to converge
+logging.getLogger('ldamodel').setLevel(logging.ERROR)
+
+FILE_TIMESTAMP = re.compile(r'coronavirus-tweet-annotated-(\d{4}-\d\d-\d\d)-(\d\d)' + JSONL_PATTERN)
+
+
+def find_annotated_files(dataset_dir, months=None):
+    """Get the (day, hour, path) of every annotated hourly file, in chronological order."""
+    data_files = []
+    for month_dir in os.listdir(dataset_dir):
+        month_path = os.path.join(dataset_dir, month_dir)
+        if not os.path.isdir(month_path) or (months and month_dir not in months):
+            continue
+        for filename in os.listdir(month_path):
+            match = FILE_TIMESTAMP.match(filename)
+            if match:
+                data_files.append((match.group(1), match.group(2), os.path.join(month_path, filename)))
+    return sorted(data_files)
+
+
+def prefetch_windows(data_files, dictionary, window, output_queue):
+    """Producer thread: put (day, bow documents) windows on `output_queue`, then None."""
+    try:
+        fingerprint = dictionary_fingerprint(dictionary)
+        for start in range(0, len(data_files), window):
+            day = None
+            bow_corpora = []
+            for file_day, _, path in data_files[start:start + window]:
+                if day is not None and file_day != day:
+                    # windows never span two days, so that the daily snapshots are exact
+                    output_queue.put((day, CsrCorpus.concatenate(bow_corpora)))
+                    bow_corpora = []
+                day = file_day
+                bow_corpora.append(encode_file(path, dictionary, fingerprint))
+            output_queue.put((day, CsrCorpus.concatenate(bow_corpora)))
+        output_queue.put(None)
+    except Exception as e:
+        output_queue.put(e)
+
+
+def snapshot_topics(model, day, num_docs, topics_dir):
+    topics = [{'topic_id': topic_id,
+               'words': [[word, float(prob)] for word, prob in model.show_topic(topic_id, topn=args.topn)]}
+              for topic_id in range(model.num_topics)]
+    with open(os.path.join(topics_dir, f'{day}.json'), 'w') as f:
+        json.dump({'day': day, 'num_docs': num_docs, 'topics': topics}, f, indent=2)
+
+
+def main():
+    data_files = find_annotated_files(args.dataset_dir, args.months)
+    if not data_files:
+        logger.error(f'No annotated files found in {args.dataset_dir}')
+        sys.exit(1)
+    logger.info(f'{len(data_files)} hourly files from {data_files[0][0]} to {data_files[-1][0]}')
+
+    if args.dictionary:
+        dictionary = Dictionary.load(args.dictionary)
+    else:
+        logger.info('Building dictionary')
+        dictionary = build_dictionary([path for _, _, path in data_files], args.processes,
+                                      no_below=TOKEN_MIN_DOCS, no_above=TOKEN_MAX_DOCS_FRAC)
+        dictionary.save(os.path.join(args.dump_dir, 'dictionary'))
+    logger.info(f'Number of unique tokens: {len(dictionary)}')
+
+    model = LdaModel(num_topics=args.num_topics,
+                     id2word=dictionary,
+                     chunksize=args.batch_size,
+                     passes=1,
+                     update_every=1,
+                     eval_every=0,
+                     iterations=args.iterations,
+                     decay=args.decay,
+                     offset=args.offset,
+                     alpha='auto',
+                     eta='auto',
+                     random_state=args.seed)
+
+    windows = queue.Queue(maxsize=args.prefetch)
+    producer = threading.Thread(target=prefetch_windows, args=(data_files, dictionary, args.window, windows),
+                                daemon=True)
+    producer.start()
+
+    topics_dir = os.path.join(args.dump_dir, 'topics')
+    os.makedirs(topics_dir, exist_ok=True)
+    start_time = time.time()
+    current_day, day_docs, total_docs = None, 0, 0
+    while True:
+        item = windows.get()
+        if isinstance(item, Exception):
+            raise item
+        day = item[0] if item is not None else None
+        if current_day is not None and day != current_day:
+            snapshot_topics(model, current_day, day_docs, topics_dir)
+            logger.info(f'{current_day}: {day_docs} documents, {total_docs} in total, '
+                        f'elapsed {seconds2clock(time.time() - start_time)}, peak RSS {peak_rss_mb():.1f} MiB')
+            day_docs = 0
+        if item is None:
+            break
+        current_day, bow_corpus = item
+        model.update(bow_corpus)
+        day_docs += len(bow_corpus)
+        total_docs += len(bow_corpus)
+    producer.join()
+
+    if args.save:
+        model_path = os.path.join(args.dump_dir, 'lda.model')
+        model.save(model_path)
+        logger.info(f'Model has been saved to {model_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Streaming LDA over hourly files')
+    parser.add_argument('--dataset_dir', required=True, help='dataset directory')
+    parser.add_argument('--dump_dir', help='dump directory')
+    parser.add_argument('--dictionary', help='saved gensim Dictionary, built with an extra pass over the files '
+                                             'if omitted')
+    parser.add_argument('--processes', type=int, help='processes for building the dictionary, all cores by default')
+    parser.add_argument('--months', nargs='+', help='only stream these month directories')
+    parser.add_argument('--num_topics', type=int, default=10)
+    parser.add_argument('--window', type=int, default=1, help='number of hourly files per model update')
+    parser.add_argument('--prefetch', type=int, default=2, help='number of windows read ahead')
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--decay', type=float, default=0.5)
+    parser.add_argument('--offset', type=float, default=1.0)
+    parser.add_argument('--topn', type=int, default=20, help='number of words per topic in the daily snapshots')
+    parser.add_argument('--save', action='store_true', help='save the final model to dump_dir')
+    parser.add_argument('--seed', type=int, default=0)
+    add_profiling_args(parser)
+    args = parser.parse_args()
+    if not args.dump_dir:
+        args.dump_dir = os.path.join(args.dataset_dir, 'stream_lda_dump')
+    os.makedirs(args.dump_dir, exist_ok=True)
+    print(args)
+    run_main(main, args)
@@ -0,0 +1,164 @@
+import os
+import csv
+import json
+import logging
+import argparse
+import itertools
+from multiprocessing import Pool as ProcessPool, cpu_count
+
+from gensim.corpora.dictionary import Dictionary
+from tqdm import tqdm
+
+from ldamodel import LdaModel
+from coherence import CoherenceIndex, DEFAULT_WINDOW_SIZES
+from corpus import CsrCorpus, CandidateTexts, annotated_paths, build_dictionary, encode_files
+from train_lda import evaluate_model, TOKEN_MIN_DOCS, TOKEN_MAX_DOCS_FRAC
+from utils import set_console_logger
+
+"""
+Hyperparameter sweep: train one LDA model per grid point in parallel, sharing one compiled corpus.
+
+Layout of the dump directory:
+    dictionary, corpus.*.npy, coherence_index.npz   compiled once, shared read-only by all runs
+    <run name>/lda.model*, <run name>/metrics.json  one directory per grid point
+    results.csv                                     one row per finished run, best coherence first
+Interrupted sweeps are resumed by running the same command again: runs with a metrics.json are skipped.
+"""
+
+set_console_logger()
+logger = logging.getLogger()
+logging.getLogger('gensim').setLevel(logging.WARNING)
+logging.getLogger('ldamodel').setLevel(logging.WARNING)
+
+GRID_KEYS = ['num_topics', 'alpha', 'eta', 'decay', 'chunksize']
+
+
+def parse_prior(value):
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def run_name(config):
+    return '-'.join(f'{key}-{config[key]}' for key in GRID_KEYS)
+
+
+def compile_corpus():
+    """Build (or load, when resuming) the dictionary, the CSR corpus and the coherence index."""
+    dictionary_path = os.path.join(args.dump_dir, 'dictionary')
+    corpus_path = os.path.join(args.dump_dir, 'corpus')
+    index_path = os.path.join(args.dump_dir, 'coherence_index.npz')
+    if os.path.isfile(dictionary_path) and CsrCorpus.exists(corpus_path) and os.path.isfile(index_path):
+        logger.info(f'Reusing the compiled corpus in {args.dump_dir}')
+        return dictionary_path, corpus_path, index_path
+
+    paths = annotated_paths(args.dataset_dir)
+    dictionary = build_dictionary(paths, args.parallel, no_below=TOKEN_MIN_DOCS, no_above=TOKEN_MAX_DOCS_FRAC)
+    dictionary.save(dictionary_path)
+    bow_corpus = encode_files(paths, dictionary, args.parallel)
+    bow_corpus.save(corpus_path)
+    CoherenceIndex.build(CandidateTexts(paths), dictionary, DEFAULT_WINDOW_SIZES[args.coherence]).save(index_path)
+    logger.info(f'Compiled {len(bow_corpus)} documents with {len(dictionary)} unique tokens')
+    return dictionary_path, corpus_path, index_path
+
+
+def init_worker(dictionary_path, corpus_path, index_path):
+    global dictionary, bow_corpus, coherence_index
+    dictionary = Dictionary.load(dictionary_path)
+    bow_corpus = CsrCorpus.load(corpus_path, mmap_mode='r')
+    coherence_index = CoherenceIndex.load(index_path, dictionary)
+
+
+def train_and_evaluate(config):
+    run_dir = os.path.join(args.dump_dir, run_name(config))
+    os.makedirs(run_dir, exist_ok=True)
+    model_path = os.path.join(run_dir, 'lda.model')
+    model = LdaModel(corpus=bow_corpus,
+                     num_topics=config['num_topics'],
+                     id2word=dictionary,
+                     passes=args.num_epochs,
+                     eval_every=0,
+                     iterations=args.iterations,
+                     alpha=config['alpha'],
+                     eta=config['eta'],
+                     decay=config['decay'],
+                     chunksize=config['chunksize'],
+                     random_state=args.seed)
+    model.save(model_path)
+    metrics = evaluate_model(model, None, bow_corpus, dictionary,
+                             coherence=args.coherence,
+                             topn=args.topn,
+                             coherence_index=coherence_index,
+                             eval_sample=args.eval_sample,
+                             seed=args.seed)
+    metrics['config'] = config
+    with open(os.path.join(run_dir, 'metrics.json'), 'w') as f:
+        json.dump(metrics, f, indent=2)
+    return metrics
+
+
+def write_results(configs):
+    rows = []
+    for config in configs:
+        metrics_path = os.path.join(args.dump_dir, run_name(config), 'metrics.json')
+        if os.path.isfile(metrics_path):
+            with open(metrics_path) as f:
+                metrics = json.load(f)
+            # the sweep always scored with the index, also before the backend was recorded
+            rows.append(dict(config, coherence=metrics['coherence'],
+                             coherence_backend=metrics.get('coherence_backend', 'index'),
+                             perplexity=metrics['perplexity']))
+    rows.sort(key=lambda row: row['coherence'], reverse=True)
+    results_path = os.path.join(args.dump_dir, 'results.csv')
+    with open(results_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=GRID_KEYS + ['coherence', 'coherence_backend', 'perplexity'])
+        writer.writeheader()
+        writer.writerows(rows)
+    for row in rows:
+        logger.info(' '.join(f'{key}={row[key]}' for key in GRID_KEYS) +
+                    f" {args.coherence}={row['coherence']:.4f} perplexity={row['perplexity']:.1f}")
+    logger.info(f'Results have been written to {results_path}')
+
+
+def main():
+    configs = [dict(zip(GRID_KEYS, values)) for values in itertools.product(
+        args.num_topics, args.alpha, args.eta, args.decay, args.chunksize)]
+    todo = [config for config in configs
+            if not os.path.isfile(os.path.join(args.dump_dir, run_name(config), 'metrics.json'))]
+    logger.info(f'{len(configs)} grid points, {len(configs) - len(todo)} already done')
+
+    if todo:
+        shared = compile_corpus()
+        workers = ProcessPool(min(args.parallel, len(todo)), initializer=init_worker, initargs=shared)
+        # largest models first, so that the small ones fill in at the end
+        todo.sort(key=lambda config: config['num_topics'], reverse=True)
+        for metrics in tqdm(workers.imap_unordered(train_and_evaluate, todo), total=len(todo)):
+            logger.info(f"{run_name(metrics['config'])}: {args.coherence}={metrics['coherence']:.4f}")
+        workers.close()
+        workers.join()
+
+    write_results(configs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='LDA hyperparameter sweep')
+    parser.add_argument('--dataset_dir', required=True, help='dataset directory')
+    parser.add_argument('--dump_dir', required=True, help='sweep directory')
+    parser.add_argument('--num_topics', type=int, nargs='+', default=[5, 10, 15, 20, 25, 30, 50, 100, 150, 200])
+    parser.add_argument('--alpha', type=parse_prior, nargs='+', default=['auto'])
+    parser.add_argument('--eta', type=parse_prior, nargs='+', default=['auto'])
+    parser.add_argument('--decay', type=float, nargs='+', default=[0.5])
+    parser.add_argument('--chunksize', type=int, nargs='+', default=[10000])
+    parser.add_argument('--num_epochs', type=int, default=10)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--parallel', type=int, default=cpu_count(),
+                        help='number of models trained concurrently')
+    parser.add_argument('--coherence', type=str, default='c_v', choices=list(DEFAULT_WINDOW_SIZES))
+    parser.add_argument('--topn', type=int, default=20)
+    parser.add_argument('--eval_sample', type=int, help='estimate perplexity on this many random documents')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(args)
+    os.makedirs(args.dump_dir, exist_ok=True)
+    main()
@@ -5,17 +5,16 @@ import logging
 import argparse
 
 import numpy as np
-from gensim.corpora.dictionary import Dictionary
 from gensim.models import CoherenceModel
 from gensim.models.callbacks import PerplexityMetric, CoherenceMetric
-from gensim.models.wrappers import LdaMallet
 from gensim.models import LdaMulticore as GensimLdaMulticore
 from gensim.models import LdaModel as GensimLdaModel
 from tqdm import tqdm
-from pprint import pprint
 
 from ldamulticore import LdaModel, LdaMulticore
-from utils import set_tee_logger
+from coherence import CoherenceIndex, IndexedCoherenceMetric, DEFAULT_WINDOW_SIZES, topics_from_model
+from corpus import annotated_paths, read_candidates, CandidateTexts, build_dictionary, encode_files
+from utils import set_tee_logger, add_profiling_args, run_main
 
 
 logging.getLogger(
@@ -29,41 +28,99 @@ TOKEN_MAX_DOCS_FRAC = 0.5
 NGRAM_MIN_FREQ = 5
 
 
-def load_corpus(dataset_dir):
+def load_corpus(dataset_dir, months=None):
     corpus = []
-    for month_dir in os.listdir(dataset_dir):
-        month_path = os.path.join(dataset_dir, month_dir)
-        if not os.path.isdir(month_path):
-            continue
-        data_files = os.listdir(month_path)
-        for filename in tqdm(data_files, total=len(data_files), desc=month_dir):
-            path = os.path.join(month_path, filename)
-            if path.endswith('.jsonl') and 'annotated' in path:
-                with open(path) as f:
-                    for line in f:
-                        tweet = json.loads(line)
-                        corpus.append(tweet['candidates'])
+    for path in tqdm(annotated_paths(dataset_dir, months), desc='Loading'):
+        corpus.extend(read_candidates(path))
     return corpus
 
 
-def main():
-    logger.info('-'*80)
-    logger.info('Loading data')
-    corpus = load_corpus(args.dataset_dir)
+def evaluate_model(model, texts, bow_corpus, dictionary, coherence='c_v', topn=20,
+                   coherence_index=None, eval_sample=None, seed=0):
+    """Compute the per-topic coherence, their average, the perplexity and the topic summaries in one pass.
+
+    The top words of every topic are extracted once and shared by the coherence scoring and the summaries.
+    Coherence comes from `coherence_index` when given, otherwise from a single gensim `CoherenceModel`; the two
+    backends' scores differ slightly, `coherence_backend` records which one it was.
+    If `eval_sample` is set, coherence (without index) and perplexity are estimated on that many random documents.
+    """
+    num_docs = len(bow_corpus)
+    if eval_sample and eval_sample < num_docs:
+        sample = np.sort(np.random.RandomState(seed).choice(num_docs, eval_sample, replace=False))
+        if texts is not None:
+            texts = [texts[i] for i in sample]
+        bow_corpus = [bow_corpus[i] for i in sample]
+
+    topics = topics_from_model(model, topn)
+    if coherence_index is not None:
+        coherence_per_topic = coherence_index.get_coherence_per_topic(topics, coherence)
+    else:
+        coherence_model = CoherenceModel(topics=[[dictionary[word_id] for word_id in topic] for topic in topics],
+                                         texts=texts,
+                                         dictionary=dictionary,
+                                         coherence=coherence,
+                                         topn=topn)
+        coherence_per_topic = [float(score) for score in coherence_model.get_coherence_per_topic()]
+
+    perplexity = None
+    if hasattr(model, 'log_perplexity'):
+        perplexity = float(np.exp2(-model.log_perplexity(bow_corpus, total_docs=num_docs)))
+
+    topic_summaries = [{'topic_id': topic_id,
+                        'coherence': score,
+                        'words': [dictionary[word_id] for word_id in topic]}
+                       for topic_id, (topic, score) in enumerate(zip(topics, coherence_per_topic))]
+    return {
+        'num_topics': len(topics),
+        'coherence_measure': coherence,
+        'coherence': float(np.mean(coherence_per_topic)),
+        'coherence_backend': 'gensim' if coherence_index is None else 'index',
+        'perplexity': perplexity,
+        'eval_docs': len(bow_corpus),
+        'topics': sorted(topic_summaries, key=lambda topic: topic['coherence'], reverse=True),
+    }
 
+
+def main():
     logger.info('-'*80)
     logger.info('Make dictionary')
 
-    dictionary = Dictionary(corpus)
-    # Filter out words that occur less than 20 documents, or more than 50% of the documents.
-    dictionary.filter_extremes(no_below=TOKEN_MIN_DOCS, no_above=TOKEN_MAX_DOCS_FRAC)
+    paths = annotated_paths(args.dataset_dir, args.months)
+    logger.info(f'Number of data files: {len(paths)}')
+    # Filter out words that occur less than 5 documents, or more than 50% of the documents.
+    dictionary = build_dictionary(paths, args.processes, no_below=TOKEN_MIN_DOCS, no_above=TOKEN_MAX_DOCS_FRAC)
+
+    warm_model = None
+    if args.warm_start:
+        logger.info(f'Warm start from {args.warm_start}')
+        model_cls = LdaMulticore if args.model == 'multicore_lda' else LdaModel
+        warm_model = model_cls.load(args.warm_start)
+        # keep the ids of the previous vocabulary and append the new words
+        old_dictionary = warm_model.id2word
+        old_dictionary.merge_with(dictionary)
+        dictionary = old_dictionary
+        warm_model.align_vocabulary(dictionary)
 
     vocab_path = os.path.join(args.dump_dir, 'vocab.txt')
     with open(vocab_path, 'w') as f:
         f.write("\n".join(dictionary.itervalues()) + '\n')
+    dictionary.save(os.path.join(args.dump_dir, 'dictionary'))
+
+    # Bag-of-words representation of the documents, cached next to the data files.
+    logger.info('Encoding documents')
+    bow_corpus = encode_files(paths, dictionary, args.processes)
 
-    # Bag-of-words representation of the documents.
-    bow_corpus = [dictionary.doc2bow(doc) for doc in corpus]
+    # The token lists are only needed to compute coherence without an index.
+    corpus = None
+    if not args.coherence_index and ('coherence' in args.callbacks or not args.skip_eval):
+        logger.info('Loading data')
+        corpus = load_corpus(args.dataset_dir, args.months)
+
+    coherence_index = None
+    if args.coherence_index:
+        logger.info('Loading coherence index')
+        coherence_index = CoherenceIndex.load_or_build(args.coherence_index, CandidateTexts(paths), dictionary,
+                                                       DEFAULT_WINDOW_SIZES[args.coherence])
 
     logger.info(f'Number of unique tokens: {len(dictionary)}')
     logger.info(f'Number of documents: {len(bow_corpus)}')
@@ -76,14 +133,29 @@ def main():
         perplexity_metric = PerplexityMetric(corpus=bow_corpus)
         callbacks.append(perplexity_metric)
     if 'coherence' in args.callbacks:
-        coherence_metric = CoherenceMetric(texts=corpus,
-                                        dictionary=dictionary,
-                                        coherence=args.coherence,
-                                        topn=args.topn)
+        if coherence_index is not None:
+            coherence_metric = IndexedCoherenceMetric(coherence_index,
+                                                      coherence=args.coherence,
+                                                      topn=args.topn)
+        else:
+            coherence_metric = CoherenceMetric(texts=corpus,
+                                            dictionary=dictionary,
+                                            coherence=args.coherence,
+                                            topn=args.topn)
         callbacks.append(coherence_metric)
 
     model_path = os.path.join(args.dump_dir, 'lda.model')
-    if args.model == 'lda':
+    if warm_model is not None:
+        model = warm_model
+        model.callbacks = callbacks
+        model.log_dir = args.log_dir
+        model.model_dir = model_path
+        model.passes = args.num_epochs
+        model.chunksize = args.batch_size
+        model.eval_every = args.eval_every
+        model.iterations = args.iterations
+        model.update(bow_corpus)
+    elif args.model == 'lda':
         model = LdaModel(corpus=bow_corpus,
                         num_topics=args.num_topics,
                         id2word=dictionary,
@@ -96,7 +168,8 @@ def main():
                         chunksize=args.batch_size,
                         callbacks=callbacks,
                         log_dir=args.log_dir,
-                        model_dir=model_path
+                        model_dir=model_path,
+                        beta_dtype=args.beta_dtype
                         )
     elif args.model == 'multicore_lda':
         model = LdaMulticore(corpus=bow_corpus,
@@ -110,9 +183,31 @@ def main():
                             workers=args.workers,
                             callbacks=callbacks,
                             log_dir=args.log_dir,
-                            model_dir=model_path
+                            model_dir=model_path,
+                            beta_dtype=args.beta_dtype
                             )
+    elif args.model == 'distributed_lda':
+        model = LdaModel(corpus=bow_corpus,
+                        num_topics=args.num_topics,
+                        id2word=dictionary,
+                        distributed=True,
+                        ns_conf={'addresses': args.worker_addresses,
+                                 'authkey': args.authkey.encode()},
+                        passes=args.num_epochs,
+                        update_every=1,
+                        eval_every=args.eval_every,
+                        iterations=args.iterations,
+                        eta='auto',
+                        chunksize=args.batch_size,
+                        callbacks=callbacks,
+                        log_dir=args.log_dir,
+                        model_dir=model_path,
+                        beta_dtype=args.beta_dtype
+                        )
+        model.dispatcher.exit()
     elif args.model == 'mallet_lda':
+        from gensim.models.wrappers import LdaMallet
+
         model = LdaMallet(args.mallet_path,
                           corpus=bow_corpus,
                           num_topics=args.num_topics,
@@ -148,26 +243,25 @@ def main():
 
     logger.info('-'*80)
 
-    if args.model != 'mallet_lda':
-        top_topics = model.top_topics(texts=corpus, coherence='c_v')
-        # Average topic coherence is the sum of topic coherences of all topics, divided by the number of topics.
-        avg_topic_coherence = sum([t[1] for t in top_topics]) / args.num_topics
-        logger.info(f'Average topic coherence: {avg_topic_coherence:.4f}.')
-        for topic_idx, (topic_words, topic_score) in enumerate(top_topics):
-            logger.info(f'Topic #{topic_idx} ({topic_score:.4f}): ' + " ".join((t[1] for t in topic_words[:5])))
-        logger.info(
-            f'Perplexity: {np.exp2(-model.log_perplexity(bow_corpus)):.4f}')
-    else:
-        pprint(model.show_topics(formatted=False))
+    if args.skip_eval:
+        return
+
+    logger.info('Evaluating model')
+    metrics = evaluate_model(model, corpus, bow_corpus, dictionary,
+                             coherence=args.coherence,
+                             topn=args.topn,
+                             coherence_index=coherence_index,
+                             eval_sample=args.eval_sample)
+    for topic in metrics['topics']:
+        logger.info(f"Topic #{topic['topic_id']} ({topic['coherence']:.4f}): " + " ".join(topic['words'][:5]))
+    logger.info(f"Coherence ({args.coherence}): {metrics['coherence']:.4f}")
+    if metrics['perplexity'] is not None:
+        logger.info(f"Perplexity: {metrics['perplexity']:.4f}")
 
-    # Compute Coherence Score
-    coherence_model_lda = CoherenceModel(model=model,
-                                        texts=corpus,
-                                        dictionary=dictionary,
-                                        coherence=args.coherence,
-                                        topn=args.topn)
-    coherence_lda = coherence_model_lda.get_coherence()
-    logger.info(f'Coherence : {coherence_lda:.4f}')
+    metrics_path = os.path.join(args.dump_dir, 'metrics.json')
+    with open(metrics_path, 'w') as f:
+        json.dump(metrics, f, indent=2)
+    logger.info(f'Metrics have been written to {metrics_path}')
 
 
 if __name__ == '__main__':
@@ -175,10 +269,16 @@ if __name__ == '__main__':
     parser.add_argument('--dataset_dir', required=True, help='dataset directory')
     parser.add_argument('--dump_dir', help='dump directory')
     parser.add_argument('--model', default='lda',
-                        choices=['lda', 'multicore_lda', 'mallet_lda', 'gensim_lda', 'gensim_multicore_lda'],
+                        choices=['lda', 'multicore_lda', 'distributed_lda', 'mallet_lda',
+                                 'gensim_lda', 'gensim_multicore_lda'],
                         help='which lda to use')
     parser.add_argument('--mallet-path', help='mallet path')
     parser.add_argument('--workers', type=int, default=7)
+    parser.add_argument('--processes', type=int, help='processes for building the dictionary and encoding the '
+                                                      'documents, all cores by default')
+    parser.add_argument('--worker_addresses', nargs='+', default=['localhost:5000'],
+                        help='host:port of the ldadistributed.py workers for distributed_lda')
+    parser.add_argument('--authkey', default='covid19-lda', help='shared secret of the distributed workers')
     parser.add_argument('--num_topics', type=int, default=10)
     parser.add_argument('--num_epochs', type=int, default=10)
     parser.add_argument('--batch-size', type=int, default=10000)
@@ -189,6 +289,18 @@ if __name__ == '__main__':
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--coherence', type=str, default='c_v', choices=['c_v', 'u_mass'], help='cohrence metrics')
     parser.add_argument('--topn', type=int, default=20)
+    parser.add_argument('--skip-eval', action='store_true', help='skip the post-training evaluation')
+    parser.add_argument('--eval_sample', type=int,
+                        help='evaluate perplexity (and coherence without index) on this many random documents')
+    parser.add_argument('--coherence_index', help='co-occurrence index (.npz) shared by all models of a corpus; '
+                                                  'built if missing')
+    parser.add_argument('--warm_start', help='continue training this saved lda/multicore_lda model on the '
+                                             '(new) documents instead of training from scratch')
+    parser.add_argument('--months', nargs='+', help='only load these month directories, e.g. the new months '
+                                                    'for --warm_start')
+    parser.add_argument('--beta_dtype', default='float32', choices=['float32', 'float16'],
+                        help='storage precision of expElogbeta (computations stay in float32)')
+    add_profiling_args(parser)
     args = parser.parse_args()
     if not args.dump_dir:
         args.dump_dir = os.path.join(args.dataset_dir, 'lda_dump')
@@ -200,6 +312,8 @@ if __name__ == '__main__':
         os.makedirs(args.log_dir)
     if args.model == 'mallet_lda' and not args.mallet_path:
         args.mallet_path = 'lib/mallet/mallet-2.0.8/bin/mallet'
+    if args.warm_start and args.model not in ('lda', 'multicore_lda'):
+        parser.error('--warm_start is only supported for the lda and multicore_lda models')
 
     set_tee_logger(args.dump_dir)
     logger = logging.getLogger()
@@ -209,4 +323,4 @@ if __name__ == '__main__':
     else:
         logger.setLevel(logging.INFO)
     print(args)
-    main()
+    run_main(main, args)
@@ -0,0 +1,335 @@
+import os
+import re
+import json
+import gzip
+import zlib
+import queue
+import logging
+import threading
+
+"""
+Reading and writing the (compressed) tweet JSONL files of every stage.
+
+Files are written with one of the codecs none/gzip/zstd/lz4 (zstd and lz4 need the zstandard and lz4 packages)
+and read back whatever their codec, which is detected from the magic bytes and the extension.
+
+Decompression runs in a background thread, with python-isal or python-zlib-ng instead of zlib when they are
+installed, and hands blocks of complete lines to the JSON parser in the calling thread. Corrupt lines are skipped
+and counted instead of abandoning the rest of the file; a truncated or damaged compressed stream ends the file at
+the last complete line.
+"""
+
+from utils import profiler
+
+logger = logging.getLogger(__name__)
+
+try:
+    from isal import igzip as fast_gzip
+    from isal.isal_zlib import error as fast_zlib_error
+except ImportError:
+    try:
+        from zlib_ng import gzip_ng as fast_gzip
+        from zlib_ng.zlib_ng import error as fast_zlib_error
+    except ImportError:
+        fast_gzip = gzip
+        fast_zlib_error = zlib.error
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+CODEC_EXTENSIONS = {
+    'none': '',
+    'gzip': '.gz',
+    'zstd': '.zst',
+    'lz4': '.lz4',
+}
+DEFAULT_LEVELS = {
+    'none': None,
+    'gzip': 6,
+    'zstd': 3,
+    'lz4': 0,
+}
+MAGIC_BYTES = {
+    b'\x1f\x8b': 'gzip',
+    b'\x28\xb5\x2f\xfd': 'zstd',
+    b'\x04\x22\x4d\x18': 'lz4',
+}
+# file names of JSONL files with any codec
+JSONL_PATTERN = r'\.jsonl(?:\.gz|\.zst|\.lz4)?$'
+
+BLOCK_SIZE = 1 << 22
+READ_SIZE = 1 << 16
+# errors of a damaged compressed stream of every codec, after which nothing more can be read; other errors, e.g.
+# of the disk, are raised
+STREAM_ERRORS = {
+    'none': (),
+    'gzip': (EOFError, zlib.error, fast_zlib_error, gzip.BadGzipFile, getattr(fast_gzip, 'BadGzipFile', EOFError)),
+    'zstd': (EOFError,) + ((zstandard.ZstdError,) if zstandard is not None else ()),
+    'lz4': (EOFError,),
+}
+
+
+class ReadStats(object):
+    """Line counts of the files read with :func:`read_jsonl`."""
+
+    def __init__(self):
+        self.lines = 0
+        self.corrupt = 0
+        self.truncated = 0
+
+    def __repr__(self):
+        return f'ReadStats(lines={self.lines}, corrupt={self.corrupt}, truncated={self.truncated})'
+
+
+def is_jsonl(filename):
+    """Whether `filename` is a JSONL file, compressed with any codec."""
+    return re.search(JSONL_PATTERN, filename) is not None
+
+
+def strip_extension(path):
+    """Remove the `.jsonl` and codec extensions, e.g. to derive output or sidecar file names."""
+    return re.sub(JSONL_PATTERN, '', path)
+
+
+def jsonl_path(path, codec='none'):
+    """Get `path` with the `.jsonl` and codec extensions of `codec` (replacing any it already has)."""
+    return strip_extension(path) + '.jsonl' + CODEC_EXTENSIONS[codec]
+
+
+def detect_codec(path):
+    """Detect the codec of a file from its magic bytes, or from its extension (e.g. for an empty file)."""
+    with open(path, 'rb') as f:
+        head = f.read(4)
+    for magic, codec in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return codec
+    for codec, extension in CODEC_EXTENSIONS.items():
+        if extension and path.endswith(extension):
+            return codec
+    return 'none'
+
+
+def _check_codec(codec):
+    if codec not in CODEC_EXTENSIONS:
+        raise ValueError(f'unknown codec {codec}, expected one of {list(CODEC_EXTENSIONS)}')
+    if codec == 'zstd' and zstandard is None:
+        raise ImportError('the zstd codec needs the zstandard package')
+    if codec == 'lz4' and lz4 is None:
+        raise ImportError('the lz4 codec needs the lz4 package')
+
+
+def is_stream_error(error, codec):
+    """Whether `error` means that the compressed stream of a file of `codec` is truncated or damaged."""
+    if isinstance(error, STREAM_ERRORS[codec]):
+        return True
+    # lz4.frame has no exception class of its own, it raises RuntimeErrors with the LZ4F error name
+    return codec == 'lz4' and isinstance(error, RuntimeError) and str(error).startswith('LZ4F_')
+
+
+def open_binary(path, codec=None):
+    """Open a file of any codec for reading its decompressed bytes, detecting the codec if it is not given."""
+    if codec is None:
+        codec = detect_codec(path)
+    _check_codec(codec)
+    if codec == 'gzip':
+        return fast_gzip.open(path, 'rb')
+    if codec == 'zstd':
+        return zstandard.open(path, 'rb')
+    if codec == 'lz4':
+        return lz4.frame.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def open_writer(path, codec='none', level=None):
+    """Open a text file for writing with `codec`.
+
+    Parameters
+    ----------
+    path : str
+        Output file, see :func:`jsonl_path` for adding the codec's extension.
+    codec : {'none', 'gzip', 'zstd', 'lz4'}, optional
+        Compression codec.
+    level : int, optional
+        Compression level, the codec's entry of `DEFAULT_LEVELS` if omitted.
+
+    """
+    _check_codec(codec)
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+    if codec == 'gzip':
+        return gzip.open(path, 'wt', compresslevel=level)
+    if codec == 'zstd':
+        return zstandard.open(path, 'wt', cctx=zstandard.ZstdCompressor(level=level), encoding='utf-8')
+    if codec == 'lz4':
+        return lz4.frame.open(path, 'wt', compression_level=level)
+    return open(path, 'w')
+
+
+def _read_blocks(f, block_size, blocks, stop, limit=None):
+    def put(item):
+        while not stop.is_set():
+            try:
+                blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    # read in small pieces, so that a damaged stream loses at most one piece of the data before the damage
+    pieces, size = [], 0
+    try:
+        while not stop.is_set():
+            read_size = READ_SIZE if limit is None else min(READ_SIZE, limit)
+            piece = f.read(read_size) if read_size > 0 else b''
+            if not piece:
+                break
+            if limit is not None:
+                limit -= len(piece)
+            pieces.append(piece)
+            size += len(piece)
+            if size >= block_size:
+                put(b''.join(pieces))
+                pieces, size = [], 0
+        if pieces:
+            put(b''.join(pieces))
+        put(None)
+    except Exception as e:
+        if pieces:
+            put(b''.join(pieces))
+        put(e)
+
+
+def iter_line_blocks(path, block_size=BLOCK_SIZE, prefetch=4, stats=None, byte_range=None):
+    """Yield the lines of a file in blocks (lists of bytes without the newline), decompressed ahead of time.
+
+    Parameters
+    ----------
+    path : str
+        File of any codec.
+    block_size : int, optional
+        Number of decompressed bytes read at a time.
+    prefetch : int, optional
+        Number of blocks the background thread reads ahead.
+    stats : :class:`ReadStats`, optional
+        Counts truncated files.
+    byte_range : (int, int), optional
+        Only read the bytes [start, end) of an uncompressed file, see :func:`line_offsets` for line-aligned ranges.
+
+    """
+    # open in the calling thread, so that a missing file raises here
+    limit = None
+    codec = detect_codec(path)
+    if byte_range is None:
+        f = open_binary(path, codec)
+    else:
+        if codec != 'none':
+            raise ValueError(f'{path} is compressed, byte ranges are only supported for uncompressed files')
+        start, end = byte_range
+        f = open(path, 'rb')
+        f.seek(start)
+        limit = end - start
+    blocks = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_blocks, args=(f, block_size, blocks, stop, limit), daemon=True)
+    reader.start()
+    rest = b''
+    try:
+        while True:
+            with profiler.timer('read'):
+                block = blocks.get()
+            if block is None:
+                break
+            if isinstance(block, Exception) and is_stream_error(block, codec):
+                logger.warning("%s is truncated or damaged (%s), stopping at the last complete line", path, block)
+                if stats is not None:
+                    stats.truncated += 1
+                # the partial line is dropped with the damaged stream
+                rest = b''
+                break
+            if isinstance(block, Exception):
+                raise block
+            lines = (rest + block).split(b'\n')
+            rest = lines.pop()
+            yield lines
+        if rest:
+            yield [rest]
+    finally:
+        stop.set()
+        reader.join()
+        f.close()
+
+
+def parse_lines(lines, stats):
+    """Yield the JSON objects of raw lines, skipping empty lines and counting the ones that cannot be parsed."""
+    for line in lines:
+        if not line.strip():
+            continue
+        stats.lines += 1
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # json.JSONDecodeError and UnicodeDecodeError
+            stats.corrupt += 1
+
+
+def read_jsonl(path, stats=None, **kwargs):
+    """Yield the JSON objects of a (compressed) JSONL file, skipping and counting the lines that cannot be parsed.
+
+    Parameters
+    ----------
+    path : str
+        File of any codec.
+    stats : :class:`ReadStats`, optional
+        Updated with the number of lines, corrupt lines and truncated files.
+    **kwargs
+        Passed to :func:`iter_line_blocks`.
+
+    """
+    if stats is None:
+        stats = ReadStats()
+    corrupt = stats.corrupt
+    for lines in iter_line_blocks(path, stats=stats, **kwargs):
+        profiler.count('lines', len(lines))
+        if not profiler.enabled:
+            yield from parse_lines(lines, stats)
+            continue
+        # parse the whole block at once to time the decoding without the consumer's work
+        with profiler.timer('decode'):
+            tweets = list(parse_lines(lines, stats))
+        yield from tweets
+    if stats.corrupt > corrupt:
+        logger.warning("skipped %i corrupt lines in %s", stats.corrupt - corrupt, path)
+
+
+def line_offsets(path, chunk_size):
+    """Split an uncompressed file into byte ranges of about `chunk_size` bytes that start and end at line breaks.
+
+    Returns
+    -------
+    list of (int, int)
+        (start, end) byte ranges covering the whole file, in file order.
+
+    """
+    size = os.path.getsize(path)
+    offsets = [0]
+    with open(path, 'rb') as f:
+        while offsets[-1] + chunk_size < size:
+            # the line containing the approximate offset belongs to the current range
+            f.seek(offsets[-1] + chunk_size)
+            f.readline()
+            if f.tell() >= size:
+                break
+            offsets.append(f.tell())
+    offsets.append(size)
+    return list(zip(offsets[:-1], offsets[1:]))
+
+
+def count_lines(path):
+    """Count the non-empty lines of a file of any codec."""
+    return sum(sum(1 for line in lines if line.strip()) for lines in iter_line_blocks(path))
@@ -1,11 +1,13 @@
 import os
 import sys
+import json
+import time
+import pstats
 import logging
+import cProfile
+import resource
 from logging import Filter
-
-import numpy as np
-from allennlp.common.tee import TeeHandler
-from gensim.corpora.dictionary import Dictionary
+from collections import defaultdict
 
 
 def seconds2clock(seconds: int) -> str:
@@ -15,6 +17,147 @@ def seconds2clock(seconds: int) -> str:
     return f"{hours:02.0f}:{minutes:02.0f}:{secs:.6f}"
 
 
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MiB (shared, mmap'ed pages included)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer(object):
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.times[self.name] += time.perf_counter() - self.start_time
+        self.profiler.calls[self.name] += 1
+        return False
+
+
+class Profiler(object):
+    """Named stage timers and counters of a run, shared through the module-level `profiler`.
+
+    While disabled (the default) `timer` returns a shared no-op context manager and `count` returns right away,
+    so the instrumented code pays one attribute check per call. Worker processes send their `snapshot` back to
+    the parent, which `merge`s it, so the times of a stage are summed over all processes.
+
+    Stages: read, decode, normalize, lemmatize, encode, write, estep, mstep, merge, eval, save.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.start_time = time.time()
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counts = defaultdict(int)
+
+    def enable(self):
+        self.enabled = True
+        self.reset()
+
+    def timer(self, name):
+        """Context manager adding its duration to the stage `name`."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def add_time(self, name, seconds):
+        """Add a duration the caller measured anyway to the stage `name`."""
+        if self.enabled:
+            self.times[name] += seconds
+            self.calls[name] += 1
+
+    def count(self, name, n=1):
+        """Add `n` to the counter `name`, e.g. the number of tweets or documents processed."""
+        if self.enabled:
+            self.counts[name] += n
+
+    def snapshot(self):
+        return {'times': dict(self.times), 'calls': dict(self.calls), 'counts': dict(self.counts)}
+
+    def merge(self, snapshot):
+        """Add the timers and counters of a worker's `snapshot`."""
+        for name, value in snapshot['times'].items():
+            self.times[name] += value
+        for name, value in snapshot['calls'].items():
+            self.calls[name] += value
+        for name, value in snapshot['counts'].items():
+            self.counts[name] += value
+
+    def report(self, **extra):
+        """Get the timers, counters and throughput (counts per wall-clock second) as a JSON-serializable dict."""
+        wall_time = time.time() - self.start_time
+        return dict(extra,
+                    wall_time=wall_time,
+                    peak_rss_mb=peak_rss_mb(),
+                    stages={name: {'seconds': seconds, 'calls': self.calls[name]}
+                            for name, seconds in sorted(self.times.items())},
+                    counts=dict(self.counts),
+                    throughput={name: count / wall_time for name, count in self.counts.items()})
+
+    def save_report(self, path, **extra):
+        with open(path, 'w') as f:
+            json.dump(self.report(**extra), f, indent=2, default=str)
+        logging.getLogger(__name__).info(f'Profiling report has been written to {path}')
+
+    def add_scalars(self, tb_logger, step):
+        """Write the cumulative stage times as `time/<stage>` TensorBoard scalars."""
+        for name, seconds in self.times.items():
+            tb_logger.add_scalar(f'time/{name}', seconds, step)
+
+
+profiler = Profiler()
+
+
+def profiled_call(func, *args):
+    """Call `func` in a worker process and return its result with the worker's profiler snapshot (or None)."""
+    if not profiler.enabled:
+        return func(*args), None
+    profiler.reset()
+    return func(*args), profiler.snapshot()
+
+
+def add_profiling_args(parser):
+    parser.add_argument('--report', help='collect stage timers and counters and write them to this json file')
+    parser.add_argument('--profile', help='run under cProfile and write the stats to this file')
+
+
+def run_main(main, args):
+    """Run `main()` with the instrumentation and profiler requested by :func:`add_profiling_args`."""
+    if args.report:
+        profiler.enable()
+    if args.profile:
+        cprofile = cProfile.Profile()
+        cprofile.runcall(main)
+        cprofile.dump_stats(args.profile)
+        pstats.Stats(cprofile).sort_stats('cumulative').print_stats(25)
+    else:
+        main()
+    if args.report:
+        profiler.save_report(args.report, args=vars(args))
+
+
 class ErrorFilter(Filter):
     """
     Filters out everything that is at the ERROR level or higher. This is meant to be used
@@ -41,6 +184,8 @@ def set_console_logger():
 
 def set_tee_logger(save_dir, file_friendly_logging=False):
     # https://github.com/allenai/allennlp/blob/master/allennlp/common/logging.py
+    from allennlp.common.tee import TeeHandler
+
     stdout_file = os.path.join(save_dir, "stdout.log")
     stderr_file = os.path.join(save_dir, "stderr.log")
 